@@ -0,0 +1,69 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Helpers to reconcile Address_Set contents.
+
+Address sets can hold hundreds of thousands of members. Comparing them is
+done on the address strings first, which CPython does with C-level hashing,
+and only the (usually tiny) differences are packed into integers. Packing
+lets textual variants of the same address (e.g. upper and lower case IPv6)
+cancel out, so that they don't show up as a removal plus an addition.
+"""
+
+import socket
+import struct
+
+# IPv6 keys are offset by 2^128 so that they can never collide with IPv4
+# keys when both families end up in the same set.
+_IPV6_KEY_OFFSET = 1 << 128
+
+
+def address_key(address):
+    """Return an integer key for the given IP address string.
+
+    Entries which are not plain IP addresses in their canonical notation
+    (e.g. CIDRs written by hand into the NB DB, or shortened, hexadecimal or
+    octal IPv4 addresses) are returned unchanged, so that they never match
+    an address and get repaired.
+    """
+    try:
+        if ':' in address:
+            high, low = struct.unpack(
+                '!QQ', socket.inet_pton(socket.AF_INET6, address))
+            return _IPV6_KEY_OFFSET | (high << 64) | low
+        return struct.unpack(
+            '!I', socket.inet_pton(socket.AF_INET, address))[0]
+    except (socket.error, ValueError, TypeError):
+        return address
+
+
+def compute_difference(desired, current):
+    """Compare two address lists.
+
+    :param desired:   the addresses that should be in the address set
+    :param current:   the addresses currently in the address set
+    :returns:         a tuple (addresses to add, addresses to remove), both
+                      empty if the sets hold the same addresses. Removals
+                      are returned as stored in current, so they match the
+                      NB DB values exactly.
+    """
+    desired = set(desired)
+    current = set(current)
+    if desired == current:
+        return [], []
+
+    to_add = dict((address_key(a), a) for a in desired - current)
+    to_remove = dict((address_key(a), a) for a in current - desired)
+    for key in set(to_add) & set(to_remove):
+        del to_add[key]
+        del to_remove[key]
+    return list(to_add.values()), list(to_remove.values())
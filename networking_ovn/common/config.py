@@ -13,6 +13,7 @@
 from oslo_config import cfg
 
 from networking_ovn._i18n import _
+from networking_ovn.common import constants as ovn_const
 from neutron.extensions import portbindings
 
 
@@ -55,6 +56,15 @@ ovn_opts = [
                       'leastloaded - chassis with fewest gateway ports '
                       'selected \n'
                       'chance - chassis randomly selected')),
+    cfg.IntOpt('ovn_l3_reschedule_delay',
+               default=5,
+               min=0,
+               help=_('Delay in seconds between a change of the chassis and '
+                      'the rescheduling of the router gateway ports on '
+                      'them. The changes of the chassis during the delay, '
+                      'e.g. when many chassis are restarted together, are '
+                      'handled by a single rescheduling. 0 reschedules the '
+                      'router gateway ports on every change.')),
     cfg.StrOpt("vif_type",
                deprecated_for_removal=True,
                deprecated_reason="The port VIF type is now determined based "
@@ -78,6 +88,188 @@ ovn_opts = [
                default=(12 * 60 * 60),
                help=_('Default least time (in seconds ) to use when '
                       'ovn_native_dhcp is enabled.')),
+    cfg.IntOpt('nb_bulk_transaction_size',
+               default=100,
+               min=1,
+               help=_('Maximum number of Neutron resources (e.g. ports) '
+                      'written to the OVN_Northbound DB in a single '
+                      'transaction when they are processed in bulk.')),
+    cfg.BoolOpt('ovn_journal_enabled',
+                default=False,
+                help=_('Write the OVN_Northbound DB changes done by the '
+                       'ML2 mechanism driver and the L3 router plugin to a '
+                       'journal in the Neutron DB instead of applying them '
+                       'while processing the API request. The journal is '
+                       'replayed asynchronously, in order per resource, '
+                       'and failed writes are retried.')),
+    cfg.IntOpt('ovn_journal_sync_interval',
+               default=10,
+               min=1,
+               help=_('Interval in seconds at which the pending journal '
+                      'entries are replayed when no API request wakes up '
+                      'the journal thread.')),
+    cfg.IntOpt('ovn_journal_batch_size',
+               default=50,
+               min=1,
+               help=_('Maximum number of journal entries claimed from the '
+                      'Neutron DB at once by the journal thread.')),
+    cfg.IntOpt('ovn_journal_processing_timeout',
+               default=600,
+               min=1,
+               help=_('Time in seconds after which a journal entry claimed '
+                      'by a journal thread and neither replayed nor '
+                      'refreshed is considered abandoned, e.g. because its '
+                      'neutron-server was stopped, and is claimed again.')),
+    cfg.IntOpt('ovn_journal_max_retries',
+               default=5,
+               min=0,
+               help=_('Number of times a journal entry which failed to be '
+                      'written to the OVN_Northbound DB is retried before '
+                      'it is marked as failed. Failed entries are left to '
+                      'the Neutron to OVN DB synchronization to repair.')),
+    cfg.IntOpt('qos_cache_ttl',
+               default=0,
+               min=0,
+               help=_('Time in seconds during which the OVN QoS driver '
+                      'reuses the QoS options of a policy and the policy '
+                      'of a network, instead of reading them from the '
+                      'Neutron DB for every port. The cache is disabled by '
+                      'default (0): it has to be enabled explicitly. '
+                      'Policy and network updates only invalidate the '
+                      'cache of the neutron-server worker processing them: '
+                      'the other workers may write the stale QoS options of '
+                      'a policy to the ports they create or update during '
+                      'this time.')),
+    cfg.IntOpt('nb_interactive_txn_concurrency',
+               default=16,
+               min=1,
+               help=_('Maximum number of OVN_Northbound DB transactions '
+                      'of API requests (e.g. creating the port of a '
+                      'booting VM) committed concurrently by a '
+                      'neutron-server process. These transactions are '
+                      'committed ahead of the bulk ones.')),
+    cfg.IntOpt('nb_bulk_txn_concurrency',
+               default=1,
+               min=1,
+               help=_('Maximum number of OVN_Northbound DB transactions '
+                      'of background bulk work (e.g. the Neutron to OVN DB '
+                      'synchronization or QoS policy updates) committed '
+                      'concurrently by a neutron-server process.')),
+    cfg.IntOpt('nb_txn_stats_interval',
+               default=300,
+               min=0,
+               help=_('Interval in seconds between the summaries of the '
+                      'OVN_Northbound DB transactions of each priority '
+                      'logged by a neutron-server process: the number of '
+                      'transactions admitted, the average and maximum time '
+                      'they waited for a slot, and the transactions '
+                      'waiting and running. 0 disables them.')),
+    cfg.IntOpt('nb_txn_coalesce_window',
+               default=0,
+               min=0,
+               help=_('Time in milliseconds during which the '
+                      'OVN_Northbound DB transactions committed '
+                      'concurrently by a neutron-server process are '
+                      'gathered to be committed as a single OVSDB '
+                      'transaction. 0 disables the coalescing.')),
+    cfg.IntOpt('nb_txn_coalesce_max_commands',
+               default=200,
+               min=1,
+               help=_('Maximum number of commands of the coalesced '
+                      'OVN_Northbound DB transactions. A batch reaching '
+                      'this size is committed without waiting for the end '
+                      'of the coalescing window.')),
+    cfg.IntOpt('nb_chunked_txn_max_commands',
+               default=1000,
+               min=1,
+               help=_('Maximum number of commands of each of the '
+                      'transactions in which the Neutron to OVN DB '
+                      'synchronization writes its changes to the '
+                      'OVN_Northbound DB.')),
+    cfg.IntOpt('nb_chunked_txn_max_size',
+               default=4 * 1024 * 1024,
+               min=1,
+               help=_('Approximate maximum size in bytes of the commands '
+                      'of each of the transactions in which the Neutron to '
+                      'OVN DB synchronization writes its changes to the '
+                      'OVN_Northbound DB.')),
+    cfg.IntOpt('ovsdb_event_workers',
+               default=4,
+               min=1,
+               help=_('Number of workers processing the events of the OVN '
+                      'databases, e.g. the ports going up or down. The '
+                      'events of a same row are processed in order by the '
+                      'same worker.')),
+    cfg.StrOpt('ovsdb_event_stream_path',
+               help=_('Path of a unix socket on which the neutron server '
+                      'streams the row events of the OVN databases it '
+                      'monitors, e.g. the ports going up or down, to local '
+                      'clients, as newline delimited JSON. A client writes '
+                      'its subscription, a JSON object with optional '
+                      '"tables", "events" and "columns" lists, on the first '
+                      'line. Not streamed by default.')),
+    cfg.StrOpt('ovsdb_event_stream_mode',
+               default='0600',
+               regex='^0?[0-7]{3}$',
+               help=_('Permissions of the ovsdb_event_stream_path socket, '
+                      'in octal. The clients need to be able to write to '
+                      'it, e.g. 0660 for the members of the group of the '
+                      'neutron server.')),
+    cfg.IntOpt('ovsdb_event_lock_shards',
+               default=1,
+               min=1,
+               help=_('Number of shards of the events of the OVN databases, '
+                      'e.g. the ports going up or down. Each shard has its '
+                      'own lock in the OVN databases, and its events are '
+                      'handled by the neutron server holding it. With more '
+                      'than one shard, the events are spread over the '
+                      'neutron servers instead of being all handled by a '
+                      'single one.')),
+    cfg.IntOpt('ovsdb_event_queue_size',
+               default=10000,
+               min=0,
+               help=_('Maximum number of events of the OVN databases '
+                      'waiting to be processed by each of the '
+                      'ovsdb_event_workers, 0 for no maximum. See '
+                      'ovsdb_event_overflow_policy.')),
+    cfg.StrOpt('ovsdb_event_overflow_policy',
+               default=ovn_const.OVSDB_EVENT_OVERFLOW_COALESCE,
+               choices=ovn_const.OVSDB_EVENT_OVERFLOW_POLICIES,
+               help=_('What to do with the events of the OVN databases '
+                      'when the queue of their worker is full.\n'
+                      'coalesce - an event superseding a queued one, e.g. '
+                      'a port going down while the event of it going up '
+                      'is queued, replaces it. The other events are '
+                      'dropped as with resync\n'
+                      'resync - the event is dropped, and the state '
+                      'maintained by the events, e.g. the statuses of the '
+                      'ports, is rebuilt from the OVN databases once the '
+                      'queue is drained\n'
+                      'block - the OVN database connection waits for room '
+                      'in the queue, for at most 5 seconds before falling '
+                      'back to resync. The connection thread also commits '
+                      'the OVN_Northbound DB transactions the event '
+                      'handlers may wait for, so while it waits these '
+                      'transactions, and the other events, are stalled.')),
+    cfg.IntOpt('ovsdb_event_stats_interval',
+               default=300,
+               min=0,
+               help=_('Interval in seconds between the summaries of the '
+                      'latency and throughput of each type of event of the '
+                      'OVN databases, e.g. the ports going up or down: the '
+                      'matches per second, the events waiting in the queues, '
+                      'and the time they waited and took to run. The '
+                      'summaries are logged and written to '
+                      'ovsdb_event_stats_path. 0 disables them.')),
+    cfg.StrOpt('ovsdb_event_stats_path',
+               help=_('Path of the JSON files to which the statistics of '
+                      'the events of the OVN databases are written every '
+                      'ovsdb_event_stats_interval seconds. Each worker of '
+                      'the neutron server writes the stats of each '
+                      'database to its own file, the path suffixed with '
+                      'the name of the database and the pid of the worker, '
+                      'e.g. <path>.OVN_Northbound.1234. Not written by '
+                      'default.')),
 ]
 
 cfg.CONF.register_opts(ovn_opts, group='ovn')
@@ -113,6 +305,10 @@ def get_ovn_l3_scheduler():
     return cfg.CONF.ovn.ovn_l3_scheduler
 
 
+def get_ovn_l3_reschedule_delay():
+    return cfg.CONF.ovn.ovn_l3_reschedule_delay
+
+
 def get_ovn_vhost_sock_dir():
     return cfg.CONF.ovn.vhost_sock_dir
 
@@ -123,3 +319,91 @@ def is_ovn_dhcp():
 
 def get_ovn_dhcp_default_lease_time():
     return cfg.CONF.ovn.dhcp_default_lease_time
+
+
+def get_ovn_nb_bulk_transaction_size():
+    return cfg.CONF.ovn.nb_bulk_transaction_size
+
+
+def is_ovn_journal_enabled():
+    return cfg.CONF.ovn.ovn_journal_enabled
+
+
+def get_ovn_journal_sync_interval():
+    return cfg.CONF.ovn.ovn_journal_sync_interval
+
+
+def get_ovn_journal_batch_size():
+    return cfg.CONF.ovn.ovn_journal_batch_size
+
+
+def get_ovn_journal_processing_timeout():
+    return cfg.CONF.ovn.ovn_journal_processing_timeout
+
+
+def get_ovn_journal_max_retries():
+    return cfg.CONF.ovn.ovn_journal_max_retries
+
+
+def get_ovn_qos_cache_ttl():
+    return cfg.CONF.ovn.qos_cache_ttl
+
+
+def get_ovn_nb_interactive_txn_concurrency():
+    return cfg.CONF.ovn.nb_interactive_txn_concurrency
+
+
+def get_ovn_nb_bulk_txn_concurrency():
+    return cfg.CONF.ovn.nb_bulk_txn_concurrency
+
+
+def get_ovn_nb_txn_stats_interval():
+    return cfg.CONF.ovn.nb_txn_stats_interval
+
+
+def get_ovn_nb_txn_coalesce_window():
+    return cfg.CONF.ovn.nb_txn_coalesce_window
+
+
+def get_ovn_nb_txn_coalesce_max_commands():
+    return cfg.CONF.ovn.nb_txn_coalesce_max_commands
+
+
+def get_ovn_nb_chunked_txn_max_commands():
+    return cfg.CONF.ovn.nb_chunked_txn_max_commands
+
+
+def get_ovn_nb_chunked_txn_max_size():
+    return cfg.CONF.ovn.nb_chunked_txn_max_size
+
+
+def get_ovn_ovsdb_event_workers():
+    return cfg.CONF.ovn.ovsdb_event_workers
+
+
+def get_ovn_ovsdb_event_queue_size():
+    return cfg.CONF.ovn.ovsdb_event_queue_size
+
+
+def get_ovn_ovsdb_event_overflow_policy():
+    return cfg.CONF.ovn.ovsdb_event_overflow_policy
+
+
+def get_ovn_ovsdb_event_lock_shards():
+    return cfg.CONF.ovn.ovsdb_event_lock_shards
+
+
+def get_ovn_ovsdb_event_stream_path():
+    return cfg.CONF.ovn.ovsdb_event_stream_path
+
+
+def get_ovn_ovsdb_event_stream_mode():
+    return int(cfg.CONF.ovn.ovsdb_event_stream_mode, 8)
+
+
+def get_ovn_ovsdb_event_stats_interval():
+    return cfg.CONF.ovn.ovsdb_event_stats_interval
+
+
+def get_ovn_ovsdb_event_stats_path():
+    return cfg.CONF.ovn.ovsdb_event_stats_path
@@ -57,3 +57,28 @@ DHCPV6_STATELESS_OPT = 'dhcpv6_stateless'
 
 CHASSIS_DATAPATH_NETDEV = 'netdev'
 CHASSIS_IFACE_DPDKVHOSTUSER = 'dpdkvhostuser'
+
+# Journal (see networking_ovn.journal) object types, operations and states
+JOURNAL_NETWORK = 'network'
+JOURNAL_SUBNET = 'subnet'
+JOURNAL_PORT = 'port'
+JOURNAL_ROUTER = 'router'
+JOURNAL_CREATE = 'create'
+JOURNAL_UPDATE = 'update'
+JOURNAL_DELETE = 'delete'
+JOURNAL_PENDING = 'pending'
+JOURNAL_PROCESSING = 'processing'
+JOURNAL_FAILED = 'failed'
+
+# Priorities of the OVN NB DB transactions, highest first
+OVN_TXN_PRIORITY_INTERACTIVE = 'interactive'
+OVN_TXN_PRIORITY_BULK = 'bulk'
+OVN_TXN_PRIORITIES = (OVN_TXN_PRIORITY_INTERACTIVE, OVN_TXN_PRIORITY_BULK)
+
+# Policies applied to the OVN DB events when their queue is full
+OVSDB_EVENT_OVERFLOW_COALESCE = 'coalesce'
+OVSDB_EVENT_OVERFLOW_RESYNC = 'resync'
+OVSDB_EVENT_OVERFLOW_BLOCK = 'block'
+OVSDB_EVENT_OVERFLOW_POLICIES = (OVSDB_EVENT_OVERFLOW_COALESCE,
+                                 OVSDB_EVENT_OVERFLOW_RESYNC,
+                                 OVSDB_EVENT_OVERFLOW_BLOCK)
@@ -0,0 +1,132 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+from sqlalchemy import orm
+
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.db import models
+
+
+def _get_ordering_key(object_type, object_uuid, data):
+    if object_type in (ovn_const.JOURNAL_SUBNET, ovn_const.JOURNAL_PORT):
+        network_id = data.get(object_type, {}).get('network_id')
+        if network_id:
+            return network_id
+    return object_uuid
+
+
+def get_ordering_key(row):
+    """Return the key of the resource the journal row is ordered by.
+
+    Subnets and ports are ordered with the network they belong to, so that
+    e.g. a port is never created before its network or after its network
+    is deleted.
+    """
+    if row.ordering_key:
+        return row.ordering_key
+    data = jsonutils.loads(row.data) if row.data else {}
+    return _get_ordering_key(row.object_type, row.object_uuid, data)
+
+
+def create_pending_row(session, object_type, object_uuid, operation, data):
+    row = models.OVNJournal(
+        object_type=object_type, object_uuid=object_uuid,
+        ordering_key=_get_ordering_key(object_type, object_uuid, data),
+        operation=operation, data=jsonutils.dumps(data),
+        state=ovn_const.JOURNAL_PENDING)
+    session.add(row)
+    # Flush so that the row is written in the transaction of the caller,
+    # and rolled back with it.
+    session.flush()
+    return row
+
+
+def claim_pending_rows(session, limit):
+    """Mark up to limit pending rows as processing and return them.
+
+    Rows are returned in sequence order. A row is not claimed while an
+    older row with the same ordering key is being processed by another
+    journal thread.
+    """
+    busy = orm.aliased(models.OVNJournal)
+    busy_keys = session.query(busy.ordering_key).filter(
+        busy.state == ovn_const.JOURNAL_PROCESSING).subquery()
+    with session.begin(subtransactions=True):
+        rows = session.query(models.OVNJournal).filter(
+            models.OVNJournal.state == ovn_const.JOURNAL_PENDING,
+            ~models.OVNJournal.ordering_key.in_(busy_keys)
+        ).order_by(models.OVNJournal.seqnum).limit(
+            limit).with_for_update().all()
+        now = timeutils.utcnow()
+        for row in rows:
+            row.state = ovn_const.JOURNAL_PROCESSING
+            row.last_retried = now
+    return rows
+
+
+def touch_rows(session, rows):
+    """Refresh the claim of processing rows.
+
+    Keeps the rows of a batch still waiting to be replayed from being
+    taken for stale by reset_stale_processing_rows.
+    """
+    seqnums = [row.seqnum for row in rows]
+    if not seqnums:
+        return
+    with session.begin(subtransactions=True):
+        session.query(models.OVNJournal).filter(
+            models.OVNJournal.seqnum.in_(seqnums),
+            models.OVNJournal.state == ovn_const.JOURNAL_PROCESSING).update(
+                {'last_retried': timeutils.utcnow()},
+                synchronize_session=False)
+
+
+def has_pending_rows(session, object_uuids):
+    """Return whether rows of the resources are waiting to be replayed."""
+    return session.query(models.OVNJournal.seqnum).filter(
+        models.OVNJournal.object_uuid.in_(object_uuids),
+        models.OVNJournal.state.in_(
+            [ovn_const.JOURNAL_PENDING, ovn_const.JOURNAL_PROCESSING])
+    ).first() is not None
+
+
+def delete_row(session, row):
+    with session.begin(subtransactions=True):
+        session.delete(row)
+
+
+def update_row_state(session, row, state, retry_count=None):
+    with session.begin(subtransactions=True):
+        row.state = state
+        if retry_count is not None:
+            row.retry_count = retry_count
+        row.last_retried = timeutils.utcnow()
+        session.merge(row)
+
+
+def reset_stale_processing_rows(session, max_age):
+    """Put rows stuck in processing state for max_age seconds back.
+
+    This recovers the rows claimed by a journal thread which died before
+    processing them, e.g. because its neutron-server was stopped.
+    """
+    threshold = timeutils.utcnow() - datetime.timedelta(seconds=max_age)
+    with session.begin(subtransactions=True):
+        return session.query(models.OVNJournal).filter(
+            models.OVNJournal.state == ovn_const.JOURNAL_PROCESSING,
+            models.OVNJournal.last_retried < threshold).update(
+                {'state': ovn_const.JOURNAL_PENDING},
+                synchronize_session=False)
@@ -0,0 +1,32 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Initial contract migration
+
+Revision ID: 1d271ead4eb6
+Revises: start_networking_ovn
+Create Date: 2016-11-21 10:15:31.210314
+
+"""
+
+from neutron.db.migration import cli
+
+
+# revision identifiers, used by Alembic.
+revision = '1d271ead4eb6'
+down_revision = 'start_networking_ovn'
+branch_labels = (cli.CONTRACT_BRANCH,)
+
+
+def upgrade():
+    pass
@@ -0,0 +1,54 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Add the OVN journal table
+
+Revision ID: e229b8aad9f2
+Revises: start_networking_ovn
+Create Date: 2016-11-21 10:16:47.530472
+
+"""
+
+from alembic import op
+from neutron.db.migration import cli
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e229b8aad9f2'
+down_revision = 'start_networking_ovn'
+branch_labels = (cli.EXPAND_BRANCH,)
+
+
+def upgrade():
+    op.create_table(
+        'ovn_journal',
+        sa.Column('seqnum', sa.BigInteger(), primary_key=True,
+                  autoincrement=True),
+        sa.Column('object_type', sa.String(36), nullable=False),
+        sa.Column('object_uuid', sa.String(36), nullable=False),
+        sa.Column('ordering_key', sa.String(36), nullable=False),
+        sa.Column('operation', sa.String(36), nullable=False),
+        sa.Column('data', sa.Text(), nullable=True),
+        sa.Column('state',
+                  sa.Enum('pending', 'processing', 'failed',
+                          name='ovn_journal_states'),
+                  nullable=False, default='pending'),
+        sa.Column('retry_count', sa.Integer(), nullable=False, default=0),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_retried', sa.DateTime(), nullable=False)
+    )
+    op.create_index(op.f('ix_ovn_journal_object_uuid'), 'ovn_journal',
+                    ['object_uuid'], unique=False)
+    op.create_index(op.f('ix_ovn_journal_ordering_key'), 'ovn_journal',
+                    ['ordering_key'], unique=False)
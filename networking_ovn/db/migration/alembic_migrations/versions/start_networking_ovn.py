@@ -0,0 +1,28 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""start networking-ovn chain
+
+Revision ID: start_networking_ovn
+Revises: None
+Create Date: 2016-11-21 10:12:09.612541
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'start_networking_ovn'
+down_revision = None
+
+
+def upgrade():
+    pass
@@ -0,0 +1,215 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Asynchronous OVN_Northbound DB writes.
+
+When the ovn_journal_enabled option is set, the ML2 mechanism driver and
+the L3 router plugin record the OVN_Northbound DB changes of an API request
+in the ovn_journal table instead of applying them while the request is
+processed. A journal thread, running in every neutron-server worker,
+replays the recorded changes in order using the handlers registered for
+each (object type, operation). A failed replay is retried on the next
+pass, up to ovn_journal_max_retries times.
+"""
+
+import functools
+import threading
+import time
+
+from neutron.db import api as db_api
+from oslo_log import log
+from oslo_serialization import jsonutils
+
+from networking_ovn._i18n import _, _LE, _LI, _LW
+from networking_ovn.common import config
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.db import db
+
+LOG = log.getLogger(__name__)
+
+# Interval in seconds at which wait_for_replay checks the journal.
+REPLAY_POLL_INTERVAL = 0.2
+
+_HANDLERS = {}
+_JOURNAL_THREAD = None
+
+
+def register_handler(object_type, operation, handler):
+    """Register the callable replaying a kind of journal rows.
+
+    The handler is called with the keyword arguments the rows were
+    recorded with, and raises an exception if the replay failed.
+    """
+    _HANDLERS[(object_type, operation)] = handler
+
+
+def record(context, object_type, object_uuid, operation, **data):
+    """Append an OVN_Northbound DB change to the journal.
+
+    The row is written in the DB transaction of context, if one is
+    active, so that it is rolled back with the Neutron change.
+    """
+    LOG.debug('Recording %(operation)s %(type)s %(uuid)s in the OVN journal',
+              {'operation': operation, 'type': object_type,
+               'uuid': object_uuid})
+    db.create_pending_row(context.session, object_type, object_uuid,
+                          operation, data)
+
+
+def start():
+    """Start the journal thread of this process, if not already started."""
+    global _JOURNAL_THREAD
+    if _JOURNAL_THREAD is None:
+        _JOURNAL_THREAD = OvnJournalThread()
+        _JOURNAL_THREAD.start()
+
+
+def wake_up():
+    """Have the journal thread replay the pending rows now."""
+    if _JOURNAL_THREAD is not None:
+        _JOURNAL_THREAD.set_sync_event()
+
+
+def wait_for_replay(object_uuids):
+    """Wait until the journal rows of the resources are replayed.
+
+    Called before the OVN_Northbound DB writes still done while processing
+    an API request, when they depend on resources whose changes may be
+    waiting in the journal, e.g. adding an interface to a router just
+    created. Raises RuntimeError if the rows are not replayed within
+    ovsdb_timeout seconds. Does nothing when the journal is disabled.
+    """
+    object_uuids = set(object_uuids)
+    if not config.is_ovn_journal_enabled() or not object_uuids:
+        return
+    session = db_api.get_session()
+    deadline = time.time() + config.get_ovn_ovsdb_timeout()
+    while db.has_pending_rows(session, object_uuids):
+        if time.time() > deadline:
+            msg = _('Timed out waiting for the OVN journal rows of %s to be '
+                    'replayed') % ', '.join(sorted(object_uuids))
+            raise RuntimeError(msg)
+        wake_up()
+        time.sleep(REPLAY_POLL_INTERVAL)
+
+
+def replayed_by_journal(f):
+    """Skip the decorated method when the journal is enabled.
+
+    Used on the postcommit methods whose change was recorded during
+    precommit: the journal thread is woken up to replay it instead.
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        if config.is_ovn_journal_enabled():
+            wake_up()
+            return
+        return f(*args, **kwargs)
+    return wrapper
+
+
+class OvnJournalThread(object):
+    """Replays the journal rows to the OVN_Northbound DB."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        LOG.info(_LI('Starting the OVN journal thread'))
+        self._thread = threading.Thread(name='ovn-journal',
+                                        target=self.run_sync_thread)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def set_sync_event(self):
+        self.event.set()
+
+    def run_sync_thread(self):
+        while True:
+            self.event.wait(config.get_ovn_journal_sync_interval())
+            self.event.clear()
+            try:
+                self.sync_pending_rows()
+            except Exception:
+                # An unexpected error (e.g. Neutron DB unavailable) must not
+                # stop the thread, the rows are replayed on the next pass.
+                LOG.exception(_LE('Unexpected exception in the OVN journal '
+                                  'thread'))
+
+    def sync_pending_rows(self):
+        session = db_api.get_session()
+        timeout = config.get_ovn_journal_processing_timeout()
+        db.reset_stale_processing_rows(session, timeout)
+        while True:
+            rows = db.claim_pending_rows(
+                session, config.get_ovn_journal_batch_size())
+            if not rows:
+                return
+            LOG.debug('Replaying %d OVN journal rows', len(rows))
+            claimed_at = time.time()
+            failed_keys = set()
+            for index, row in enumerate(rows):
+                if time.time() - claimed_at > timeout / 2.0:
+                    # The batch is slow to replay, keep its remaining rows
+                    # from being reset and claimed by another thread.
+                    db.touch_rows(session, rows[index:])
+                    claimed_at = time.time()
+                key = db.get_ordering_key(row)
+                if key in failed_keys:
+                    # An older row of the same resource has to be retried
+                    # first, give this one back untouched.
+                    db.update_row_state(session, row,
+                                        ovn_const.JOURNAL_PENDING)
+                elif not self._sync_row(session, row):
+                    failed_keys.add(key)
+            if failed_keys:
+                # Leave the retries to the next pass.
+                return
+
+    def _sync_row(self, session, row):
+        """Replay a row, return False if it has to be retried."""
+        handler = _HANDLERS.get((row.object_type, row.operation))
+        try:
+            if handler is None:
+                msg = _('No handler registered for %(operation)s '
+                        '%(type)s journal rows') % {
+                            'operation': row.operation,
+                            'type': row.object_type}
+                raise RuntimeError(msg)
+            data = jsonutils.loads(row.data) if row.data else {}
+            handler(**data)
+        except Exception:
+            retry_count = row.retry_count + 1
+            if retry_count > config.get_ovn_journal_max_retries():
+                LOG.exception(_LE('Failed to replay OVN journal row '
+                                  '%(seqnum)s (%(operation)s %(type)s '
+                                  '%(uuid)s), giving up'),
+                              {'seqnum': row.seqnum,
+                               'operation': row.operation,
+                               'type': row.object_type,
+                               'uuid': row.object_uuid})
+                db.update_row_state(session, row, ovn_const.JOURNAL_FAILED,
+                                    retry_count)
+                return True
+            LOG.warning(_LW('Failed to replay OVN journal row %(seqnum)s '
+                            '(%(operation)s %(type)s %(uuid)s), attempt '
+                            '%(count)d'),
+                        {'seqnum': row.seqnum, 'operation': row.operation,
+                         'type': row.object_type, 'uuid': row.object_uuid,
+                         'count': retry_count},
+                        exc_info=True)
+            db.update_row_state(session, row, ovn_const.JOURNAL_PENDING,
+                                retry_count)
+            return False
+        db.delete_row(session, row)
+        return True
@@ -15,20 +15,27 @@
 import netaddr
 import six
 
+from neutron_lib import constants as n_const
 from neutron_lib import exceptions as n_exc
 from neutron_lib.utils import helpers
 from oslo_log import log
 
+from neutron.callbacks import events
+from neutron.callbacks import registry
+from neutron.callbacks import resources
 from neutron.db import common_db_mixin
 from neutron.db import extraroute_db
+from neutron.extensions import l3
 from neutron import manager
 from neutron.plugins.common import constants
 from neutron.services import service_base
 
 from networking_ovn._i18n import _LE, _LI
+from networking_ovn.common import config
 from networking_ovn.common import constants as ovn_const
 from networking_ovn.common import extensions
 from networking_ovn.common import utils
+from networking_ovn.journal import journal
 from networking_ovn.l3 import l3_ovn_scheduler
 from networking_ovn.ovsdb import impl_idl_ovn
 
@@ -55,6 +62,38 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
         self._sb_ovn_idl = None
         self._plugin_property = None
         self.scheduler = l3_ovn_scheduler.get_scheduler()
+        if config.is_ovn_journal_enabled():
+            self._register_journal_handlers()
+
+    def _register_journal_handlers(self):
+        for operation, handler in (
+                (ovn_const.JOURNAL_CREATE, self.create_lrouter_in_ovn),
+                (ovn_const.JOURNAL_UPDATE, self.update_lrouter_in_ovn),
+                (ovn_const.JOURNAL_DELETE, self.delete_lrouter_in_ovn)):
+            journal.register_handler(ovn_const.JOURNAL_ROUTER, operation,
+                                     handler)
+        # The router creation and deletion are recorded in the DB
+        # transaction of the router, and rolled back with it.
+        registry.subscribe(self._record_router_create,
+                           resources.ROUTER,
+                           events.PRECOMMIT_CREATE)
+        registry.subscribe(self._record_router_delete,
+                           resources.ROUTER,
+                           events.PRECOMMIT_DELETE)
+
+    def _record_router_create(self, resource, event, trigger, **kwargs):
+        router_db = kwargs['router_db']
+        router = {'id': router_db.id,
+                  'name': router_db.name,
+                  'admin_state_up': router_db.admin_state_up}
+        journal.record(kwargs['context'], ovn_const.JOURNAL_ROUTER,
+                       router_db.id, ovn_const.JOURNAL_CREATE, router=router)
+
+    def _record_router_delete(self, resource, event, trigger, **kwargs):
+        router_id = kwargs['router_id']
+        journal.record(kwargs['context'], ovn_const.JOURNAL_ROUTER,
+                       router_id, ovn_const.JOURNAL_DELETE,
+                       router_id=router_id)
 
     @property
     def _ovn(self):
@@ -87,6 +126,9 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
     def create_router(self, context, router):
         router = super(OVNL3RouterPlugin, self).create_router(
             context, router)
+        if config.is_ovn_journal_enabled():
+            journal.wake_up()
+            return router
         try:
             self.create_lrouter_in_ovn(router)
         except Exception:
@@ -116,13 +158,53 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
 
     def update_router(self, context, id, router):
         original_router = self.get_router(context, id)
+        if config.is_ovn_journal_enabled():
+            return self._update_router_in_journal(context, id,
+                                                  original_router, router)
         result = super(OVNL3RouterPlugin, self).update_router(
             context, id, router)
 
+        try:
+            self.update_lrouter_in_ovn(id, original_router, router)
+        except Exception:
+            LOG.exception(_LE('Unable to update lrouter for %s'), id)
+            super(OVNL3RouterPlugin, self).update_router(context,
+                                                         id,
+                                                         original_router)
+            raise n_exc.ServiceUnavailable()
+
+        return result
+
+    def _update_router_in_journal(self, context, router_id, original_router,
+                                  router):
+        gw_info = router['router'].pop(l3.EXTERNAL_GW_INFO,
+                                       n_const.ATTR_NOT_SPECIFIED)
+        if gw_info is not n_const.ATTR_NOT_SPECIFIED:
+            # The gateway port is created or deleted through the core
+            # plugin, which can't be called inside the transaction below.
+            super(OVNL3RouterPlugin, self).update_router(
+                context, router_id, {'router': {l3.EXTERNAL_GW_INFO: gw_info}})
+        with context.session.begin(subtransactions=True):
+            result = super(OVNL3RouterPlugin, self).update_router(
+                context, router_id, router)
+            journal.record(context, ovn_const.JOURNAL_ROUTER, router_id,
+                           ovn_const.JOURNAL_UPDATE, router_id=router_id,
+                           original_router=original_router, router=router)
+        journal.wake_up()
+        return result
+
+    def update_lrouter_in_ovn(self, router_id, original_router, router):
+        """Update lrouter in OVN
+
+        @param router_id: Id of the router to be updated in OVN
+        @param original_router: Router before the update
+        @param router: Router update request body
+        @return: Nothing
+        """
         update = {}
         added = []
         removed = []
-        router_name = utils.ovn_name(id)
+        router_name = utils.ovn_name(router_id)
         if 'admin_state_up' in router['router']:
             enabled = router['router']['admin_state_up']
             if enabled != original_router['admin_state_up']:
@@ -141,36 +223,32 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
                 original_router['routes'], routes)
 
         if update or added or removed:
-            try:
-                with self._ovn.transaction(check_error=True) as txn:
-                    if update:
-                        txn.add(self._ovn.update_lrouter(router_name,
-                                **update))
-
-                    for route in added:
-                        txn.add(self._ovn.add_static_route(router_name,
-                                ip_prefix=route['destination'],
-                                nexthop=route['nexthop']))
-
-                    for route in removed:
-                        txn.add(self._ovn.delete_static_route(router_name,
-                                ip_prefix=route['destination'],
-                                nexthop=route['nexthop']))
-            except Exception:
-                LOG.exception(_LE('Unable to update lrouter for %s'), id)
-                super(OVNL3RouterPlugin, self).update_router(context,
-                                                             id,
-                                                             original_router)
-                raise n_exc.ServiceUnavailable()
+            with self._ovn.transaction(check_error=True) as txn:
+                if update:
+                    txn.add(self._ovn.update_lrouter(router_name, **update))
 
-        return result
+                for route in added:
+                    txn.add(self._ovn.add_static_route(router_name,
+                            ip_prefix=route['destination'],
+                            nexthop=route['nexthop']))
+
+                for route in removed:
+                    txn.add(self._ovn.delete_static_route(router_name,
+                            ip_prefix=route['destination'],
+                            nexthop=route['nexthop']))
 
     def delete_router(self, context, id):
-        router_name = utils.ovn_name(id)
         ret_val = super(OVNL3RouterPlugin, self).delete_router(context, id)
-        self._ovn.delete_lrouter(router_name).execute(check_error=True)
+        if config.is_ovn_journal_enabled():
+            journal.wake_up()
+        else:
+            self.delete_lrouter_in_ovn(id)
         return ret_val
 
+    def delete_lrouter_in_ovn(self, router_id):
+        self._ovn.delete_lrouter(
+            utils.ovn_name(router_id)).execute(check_error=True)
+
     def get_networks_for_lrouter_port(self, context, port_fixed_ips):
         networks = set()
         for fixed_ip in port_fixed_ips:
@@ -232,6 +310,9 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
                 context, router_id, interface_info)
 
         port = self._plugin.get_port(context, router_interface_info['port_id'])
+        # The creation of the router or of its Logical_Switch_Port may still
+        # be waiting in the journal.
+        journal.wait_for_replay([router_id, port['id']])
         if (len(router_interface_info['subnet_ids']) == 1 and
                 len(port['fixed_ips']) > 1):
             # NOTE(lizk) It's adding a subnet onto an already existing router
@@ -246,6 +327,7 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
             super(OVNL3RouterPlugin, self).remove_router_interface(
                 context, router_id, interface_info)
         port_id = router_interface_info['port_id']
+        journal.wait_for_replay([router_id, port_id])
         try:
             port = self._plugin.get_port(context, port_id)
             # The router interface port still exists, call ovn to update it.
@@ -263,7 +345,9 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
         valid_chassis_list = self._sb_ovn.get_all_chassis()
         unhosted_routers = self._ovn.get_unhosted_routers(valid_chassis_list)
         if unhosted_routers:
-            with self._ovn.transaction(check_error=True) as txn:
+            with self._ovn.transaction(
+                    check_error=True,
+                    priority=ovn_const.OVN_TXN_PRIORITY_BULK) as txn:
                 for r_name, r_options in six.iteritems(unhosted_routers):
                     chassis = self.scheduler.select(self._ovn, self._sb_ovn,
                                                     r_name)
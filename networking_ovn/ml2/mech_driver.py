@@ -13,8 +13,11 @@
 #
 
 import collections
+import copy
+import itertools
 import netaddr
 
+from eventlet import greenthread
 from neutron_lib.api import validators
 from neutron_lib import constants as const
 from neutron_lib import exceptions as n_exc
@@ -29,6 +32,7 @@ from neutron.callbacks import resources
 from neutron.common import utils as n_utils
 from neutron import context as n_context
 from neutron.db import provisioning_blocks
+from neutron.extensions import extra_dhcp_opt as edo_ext
 from neutron.extensions import portbindings
 from neutron.extensions import portsecurity as psec
 from neutron.extensions import providernet as pnet
@@ -38,11 +42,12 @@ from neutron.plugins.ml2 import driver_api
 from neutron.services.qos import qos_consts
 from neutron.services.segments import db as segment_service_db
 
-from networking_ovn._i18n import _, _LI, _LW
+from networking_ovn._i18n import _, _LE, _LI, _LW
 from networking_ovn.common import acl as ovn_acl
 from networking_ovn.common import config
 from networking_ovn.common import constants as ovn_const
 from networking_ovn.common import utils
+from networking_ovn.journal import journal
 from networking_ovn.ml2 import qos_driver
 from networking_ovn.ml2 import trunk_driver
 from networking_ovn import ovn_db_sync
@@ -59,6 +64,34 @@ OvnPortInfo = collections.namedtuple('OvnPortInfo', ['type', 'options',
                                                      'dhcpv4_options',
                                                      'dhcpv6_options'])
 
+# Neutron port attributes which have an effect on the port's OVN
+# Logical_Switch_Port, ACLs, address sets or DHCP_Options.
+OVN_PORT_RELEVANT_ATTRIBUTES = (
+    'name', 'network_id', 'mac_address', 'fixed_ips', 'admin_state_up',
+    'device_owner', 'security_groups', 'allowed_address_pairs',
+    'qos_policy_id', psec.PORTSECURITY, edo_ext.EXTRADHCPOPTS,
+    ovn_const.OVN_PORT_BINDING_PROFILE)
+
+# Seconds after which the deferred OVN deletes of a network teardown whose
+# network deletion didn't complete are run one by one.
+TEARDOWN_TIMEOUT = 300
+
+
+def _normalize_lsp_column(column, value):
+    # Bring a Logical_Switch_Port column value, either as computed by the
+    # driver or as read from the NB DB, to a comparable form. DHCP_Options
+    # commands (see get_port_dhcp_options) never compare equal to a stored
+    # uuid, so the port's own DHCP_Options row is always rewritten.
+    if column in ('parent_name', 'tag', 'enabled'):
+        if isinstance(value, list):
+            value = value[0] if value else None
+        return value
+    if column == 'type':
+        return value or ''
+    if column in ('options', 'external_ids'):
+        return dict((k, str(v)) for k, v in six.iteritems(value or {}))
+    return sorted(str(v) for v in value or [])
+
 
 class OVNMechanismDriver(driver_api.MechanismDriver):
     """OVN ML2 mechanism driver
@@ -95,12 +128,17 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         self._sb_ovn = None
         self._plugin_property = None
         self.sg_enabled = ovn_acl.is_sg_enabled()
+        # Network id vs the ports and subnets of the networks being deleted
+        # whose OVN deletes are deferred, see _teardown_network.
+        self._torn_down_networks = {}
         if cfg.CONF.SECURITYGROUP.firewall_driver:
             LOG.warning(_LW('Firewall driver configuration is ignored'))
         self._setup_vif_port_bindings()
         self.subscribe()
         self.qos_driver = qos_driver.OVNQosDriver(self)
         self.trunk_driver = trunk_driver.OVNTrunkDriver.create(self)
+        if config.is_ovn_journal_enabled():
+            self._register_journal_handlers()
 
     @property
     def _plugin(self):
@@ -137,6 +175,10 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                            resources.SEGMENT,
                            events.PRECOMMIT_CREATE)
 
+        registry.subscribe(self._teardown_network,
+                           resources.NETWORK,
+                           events.BEFORE_DELETE)
+
         # Handle security group/rule notifications
         if self.sg_enabled:
             registry.subscribe(self._process_sg_notification,
@@ -180,6 +222,38 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             )
             self.sb_synchronizer.sync()
 
+        if config.is_ovn_journal_enabled():
+            journal.start()
+
+    def _register_journal_handlers(self):
+        for object_type, operation, handler in (
+                (ovn_const.JOURNAL_NETWORK, ovn_const.JOURNAL_CREATE,
+                 self._create_network),
+                (ovn_const.JOURNAL_NETWORK, ovn_const.JOURNAL_UPDATE,
+                 self._update_network),
+                (ovn_const.JOURNAL_NETWORK, ovn_const.JOURNAL_DELETE,
+                 self._delete_network),
+                (ovn_const.JOURNAL_SUBNET, ovn_const.JOURNAL_CREATE,
+                 self._create_subnet),
+                (ovn_const.JOURNAL_SUBNET, ovn_const.JOURNAL_UPDATE,
+                 self._update_subnet),
+                (ovn_const.JOURNAL_SUBNET, ovn_const.JOURNAL_DELETE,
+                 self._delete_subnet),
+                (ovn_const.JOURNAL_PORT, ovn_const.JOURNAL_CREATE,
+                 self._create_port),
+                (ovn_const.JOURNAL_PORT, ovn_const.JOURNAL_UPDATE,
+                 self.update_port),
+                (ovn_const.JOURNAL_PORT, ovn_const.JOURNAL_DELETE,
+                 self._delete_port)):
+            journal.register_handler(object_type, operation, handler)
+
+    @staticmethod
+    def _record_in_journal(context, object_type, object_uuid, operation,
+                           **data):
+        if config.is_ovn_journal_enabled():
+            journal.record(context._plugin_context, object_type, object_uuid,
+                           operation, **data)
+
     def _process_sg_notification(self, resource, event, trigger, **kwargs):
         sg = kwargs.get('security_group')
         external_ids = {ovn_const.OVN_SG_NAME_EXT_ID_KEY: sg['name']}
@@ -257,7 +331,12 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         of the current transaction.
         """
         self._validate_network_segments(context.network_segments)
+        self._record_in_journal(context, ovn_const.JOURNAL_NETWORK,
+                                context.current['id'],
+                                ovn_const.JOURNAL_CREATE,
+                                network=context.current)
 
+    @journal.replayed_by_journal
     def create_network_postcommit(self, context):
         """Create a network.
 
@@ -269,7 +348,9 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         drastically affect performance. Raising an exception will
         cause the deletion of the resource.
         """
-        network = context.current
+        self._create_network(context.current)
+
+    def _create_network(self, network):
         physnet = self._get_attribute(network, pnet.PHYSICAL_NETWORK)
         segid = self._get_attribute(network, pnet.SEGMENTATION_ID)
         self.create_network_in_ovn(network, {}, physnet, segid)
@@ -324,7 +405,13 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         state or state changes that it does not know or care about.
         """
         self._validate_network_segments(context.network_segments)
+        self._record_in_journal(context, ovn_const.JOURNAL_NETWORK,
+                                context.current['id'],
+                                ovn_const.JOURNAL_UPDATE,
+                                network=context.current,
+                                original_network=context.original)
 
+    @journal.replayed_by_journal
     def update_network_postcommit(self, context):
         """Update a network.
 
@@ -341,12 +428,31 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         network state.  It is up to the mechanism driver to ignore
         state or state changes that it does not know or care about.
         """
-        network = context.current
-        original_network = context.original
+        self._update_network(context.current, context.original)
+
+    def _update_network(self, network, original_network):
         if network['name'] != original_network['name']:
             self._set_network_name(network['id'], network['name'])
         self.qos_driver.update_network(network, original_network)
 
+    def delete_network_precommit(self, context):
+        """Delete resources for a network.
+
+        :param context: NetworkContext instance describing the current
+        state of the network, prior to the call to delete it.
+
+        Delete network resources previously allocated by this
+        mechanism driver for a network. Called inside transaction
+        context on session. Runtime errors are not expected, but
+        raising an exception will result in rollback of the
+        transaction.
+        """
+        self._record_in_journal(context, ovn_const.JOURNAL_NETWORK,
+                                context.current['id'],
+                                ovn_const.JOURNAL_DELETE,
+                                network=context.current)
+
+    @journal.replayed_by_journal
     def delete_network_postcommit(self, context):
         """Delete a network.
 
@@ -359,26 +465,172 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         expected, and will not prevent the resource from being
         deleted.
         """
-        network = context.current
-        self._nb_ovn.delete_lswitch(
-            utils.ovn_name(network['id']), if_exists=True).execute(
-                check_error=True)
+        self._delete_network(context.current)
+
+    def _teardown_network(self, resource, event, trigger, **kwargs):
+        """Prepare the teardown of the OVN resources of a network.
+
+        Before deleting a network, ML2 deletes its DHCP ports and its
+        subnets one by one, each in its own OVN NB transaction. When the
+        network has no other ports, the OVN deletes of these ports and
+        subnets are deferred instead, and once the deletion of the network
+        is committed, delete_network_postcommit deletes the logical switch,
+        with its ports and ACLs, the DHCP_Options rows of its subnets and
+        ports and the address set entries of its ports at once.
+
+        Nothing is deleted from the OVN NB DB here. If the deletion of the
+        network fails, e.g. because a port was created in the meantime,
+        the deferred deletes are run one by one by
+        _flush_torn_down_network(): when a port or subnet is created on the
+        network, when its deletion is attempted again, and at the latest
+        TEARDOWN_TIMEOUT seconds after the teardown started.
+        """
+        if config.is_ovn_journal_enabled():
+            # The journal replays the deletes in order.
+            return
+        network_id = kwargs['network_id']
+        # A previous attempt to delete the network failed.
+        self._flush_torn_down_network(network_id)
+        admin_context = n_context.get_admin_context()
+        ports = self._plugin.get_ports(
+            admin_context, filters={'network_id': [network_id]},
+            fields=['id', 'device_owner'])
+        if any(port['device_owner'] != const.DEVICE_OWNER_DHCP
+               for port in ports):
+            # The network is in use, ML2 fails to delete it.
+            return
+        subnets = self._plugin.get_subnets(
+            admin_context, filters={'network_id': [network_id]},
+            fields=['id'])
+        torn_down = {
+            'ids': set(resource['id'] for resource in ports + subnets),
+            'ports': [],
+            'subnets': []}
+        self._torn_down_networks[network_id] = torn_down
+        greenthread.spawn_after(TEARDOWN_TIMEOUT, self._expire_teardown,
+                                network_id, torn_down)
+
+    def _defer_teardown(self, kind, resource):
+        # Defer the OVN delete of a port or subnet of a network being torn
+        # down, return whether it was deferred.
+        torn_down = self._torn_down_networks.get(resource['network_id'])
+        if torn_down is None or resource['id'] not in torn_down['ids']:
+            return False
+        torn_down[kind].append(resource)
+        return True
+
+    def _flush_torn_down_network(self, network_id):
+        """Run the deferred deletes of an incomplete network teardown.
 
+        The ports and subnets are already deleted from the Neutron DB, their
+        OVN resources are deleted one by one.
+        """
+        torn_down = self._torn_down_networks.pop(network_id, None)
+        if torn_down is None:
+            return
+        try:
+            for port in torn_down['ports']:
+                self._delete_port(port)
+            for subnet in torn_down['subnets']:
+                self._delete_subnet(subnet)
+        except Exception:
+            LOG.exception(_LE('Failed to delete the OVN resources of the '
+                              'deleted ports and subnets of network %s'),
+                          network_id)
+
+    def _expire_teardown(self, network_id, torn_down):
+        # The network deletion neither completed nor failed visibly, e.g.
+        # ML2 failed before calling delete_network_postcommit.
+        if self._torn_down_networks.get(network_id) is torn_down:
+            LOG.warning(_LW('Network %s teardown timed out, deleting the '
+                            'OVN resources of its deleted ports and subnets '
+                            'one by one'), network_id)
+            self._flush_torn_down_network(network_id)
+
+    def _delete_network(self, network):
+        torn_down = self._torn_down_networks.pop(network['id'], None)
+        if torn_down is None:
+            self._nb_ovn.delete_lswitch(
+                utils.ovn_name(network['id']), if_exists=True).execute(
+                    check_error=True)
+            return
+
+        addrs_remove = collections.defaultdict(list)
+        for port in torn_down['ports']:
+            addresses = ovn_acl.acl_port_ips(port)
+            for sg_id in port.get('security_groups', []):
+                for ip_version in addresses:
+                    addrs_remove[utils.ovn_addrset_name(
+                        sg_id, ip_version)].extend(addresses[ip_version])
+        subnet_ids = set(subnet['id'] for subnet in torn_down['subnets'])
+
+        dhcp_options = self._nb_ovn.get_all_dhcp_options()
+        with self._nb_ovn.chunked_transaction(
+                'Network %s teardown' % network['id'], check_error=True,
+                priority=ovn_const.OVN_TXN_PRIORITY_INTERACTIVE) as txn:
+            for name, addrs in six.iteritems(addrs_remove):
+                if addrs:
+                    txn.add(self._nb_ovn.update_address_set(
+                        name=name, addrs_add=None, addrs_remove=addrs))
+            for options in itertools.chain(
+                    *[six.itervalues(dhcp_options[key])
+                      for key in ('subnets', 'ports_v4', 'ports_v6')]):
+                if options['external_ids']['subnet_id'] in subnet_ids:
+                    txn.add(self._nb_ovn.delete_dhcp_options(
+                        options['uuid']))
+            # The ports and the ACLs of the logical switch are garbage
+            # collected with it.
+            txn.add(self._nb_ovn.delete_lswitch(
+                utils.ovn_name(network['id']), if_exists=True))
+
+    def create_subnet_precommit(self, context):
+        self._record_in_journal(context, ovn_const.JOURNAL_SUBNET,
+                                context.current['id'],
+                                ovn_const.JOURNAL_CREATE,
+                                subnet=context.current,
+                                network=context.network.current)
+
+    @journal.replayed_by_journal
     def create_subnet_postcommit(self, context):
-        subnet = context.current
+        self._create_subnet(context.current, context.network.current)
+
+    def _create_subnet(self, subnet, network):
+        # The network can't be deleted anymore.
+        self._flush_torn_down_network(network['id'])
         if subnet['enable_dhcp'] and config.is_ovn_dhcp():
-            self.add_subnet_dhcp_options_in_ovn(subnet,
-                                                context.network.current)
+            self.add_subnet_dhcp_options_in_ovn(subnet, network)
+
+    def update_subnet_precommit(self, context):
+        self._record_in_journal(context, ovn_const.JOURNAL_SUBNET,
+                                context.current['id'],
+                                ovn_const.JOURNAL_UPDATE,
+                                subnet=context.current,
+                                original_subnet=context.original,
+                                network=context.network.current)
 
+    @journal.replayed_by_journal
     def update_subnet_postcommit(self, context):
-        subnet = context.current
+        self._update_subnet(context.current, context.original,
+                            context.network.current)
+
+    def _update_subnet(self, subnet, original_subnet, network):
         if config.is_ovn_dhcp() and (
-            subnet['enable_dhcp'] or context.original['enable_dhcp']):
-            self.add_subnet_dhcp_options_in_ovn(subnet,
-                                                context.network.current)
+            subnet['enable_dhcp'] or original_subnet['enable_dhcp']):
+            self.add_subnet_dhcp_options_in_ovn(subnet, network)
 
+    def delete_subnet_precommit(self, context):
+        self._record_in_journal(context, ovn_const.JOURNAL_SUBNET,
+                                context.current['id'],
+                                ovn_const.JOURNAL_DELETE,
+                                subnet=context.current)
+
+    @journal.replayed_by_journal
     def delete_subnet_postcommit(self, context):
-        subnet = context.current
+        self._delete_subnet(context.current)
+
+    def _delete_subnet(self, subnet):
+        if self._defer_teardown('subnets', subnet):
+            return
         if config.is_ovn_dhcp():
             with self._nb_ovn.transaction(check_error=True) as txn:
                 subnet_dhcp_options = self._nb_ovn.get_subnet_dhcp_options(
@@ -488,6 +740,8 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         self.validate_and_get_data_from_binding_profile(port)
         if self._is_port_provisioning_required(port, context.host):
             self._insert_port_provisioning_block(context._plugin_context, port)
+        self._record_in_journal(context, ovn_const.JOURNAL_PORT, port['id'],
+                                ovn_const.JOURNAL_CREATE, port=port)
 
     def validate_and_get_data_from_binding_profile(self, port):
         if (ovn_const.OVN_PORT_BINDING_PROFILE not in port or
@@ -586,6 +840,7 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             provisioning_blocks.L2_AGENT_ENTITY
         )
 
+    @journal.replayed_by_journal
     def create_port_postcommit(self, context):
         """Create a port.
 
@@ -596,7 +851,11 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         drastically affect performance.  Raising an exception will
         result in the deletion of the resource.
         """
-        port = context.current
+        self._create_port(context.current)
+
+    def _create_port(self, port):
+        # The network can't be deleted anymore.
+        self._flush_torn_down_network(port['network_id'])
         ovn_port_info = self.get_ovn_port_options(port)
         self.create_port_in_ovn(port, ovn_port_info)
 
@@ -624,7 +883,8 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
 
         return list(allowed_addresses)
 
-    def get_ovn_port_options(self, port, qos_options=None):
+    def get_ovn_port_options(self, port, qos_options=None,
+                             subnets_dhcp_options=None):
         binding_profile = self.validate_and_get_data_from_binding_profile(port)
         if qos_options is None:
             qos_options = self.qos_driver.get_qos_options(port)
@@ -649,63 +909,162 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                 addresses += ' ' + ip['ip_address']
             port_security = self._get_allowed_addresses_from_port(port)
 
-        port_dhcpv4_options_info = self.get_port_dhcp_options(port, 4)
-        dhcpv4_options = []
-        if port_dhcpv4_options_info and 'uuid' in port_dhcpv4_options_info:
-            dhcpv4_options = [port_dhcpv4_options_info['uuid']]
-
-        port_dhcpv6_options_info = self.get_port_dhcp_options(port, 6)
-        dhcpv6_options = []
-        if port_dhcpv6_options_info and 'uuid' in port_dhcpv6_options_info:
-            dhcpv6_options = [port_dhcpv6_options_info['uuid']]
+        dhcpv4_options = self.get_lsp_dhcp_options_column(
+            self.get_port_dhcp_options(port, 4, subnets_dhcp_options))
+        dhcpv6_options = self.get_lsp_dhcp_options_column(
+            self.get_port_dhcp_options(port, 6, subnets_dhcp_options))
 
         return OvnPortInfo(port_type, options, [addresses], port_security,
                            parent_name, tag, dhcpv4_options, dhcpv6_options)
 
     def create_port_in_ovn(self, port, ovn_port_info):
-        external_ids = {ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}
-        lswitch_name = utils.ovn_name(port['network_id'])
         admin_context = n_context.get_admin_context()
         sg_cache = {}
         subnet_cache = {}
 
         with self._nb_ovn.transaction(check_error=True) as txn:
-            # The lport_name *must* be neutron port['id'].  It must match the
-            # iface-id set in the Interfaces table of the Open_vSwitch
-            # database which nova sets to be the port ID.
-            txn.add(self._nb_ovn.create_lswitch_port(
-                    lport_name=port['id'],
-                    lswitch_name=lswitch_name,
-                    addresses=ovn_port_info.addresses,
-                    external_ids=external_ids,
-                    parent_name=ovn_port_info.parent_name,
-                    tag=ovn_port_info.tag,
-                    enabled=port.get('admin_state_up'),
-                    options=ovn_port_info.options,
-                    type=ovn_port_info.type,
-                    port_security=ovn_port_info.port_security,
-                    dhcpv4_options=ovn_port_info.dhcpv4_options,
-                    dhcpv6_options=ovn_port_info.dhcpv6_options))
-
-            acls_new = ovn_acl.add_acls(self._plugin, admin_context,
-                                        port, sg_cache, subnet_cache)
-            for acl in acls_new:
-                txn.add(self._nb_ovn.add_acl(**acl))
-
-            sg_ids = port.get('security_groups', [])
-            if port.get('fixed_ips') and sg_ids:
-                addresses = ovn_acl.acl_port_ips(port)
-                # NOTE(rtheis): Fail port creation if the address set doesn't
-                # exist. This prevents ports from being created on any security
-                # groups out-of-sync between neutron and OVN.
-                for sg_id in sg_ids:
-                    for ip_version in addresses:
-                        if addresses[ip_version]:
-                            txn.add(self._nb_ovn.update_address_set(
-                                name=utils.ovn_addrset_name(sg_id, ip_version),
-                                addrs_add=addresses[ip_version],
-                                addrs_remove=None,
-                                if_exists=False))
+            addrset_updates = self._add_create_port_commands(
+                txn, port, ovn_port_info, admin_context,
+                sg_cache, subnet_cache)
+            # NOTE(rtheis): Fail port creation if the address set doesn't
+            # exist. This prevents ports from being created on any security
+            # groups out-of-sync between neutron and OVN.
+            for addrset_name, addrs in addrset_updates:
+                txn.add(self._nb_ovn.update_address_set(
+                    name=addrset_name,
+                    addrs_add=addrs,
+                    addrs_remove=None,
+                    if_exists=False))
+
+    def create_ports_in_ovn(self, ports):
+        """Create a batch of ports in OVN.
+
+        The security group, subnet, QoS and DHCP_Options lookups are shared
+        by all the ports, which are written to the NB DB in transactions of
+        at most nb_bulk_transaction_size ports. Each transaction carries the
+        ports' Logical_Switch_Ports and ACLs along with a single address
+        set update per security group and IP version. The ports of a
+        transaction which fails are retried one at a time, and a port whose
+        options are invalid is skipped, so that a port which can't be
+        created doesn't prevent the others from being.
+
+        :param ports: list of neutron port dictionaries
+        :returns:     the list of the ports created
+        """
+        admin_context = n_context.get_admin_context()
+        sg_cache = {}
+        subnet_cache = {}
+        subnet_ids = set(fixed_ip['subnet_id'] for port in ports
+                         for fixed_ip in port.get('fixed_ips', []))
+        subnets_dhcp_options = {}
+        if subnet_ids:
+            for opts in self._nb_ovn.get_subnets_dhcp_options(subnet_ids):
+                subnets_dhcp_options[opts['external_ids']['subnet_id']] = opts
+
+        qos_options = self.qos_driver.get_ports_qos_options(ports)
+
+        created = []
+        batch_size = config.get_ovn_nb_bulk_transaction_size()
+        for i in six.moves.range(0, len(ports), batch_size):
+            batch = []
+            for port in ports[i:i + batch_size]:
+                try:
+                    batch.append((port, self.get_ovn_port_options(
+                        port, qos_options=qos_options[port['id']],
+                        subnets_dhcp_options=subnets_dhcp_options)))
+                except Exception:
+                    LOG.exception(_LE('Create port in OVN NB failed for '
+                                      'port %s, invalid port options'),
+                                  port['id'])
+            if not batch:
+                continue
+            LOG.debug('Creating %(num)d ports in OVN NB DB (%(done)d of '
+                      '%(total)d done)', {'num': len(batch), 'done': i,
+                                          'total': len(ports)})
+            try:
+                self._create_ports_batch_in_ovn(batch, admin_context,
+                                                sg_cache, subnet_cache)
+            except RuntimeError:
+                LOG.warning(_LW('Create ports in OVN NB failed for ports '
+                                '%s, retrying them one at a time'),
+                            [port['id'] for port, _info in batch])
+            else:
+                created.extend(port for port, _info in batch)
+                continue
+            for port, ovn_port_info in batch:
+                try:
+                    self._create_ports_batch_in_ovn(
+                        [(port, ovn_port_info)], admin_context, sg_cache,
+                        subnet_cache)
+                except RuntimeError:
+                    LOG.warning(_LW('Create port in OVN NB failed for '
+                                    'port %s'), port['id'])
+                else:
+                    created.append(port)
+        return created
+
+    def _create_ports_batch_in_ovn(self, batch, admin_context, sg_cache,
+                                   subnet_cache):
+        with self._nb_ovn.transaction(
+                check_error=True,
+                priority=ovn_const.OVN_TXN_PRIORITY_BULK) as txn:
+            addrset_updates = collections.OrderedDict()
+            for port, ovn_port_info in batch:
+                for addrset_name, addrs in self._add_create_port_commands(
+                        txn, port, ovn_port_info, admin_context,
+                        sg_cache, subnet_cache):
+                    addrset_updates.setdefault(
+                        addrset_name, []).extend(addrs)
+            for addrset_name, addrs in six.iteritems(addrset_updates):
+                txn.add(self._nb_ovn.update_address_set(
+                    name=addrset_name,
+                    addrs_add=addrs,
+                    addrs_remove=None,
+                    if_exists=False))
+
+    def _add_create_port_commands(self, txn, port, ovn_port_info,
+                                  admin_context, sg_cache, subnet_cache):
+        """Add the commands creating the port's LSP and ACLs to txn.
+
+        Returns a list of (address set name, addresses) tuples which the
+        caller has to add to the port's security group address sets.
+        """
+        external_ids = {ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}
+        lswitch_name = utils.ovn_name(port['network_id'])
+
+        # The lport_name *must* be neutron port['id'].  It must match the
+        # iface-id set in the Interfaces table of the Open_vSwitch
+        # database which nova sets to be the port ID.
+        txn.add(self._nb_ovn.create_lswitch_port(
+                lport_name=port['id'],
+                lswitch_name=lswitch_name,
+                addresses=ovn_port_info.addresses,
+                external_ids=external_ids,
+                parent_name=ovn_port_info.parent_name,
+                tag=ovn_port_info.tag,
+                enabled=port.get('admin_state_up'),
+                options=ovn_port_info.options,
+                type=ovn_port_info.type,
+                port_security=ovn_port_info.port_security,
+                dhcpv4_options=ovn_port_info.dhcpv4_options,
+                dhcpv6_options=ovn_port_info.dhcpv6_options))
+
+        acls_new = ovn_acl.add_acls(self._plugin, admin_context,
+                                    port, sg_cache, subnet_cache)
+        for acl in acls_new:
+            txn.add(self._nb_ovn.add_acl(**acl))
+
+        addrset_updates = []
+        sg_ids = port.get('security_groups', [])
+        if port.get('fixed_ips') and sg_ids:
+            addresses = ovn_acl.acl_port_ips(port)
+            for sg_id in sg_ids:
+                for ip_version in addresses:
+                    if addresses[ip_version]:
+                        addrset_updates.append(
+                            (utils.ovn_addrset_name(sg_id, ip_version),
+                             addresses[ip_version]))
+        return addrset_updates
 
     def update_port_precommit(self, context):
         """Update resources of a port.
@@ -727,7 +1086,12 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         if self._is_port_provisioning_required(port, context.host,
                                                context.original_host):
             self._insert_port_provisioning_block(context._plugin_context, port)
+        if self._is_port_update_relevant(port, context.original):
+            self._record_in_journal(context, ovn_const.JOURNAL_PORT,
+                                    port['id'], ovn_const.JOURNAL_UPDATE,
+                                    port=port, original_port=context.original)
 
+    @journal.replayed_by_journal
     def update_port_postcommit(self, context):
         """Update a port.
 
@@ -749,93 +1113,165 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         self.update_port(port, original_port)
 
     def update_port(self, port, original_port, qos_options=None):
+        if qos_options is None and not self._is_port_update_relevant(
+                port, original_port):
+            LOG.debug('Update of port %s changes nothing OVN cares about, '
+                      'skipping the OVN NB DB update', port['id'])
+            return
         ovn_port_info = self.get_ovn_port_options(port, qos_options)
         self._update_port_in_ovn(original_port, port, ovn_port_info)
 
+    def update_ports_qos_options(self, ports, qos_options):
+        """Apply the same QoS options to a set of ports in OVN.
+
+        Only the options column of the Logical_Switch_Ports is written, and
+        only where it differs from qos_options, in transactions of at most
+        nb_bulk_transaction_size ports. vtep ports, whose options come from
+        their binding profile, are left untouched.
+        """
+        port_ids = [port['id'] for port in ports]
+        # Pending journal rows would write the ports with the old options.
+        journal.wait_for_replay(port_ids)
+        # The Logical_Switch_Ports are looked up in a single pass.
+        lsps = self._nb_ovn.get_lswitch_ports(port_ids)
+        lport_names = []
+        for port in ports:
+            binding_profile = port.get(ovn_const.OVN_PORT_BINDING_PROFILE)
+            if (validators.is_attr_set(binding_profile) and
+                    binding_profile.get('vtep-physical-switch')):
+                continue
+            if self._diff_lsp_columns(lsps.get(port['id']),
+                                      {'options': qos_options}):
+                lport_names.append(port['id'])
+
+        batch_size = config.get_ovn_nb_bulk_transaction_size()
+        for i in six.moves.range(0, len(lport_names), batch_size):
+            with self._nb_ovn.transaction(
+                    check_error=True,
+                    priority=ovn_const.OVN_TXN_PRIORITY_BULK) as txn:
+                for lport_name in lport_names[i:i + batch_size]:
+                    txn.add(self._nb_ovn.set_lswitch_port(
+                        lport_name=lport_name, if_exists=True,
+                        options=qos_options))
+        LOG.debug('Updated the QoS options of %(updated)d out of %(total)d '
+                  'ports in OVN NB DB',
+                  {'updated': len(lport_names), 'total': len(ports)})
+
+    @staticmethod
+    def _is_port_update_relevant(port, original_port):
+        return any(port.get(attr) != original_port.get(attr)
+                   for attr in OVN_PORT_RELEVANT_ATTRIBUTES)
+
+    def _get_changed_lsp_columns(self, lport_name, columns):
+        """Return the subset of columns which differ from the NB DB.
+
+        All the columns are returned if the Logical_Switch_Port is not
+        (yet) known to the IDL.
+        """
+        return self._diff_lsp_columns(
+            self._nb_ovn.get_lswitch_port(lport_name), columns)
+
+    @staticmethod
+    def _diff_lsp_columns(lsp, columns):
+        if not lsp:
+            return columns
+        return dict((col, value) for col, value in six.iteritems(columns)
+                    if (_normalize_lsp_column(col, value) !=
+                        _normalize_lsp_column(col, lsp.get(col))))
+
     def _update_port_in_ovn(self, original_port, port, ovn_port_info):
         external_ids = {
             ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}
         admin_context = n_context.get_admin_context()
         sg_cache = {}
         subnet_cache = {}
-
-        with self._nb_ovn.transaction(check_error=True) as txn:
-            txn.add(self._nb_ovn.set_lswitch_port(
-                    lport_name=port['id'],
-                    addresses=ovn_port_info.addresses,
-                    external_ids=external_ids,
-                    parent_name=ovn_port_info.parent_name,
-                    tag=ovn_port_info.tag,
-                    type=ovn_port_info.type,
-                    options=ovn_port_info.options,
-                    enabled=port['admin_state_up'],
-                    port_security=ovn_port_info.port_security,
-                    dhcpv4_options=ovn_port_info.dhcpv4_options,
-                    dhcpv6_options=ovn_port_info.dhcpv6_options))
-
-            # Determine if security groups or fixed IPs are updated.
-            old_sg_ids = set(original_port.get('security_groups', []))
-            new_sg_ids = set(port.get('security_groups', []))
-            detached_sg_ids = old_sg_ids - new_sg_ids
-            attached_sg_ids = new_sg_ids - old_sg_ids
-            is_fixed_ips_updated = \
-                original_port.get('fixed_ips') != port.get('fixed_ips')
-
-            # Refresh ACLs for changed security groups or fixed IPs.
-            if detached_sg_ids or attached_sg_ids or is_fixed_ips_updated:
-                # Note that update_acls will compare the port's ACLs to
-                # ensure only the necessary ACLs are added and deleted
-                # on the transaction.
-                acls_new = ovn_acl.add_acls(self._plugin,
-                                            admin_context,
-                                            port,
-                                            sg_cache,
-                                            subnet_cache)
-                txn.add(self._nb_ovn.update_acls([port['network_id']],
+        cmds = []
+
+        columns = self._get_changed_lsp_columns(port['id'], {
+            'addresses': ovn_port_info.addresses,
+            'external_ids': external_ids,
+            'parent_name': ovn_port_info.parent_name,
+            'tag': ovn_port_info.tag,
+            'type': ovn_port_info.type,
+            'options': ovn_port_info.options,
+            'enabled': port['admin_state_up'],
+            'port_security': ovn_port_info.port_security,
+            'dhcpv4_options': ovn_port_info.dhcpv4_options,
+            'dhcpv6_options': ovn_port_info.dhcpv6_options})
+        if columns:
+            cmds.append(self._nb_ovn.set_lswitch_port(
+                lport_name=port['id'], **columns))
+
+        # Determine if security groups or fixed IPs are updated.
+        old_sg_ids = set(original_port.get('security_groups', []))
+        new_sg_ids = set(port.get('security_groups', []))
+        detached_sg_ids = old_sg_ids - new_sg_ids
+        attached_sg_ids = new_sg_ids - old_sg_ids
+        is_fixed_ips_updated = \
+            original_port.get('fixed_ips') != port.get('fixed_ips')
+
+        # Refresh ACLs for changed security groups or fixed IPs.
+        if detached_sg_ids or attached_sg_ids or is_fixed_ips_updated:
+            # Note that update_acls will compare the port's ACLs to
+            # ensure only the necessary ACLs are added and deleted
+            # on the transaction.
+            acls_new = ovn_acl.add_acls(self._plugin,
+                                        admin_context,
+                                        port,
+                                        sg_cache,
+                                        subnet_cache)
+            cmds.append(self._nb_ovn.update_acls([port['network_id']],
                                                  [port],
                                                  {port['id']: acls_new},
                                                  need_compare=True))
 
-            # Refresh address sets for changed security groups or fixed IPs.
-            if (len(port.get('fixed_ips')) != 0 or
-                    len(original_port.get('fixed_ips')) != 0):
-                addresses = ovn_acl.acl_port_ips(port)
-                addresses_old = ovn_acl.acl_port_ips(original_port)
-                # Add current addresses to attached security groups.
-                for sg_id in attached_sg_ids:
+        # Refresh address sets for changed security groups or fixed IPs.
+        if (len(port.get('fixed_ips')) != 0 or
+                len(original_port.get('fixed_ips')) != 0):
+            addresses = ovn_acl.acl_port_ips(port)
+            addresses_old = ovn_acl.acl_port_ips(original_port)
+            # Add current addresses to attached security groups.
+            for sg_id in attached_sg_ids:
+                for ip_version in addresses:
+                    if addresses[ip_version]:
+                        cmds.append(self._nb_ovn.update_address_set(
+                            name=utils.ovn_addrset_name(sg_id, ip_version),
+                            addrs_add=addresses[ip_version],
+                            addrs_remove=None))
+            # Remove old addresses from detached security groups.
+            for sg_id in detached_sg_ids:
+                for ip_version in addresses_old:
+                    if addresses_old[ip_version]:
+                        cmds.append(self._nb_ovn.update_address_set(
+                            name=utils.ovn_addrset_name(sg_id, ip_version),
+                            addrs_add=None,
+                            addrs_remove=addresses_old[ip_version]))
+
+            if is_fixed_ips_updated:
+                # We have refreshed address sets for attached and detached
+                # security groups, so now we only need to take care of
+                # unchanged security groups.
+                unchanged_sg_ids = new_sg_ids & old_sg_ids
+                for sg_id in unchanged_sg_ids:
                     for ip_version in addresses:
-                        if addresses[ip_version]:
-                            txn.add(self._nb_ovn.update_address_set(
-                                name=utils.ovn_addrset_name(sg_id, ip_version),
-                                addrs_add=addresses[ip_version],
-                                addrs_remove=None))
-                # Remove old addresses from detached security groups.
-                for sg_id in detached_sg_ids:
-                    for ip_version in addresses_old:
-                        if addresses_old[ip_version]:
-                            txn.add(self._nb_ovn.update_address_set(
-                                name=utils.ovn_addrset_name(sg_id, ip_version),
-                                addrs_add=None,
-                                addrs_remove=addresses_old[ip_version]))
-
-                if is_fixed_ips_updated:
-                    # We have refreshed address sets for attached and detached
-                    # security groups, so now we only need to take care of
-                    # unchanged security groups.
-                    unchanged_sg_ids = new_sg_ids & old_sg_ids
-                    for sg_id in unchanged_sg_ids:
-                        for ip_version in addresses:
-                            addr_add = (set(addresses[ip_version]) -
-                                        set(addresses_old[ip_version])) or None
-                            addr_remove = (set(addresses_old[ip_version]) -
-                                           set(addresses[ip_version])) or None
-
-                            if addr_add or addr_remove:
-                                txn.add(self._nb_ovn.update_address_set(
-                                        name=utils.ovn_addrset_name(
-                                            sg_id, ip_version),
-                                        addrs_add=addr_add,
-                                        addrs_remove=addr_remove))
+                        addr_add = (set(addresses[ip_version]) -
+                                    set(addresses_old[ip_version])) or None
+                        addr_remove = (set(addresses_old[ip_version]) -
+                                       set(addresses[ip_version])) or None
+
+                        if addr_add or addr_remove:
+                            cmds.append(self._nb_ovn.update_address_set(
+                                name=utils.ovn_addrset_name(
+                                    sg_id, ip_version),
+                                addrs_add=addr_add,
+                                addrs_remove=addr_remove))
+
+        if not cmds:
+            LOG.debug('Port %s is up to date in the OVN NB DB', port['id'])
+            return
+        with self._nb_ovn.transaction(check_error=True) as txn:
+            for cmd in cmds:
+                txn.add(cmd)
 
     def _get_delete_lsp_dhcp_options_cmd(self, port):
         ret_cmds = []
@@ -845,16 +1281,26 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             ret_cmds.append(self._nb_ovn.delete_dhcp_options(opt['uuid']))
         return ret_cmds
 
-    def _get_subnet_dhcp_options_for_port(self, port, ip_version):
+    def _get_subnet_dhcp_options_for_port(self, port, ip_version,
+                                          subnets_dhcp_options=None):
         """Returns the subnet dhcp options for the port.
 
         Return the first found DHCP options belong for the port.
+        If subnets_dhcp_options (a dictionary of subnet id vs subnet DHCP
+        options) is given, it is used instead of scanning the NB DB.
         """
         subnets = [
             fixed_ip['subnet_id']
             for fixed_ip in port['fixed_ips']
             if netaddr.IPAddress(fixed_ip['ip_address']).version == ip_version]
-        get_opts = self._nb_ovn.get_subnets_dhcp_options(subnets)
+        if subnets_dhcp_options is None:
+            get_opts = self._nb_ovn.get_subnets_dhcp_options(subnets)
+        else:
+            # The caller owns the cache, hand out copies since the options
+            # may be extended with the port's extra DHCP options.
+            get_opts = [copy.deepcopy(subnets_dhcp_options[subnet_id])
+                        for subnet_id in subnets
+                        if subnet_id in subnets_dhcp_options]
         if get_opts:
             if ip_version == const.IP_VERSION_6:
                 # Always try to find a dhcpv6 stateful v6 subnet to return.
@@ -870,7 +1316,8 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                         return opts
             return get_opts[0]
 
-    def get_port_dhcp_options(self, port, ip_version):
+    def get_port_dhcp_options(self, port, ip_version,
+                              subnets_dhcp_options=None):
         lsp_dhcp_disabled, lsp_dhcp_opts = utils.get_lsp_dhcp_opts(
             port, ip_version)
 
@@ -878,7 +1325,7 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             return
 
         subnet_dhcp_options = self._get_subnet_dhcp_options_for_port(
-            port, ip_version)
+            port, ip_version, subnets_dhcp_options)
 
         if not subnet_dhcp_options:
             # NOTE(lizk): It's possible for Neutron to configure a port with IP
@@ -890,34 +1337,56 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         if not lsp_dhcp_opts:
             return subnet_dhcp_options
 
-        # This port has extra DHCP options defined.
-        # So we need to create a new row in DHCP_Options table for this
-        # port.
-        #
-        # TODO(numans) In cases where the below transaction is successful
-        # but the Logical_Switch_Port create or update transaction fails
-        # we need to delete the DHCP_Options row created else it will be
-        # an orphan row.
-        #
-        # NOTE(lizk) In cases where the below transaction is successful, but
-        # the Logical_Switch_Port get deleted before setting port dhcp options
-        # to it, we will delete the DHCP_Options row created to make sure
-        # no orphan left behind.
+        # This port has extra DHCP options defined, so it needs its own row
+        # in the DHCP_Options table. The row is not written here: the
+        # returned options carry the command writing it under 'cmd', and
+        # the Logical_Switch_Port command referencing it runs that command
+        # in its own transaction. This way no DHCP_Options row is left
+        # behind if the port transaction fails or the port is gone.
         subnet_dhcp_options['options'].update(lsp_dhcp_opts)
         subnet_dhcp_options['external_ids'].update(
             {'port_id': port['id']})
-        LOG.debug('Creating port dhcp options for port %s in OVN NB DB',
-                  port['id'])
         subnet_id = subnet_dhcp_options['external_ids']['subnet_id']
-        with self._nb_ovn.transaction(check_error=True) as txn:
-            txn.add(self._nb_ovn.add_dhcp_options(
-                subnet_id, port_id=port['id'],
-                cidr=subnet_dhcp_options['cidr'],
-                options=subnet_dhcp_options['options'],
-                external_ids=subnet_dhcp_options['external_ids']))
+        subnet_dhcp_options.pop('uuid', None)
+        subnet_dhcp_options['cmd'] = self._nb_ovn.add_dhcp_options(
+            subnet_id, port_id=port['id'],
+            cidr=subnet_dhcp_options['cidr'],
+            options=subnet_dhcp_options['options'],
+            external_ids=subnet_dhcp_options['external_ids'])
+        return subnet_dhcp_options
+
+    @staticmethod
+    def get_lsp_dhcp_options_column(dhcp_options_info):
+        """Returns the Logical_Switch_Port DHCP options column value.
+
+        dhcp_options_info is the return value of get_port_dhcp_options.
+        The column references either the subnet DHCP_Options row uuid or
+        the command writing the port's own row.
+        """
+        if not dhcp_options_info:
+            return []
+        if 'cmd' in dhcp_options_info:
+            return [dhcp_options_info['cmd']]
+        if 'uuid' in dhcp_options_info:
+            return [dhcp_options_info['uuid']]
+        return []
+
+    def delete_port_precommit(self, context):
+        """Delete resources of a port.
+
+        :param context: PortContext instance describing the current
+        state of the port, prior to the call to delete it.
 
-        return self._nb_ovn.get_port_dhcp_options(subnet_id, port['id'])
+        Called inside transaction context on session. Runtime errors
+        are not expected, but raising an exception will result in
+        rollback of the transaction.
+        """
+        self._record_in_journal(context, ovn_const.JOURNAL_PORT,
+                                context.current['id'],
+                                ovn_const.JOURNAL_DELETE,
+                                port=context.current)
 
+    @journal.replayed_by_journal
     def delete_port_postcommit(self, context):
         """Delete a port.
 
@@ -930,7 +1399,11 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         expected, and will not prevent the resource from being
         deleted.
         """
-        port = context.current
+        self._delete_port(context.current)
+
+    def _delete_port(self, port):
+        if self._defer_teardown('ports', port):
+            return
         with self._nb_ovn.transaction(check_error=True) as txn:
             txn.add(self._nb_ovn.delete_lswitch_port(port['id'],
                     utils.ovn_name(port['network_id'])))
@@ -1109,6 +1582,56 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             LOG.debug("Port not found during OVN status down report: %s",
                       port_id)
 
+    def sync_port_statuses(self, lsp_states):
+        """Bring the status of the Neutron ports in line with OVN.
+
+        Used instead of set_port_status_up/down for each port of the
+        initial Logical_Switch_Port dump: the Neutron port statuses are
+        read with a single query and only the ports whose status differs
+        from OVN are updated. The provisioning blocks of the ports going
+        down are inserted in transactions of nb_bulk_transaction_size
+        ports.
+
+        :param lsp_states: dict mapping Logical_Switch_Port names to their
+                           'up' state
+        """
+        admin_context = n_context.get_admin_context()
+        ports_up = []
+        ports_down = []
+        for port in self._plugin.get_ports(admin_context,
+                                           fields=['id', 'status']):
+            up = lsp_states.get(port['id'])
+            if up is None:
+                continue
+            if up and port['status'] != const.PORT_STATUS_ACTIVE:
+                ports_up.append(port['id'])
+            elif not up and port['status'] == const.PORT_STATUS_ACTIVE:
+                ports_down.append(port['id'])
+        LOG.info(_LI("OVN reports status up for %(up)d and status down for "
+                     "%(down)d ports out of sync with Neutron"),
+                 {'up': len(ports_up), 'down': len(ports_down)})
+
+        # provisioning_complete() can't be called within a transaction.
+        for port_id in ports_up:
+            provisioning_blocks.provisioning_complete(
+                admin_context, port_id, resources.PORT,
+                provisioning_blocks.L2_AGENT_ENTITY)
+
+        batch_size = config.get_ovn_nb_bulk_transaction_size()
+        for i in six.moves.range(0, len(ports_down), batch_size):
+            batch = ports_down[i:i + batch_size]
+            with admin_context.session.begin(subtransactions=True):
+                for port_id in batch:
+                    self._insert_port_provisioning_block(admin_context,
+                                                         {'id': port_id})
+            for port_id in batch:
+                try:
+                    self._plugin.update_port_status(admin_context, port_id,
+                                                    const.PORT_STATUS_DOWN)
+                except (os_db_exc.DBReferenceError, n_exc.PortNotFound):
+                    LOG.debug("Port not found during OVN status sync: %s",
+                              port_id)
+
     def update_segment_host_mapping(self, host, phy_nets):
         """Update SegmentHostMapping in DB"""
         if not host:
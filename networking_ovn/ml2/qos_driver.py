@@ -10,6 +10,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import time
+
 from oslo_log import log as logging
 
 from neutron_lib import constants
@@ -22,6 +25,7 @@ from neutron.plugins.ml2 import plugin as ml2_plugin
 from neutron.services.qos.notification_drivers import qos_base
 
 from networking_ovn._i18n import _LI
+from networking_ovn.common import config
 
 
 LOG = logging.getLogger(__name__)
@@ -54,8 +58,64 @@ class OVNQosNotificationDriver(qos_base.QosServiceNotificationDriverBase):
         self._driver.qos_driver.update_policy(context, policy)
 
     def delete_policy(self, context, policy):
-        # No need to update OVN on delete
-        pass
+        # No need to update OVN on delete, only forget the policy
+        self._driver.qos_driver.delete_policy(context, policy)
+
+
+class _ExpiringCache(object):
+    """A dictionary whose entries expire after qos_cache_ttl seconds.
+
+    The entries are kept in insertion order, which is also their expiry
+    order, so the expired ones are purged from the head on each insert.
+    With index_values, the keys are also indexed by value for pop_values,
+    the values have to be hashable.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, index_values=False):
+        self._entries = collections.OrderedDict()
+        self._keys_by_value = {} if index_values else None
+
+    def get(self, key):
+        """Return the value cached for key, or _MISSING."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return self._MISSING
+        if entry[0] < time.time():
+            self.pop(key)
+            return self._MISSING
+        return entry[1]
+
+    def set(self, key, value):
+        ttl = config.get_ovn_qos_cache_ttl()
+        if ttl:
+            now = time.time()
+            self._purge(now)
+            # Re-inserted at the end, in its new expiry order.
+            self.pop(key)
+            self._entries[key] = (now + ttl, value)
+            if self._keys_by_value is not None:
+                self._keys_by_value.setdefault(value, set()).add(key)
+
+    def _purge(self, now):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[0] >= now:
+                break
+            self.pop(key)
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and self._keys_by_value is not None:
+            keys = self._keys_by_value[entry[1]]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_value[entry[1]]
+
+    def pop_values(self, value):
+        for key in list(self._keys_by_value.get(value, ())):
+            self.pop(key)
 
 
 class OVNQosDriver(object):
@@ -66,6 +126,9 @@ class OVNQosDriver(object):
         super(OVNQosDriver, self).__init__()
         self._driver = driver
         self._plugin_property = None
+        # policy id -> QoS options, network id -> policy id
+        self._policy_options_cache = _ExpiringCache()
+        self._network_policy_cache = _ExpiringCache(index_values=True)
 
     @property
     def _plugin(self):
@@ -83,6 +146,14 @@ class OVNQosDriver(object):
     def _generate_port_options(self, context, policy_id):
         if policy_id is None:
             return {}
+        options = self._policy_options_cache.get(policy_id)
+        if options is _ExpiringCache._MISSING:
+            options = self._get_policy_options(context, policy_id)
+            self._policy_options_cache.set(policy_id, options)
+        # The options end up in OvnPortInfo, don't share the cached dict
+        return dict(options)
+
+    def _get_policy_options(self, context, policy_id):
         options = {}
         # The policy might not have any rules
         all_rules = qos_rule.get_rules(context, policy_id)
@@ -95,45 +166,72 @@ class OVNQosDriver(object):
         return options
 
     def get_qos_options(self, port):
-        # Is qos service enabled
-        if 'qos_policy_id' not in port:
-            return {}
-        # Don't apply qos rules to network devices
-        if self._is_network_device_port(port):
-            return {}
+        return self.get_ports_qos_options([port])[port['id']]
 
-        # Determine if port or network policy should be used
-        context = n_context.get_admin_context()
-        port_policy_id = port.get('qos_policy_id')
-        network_policy_id = None
-        if not port_policy_id:
-            network_policy = qos_policy.QosPolicy.get_network_policy(
-                context, port['network_id'])
-            network_policy_id = network_policy.id if network_policy else None
+    def get_ports_qos_options(self, ports):
+        """Return the QoS options of each port, by port id.
 
-        # Generate qos options for the selected policy
-        policy_id = port_policy_id or network_policy_id
-        return self._generate_port_options(context, policy_id)
+        The policies of the networks and the options of the policies are
+        looked up once for all the ports.
+        """
+        context = None
+        network_policy_ids = {}
+        policy_options = {}
+        ports_options = {}
+        for port in ports:
+            # Is qos service enabled, and don't apply qos rules to network
+            # devices
+            if ('qos_policy_id' not in port or
+                    self._is_network_device_port(port)):
+                ports_options[port['id']] = {}
+                continue
+            if context is None:
+                context = n_context.get_admin_context()
 
-    def _update_network_ports(self, context, network_id, options):
+            # Determine if port or network policy should be used
+            policy_id = port.get('qos_policy_id')
+            if not policy_id:
+                network_id = port['network_id']
+                if network_id not in network_policy_ids:
+                    network_policy_ids[network_id] = (
+                        self._get_network_policy_id(context, network_id))
+                policy_id = network_policy_ids[network_id]
+
+            # Generate qos options for the selected policy
+            if policy_id not in policy_options:
+                policy_options[policy_id] = self._generate_port_options(
+                    context, policy_id)
+            ports_options[port['id']] = dict(policy_options[policy_id])
+        return ports_options
+
+    def _get_network_policy_id(self, context, network_id):
+        policy_id = self._network_policy_cache.get(network_id)
+        if policy_id is _ExpiringCache._MISSING:
+            network_policy = qos_policy.QosPolicy.get_network_policy(
+                context, network_id)
+            policy_id = network_policy.id if network_policy else None
+            self._network_policy_cache.set(network_id, policy_id)
+        return policy_id
+
+    def _get_network_ports(self, context, network_id):
         # Retrieve all ports for this network
         ports = self._plugin.get_ports(context,
                                        filters={'network_id': [network_id]})
-        for port in ports:
-            # Don't apply qos rules if port has a policy
-            port_policy_id = port.get('qos_policy_id')
-            if port_policy_id:
-                continue
-            # Don't apply qos rules to network devices
-            if self._is_network_device_port(port):
-                continue
-            # Call into mech driver to update port
-            self._driver.update_port(port, port, options)
+        # Don't apply qos rules to ports having a policy or to network
+        # devices
+        return [port for port in ports
+                if not port.get('qos_policy_id') and
+                not self._is_network_device_port(port)]
+
+    def _update_network_ports(self, context, network_id, options):
+        self._driver.update_ports_qos_options(
+            self._get_network_ports(context, network_id), options)
 
     def update_network(self, network, original_network):
         # Is qos service enabled
         if 'qos_policy_id' not in network:
             return
+        self._network_policy_cache.pop(network.get('id'))
         # Was network qos policy changed
         network_policy_id = network.get('qos_policy_id')
         old_network_policy_id = original_network.get('qos_policy_id')
@@ -146,15 +244,20 @@ class OVNQosDriver(object):
         self._update_network_ports(context, network.get('id'), options)
 
     def update_policy(self, context, policy):
+        self._policy_options_cache.pop(policy.id)
         options = self._generate_port_options(context, policy.id)
 
-        # Update each network bound to this policy
-        network_bindings = policy.get_bound_networks()
-        for network_id in network_bindings:
-            self._update_network_ports(context, network_id, options)
-
-        # Update each port bound to this policy
+        # Update the ports of each network bound to this policy, and each
+        # port bound to it, all at once
+        ports = []
+        for network_id in policy.get_bound_networks():
+            ports.extend(self._get_network_ports(context, network_id))
         port_bindings = policy.get_bound_ports()
-        for port_id in port_bindings:
-            port = self._plugin.get_port(context, port_id)
-            self._driver.update_port(port, port, options)
+        if port_bindings:
+            ports.extend(self._plugin.get_ports(
+                context, filters={'id': port_bindings}))
+        self._driver.update_ports_qos_options(ports, options)
+
+    def delete_policy(self, context, policy):
+        self._policy_options_cache.pop(policy.id)
+        self._network_policy_cache.pop_values(policy.id)
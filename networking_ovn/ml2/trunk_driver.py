@@ -13,6 +13,7 @@
 from oslo_config import cfg
 
 from networking_ovn.common.constants import OVN_ML2_MECH_DRIVER_NAME
+from networking_ovn.journal import journal
 
 from neutron.callbacks import events
 from neutron.callbacks import registry
@@ -37,6 +38,8 @@ class OVNTrunkHandler(object):
 
     def _set_sub_ports(self, parent_port, subports):
         _nb_ovn = self.plugin_driver._nb_ovn
+        journal.wait_for_replay([parent_port] +
+                                [port.port_id for port in subports])
         with _nb_ovn.transaction(check_error=True) as txn:
             for port in subports:
                 txn.add(_nb_ovn.set_lswitch_port(port.port_id,
@@ -45,6 +48,7 @@ class OVNTrunkHandler(object):
 
     def _unset_sub_ports(self, subports):
         _nb_ovn = self.plugin_driver._nb_ovn
+        journal.wait_for_replay([port.port_id for port in subports])
         with _nb_ovn.transaction(check_error=True) as txn:
             for port in subports:
                 txn.add(_nb_ovn.set_lswitch_port(port.port_id,
@@ -27,6 +27,7 @@ from neutron.services.segments import db as segments_db
 
 from networking_ovn._i18n import _LW
 from networking_ovn.common import acl as acl_utils
+from networking_ovn.common import address_sets
 from networking_ovn.common import config
 from networking_ovn.common import constants as const
 from networking_ovn.common import utils
@@ -92,16 +93,17 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
         segid = self._get_attribute(net, pnet.SEGMENTATION_ID)
         self.ovn_driver.create_network_in_ovn(net, {}, physnet, segid)
 
-    def _create_port_in_ovn(self, ctx, port):
-        # Remove any old ACLs for the port to avoid creating duplicate ACLs.
-        self.ovn_api.delete_acl(
-            utils.ovn_name(port['network_id']),
-            port['id']).execute(check_error=True)
+    def _create_ports_in_ovn(self, ctx, ports):
+        # Remove any old ACLs for the ports to avoid creating duplicate ACLs.
+        with self.ovn_api.chunked_transaction(
+                'Port ACL cleanup', check_error=True) as txn:
+            for port in ports:
+                txn.add(self.ovn_api.delete_acl(
+                    utils.ovn_name(port['network_id']), port['id']))
 
-        # Create the port in OVN. This will include ACL and Address Set
+        # Create the ports in OVN. This will include ACL and Address Set
         # updates as needed.
-        ovn_port_info = self.ovn_driver.get_ovn_port_options(port)
-        self.ovn_driver.create_port_in_ovn(port, ovn_port_info)
+        return self.ovn_driver.create_ports_in_ovn(ports)
 
     def remove_common_acls(self, neutron_acls, nb_acls):
         """Take out common acls of the two acl dictionaries.
@@ -126,10 +128,9 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
         sgs_common = list(neutron_sgs_name_set & nb_sgs_name_set)
         sgs_to_update = {}
         for sg_name in sgs_common:
-            neutron_addr_set = set(neutron_sgs[sg_name]['addresses'])
-            nb_addr_set = set(nb_sgs[sg_name]['addresses'])
-            addrs_to_add = list(neutron_addr_set - nb_addr_set)
-            addrs_to_delete = list(nb_addr_set - neutron_addr_set)
+            addrs_to_add, addrs_to_delete = address_sets.compute_difference(
+                neutron_sgs[sg_name]['addresses'],
+                nb_sgs[sg_name]['addresses'])
             if addrs_to_add or addrs_to_delete:
                 sgs_to_update[sg_name] = {'name': sg_name,
                                           'addrs_add': addrs_to_add,
@@ -208,7 +209,8 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
         if self.mode == SYNC_MODE_REPAIR:
             LOG.debug('Address-Set-SYNC: transaction started @ %s' %
                       str(datetime.now()))
-            with self.ovn_api.transaction(check_error=True) as txn:
+            with self.ovn_api.chunked_transaction(
+                    'Address-Set-SYNC', check_error=True) as txn:
                 for sgname in sgnames_to_add:
                     sg = neutron_sgs[sgname]
                     txn.add(self.ovn_api.create_address_set(**sg))
@@ -269,12 +271,26 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
                          'remove': num_acls_to_remove})
 
         if self.mode == SYNC_MODE_REPAIR:
-            with self.ovn_api.transaction(check_error=True) as txn:
-                for acla in list(itertools.chain(
-                                 *six.itervalues(neutron_acls))):
-                    LOG.warning(_LW('ACL found in Neutron but not in '
-                                    'OVN DB for port %s'), acla['lport'])
-                    txn.add(self.ovn_api.add_acl(**acla))
+            # The ACLs are written as raw operations, each port's ACLs
+            # being inserted along with their references from the logical
+            # switch.
+            with self.ovn_api.bulk_writer('ACL-SYNC') as writer:
+                for port_id, acls in six.iteritems(neutron_acls):
+                    if not acls:
+                        continue
+                    LOG.warning(_LW('ACLs found in Neutron but not in '
+                                    'OVN DB for port %s'), port_id)
+                    acl_refs = []
+                    for acla in acls:
+                        columns = dict(acla)
+                        lswitch = columns.pop('lswitch')
+                        columns['external_ids'] = {
+                            'neutron:lport': columns.pop('lport')}
+                        acl_refs.append(writer.insert('ACL', columns))
+                    writer.mutate('Logical_Switch',
+                                  [('name', '==', lswitch)],
+                                  [('acls', 'insert', acl_refs)])
+                    writer.checkpoint()
 
             # TODO(rtheis): Each delete must be done in a separate
             # transaction until bug 1629099 is fixed. Otherwise, ACLs may
@@ -408,7 +424,8 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
                                     "NB failed for"
                                     " router port %s"), rport['id'])
 
-        with self.ovn_api.transaction(check_error=True) as txn:
+        with self.ovn_api.chunked_transaction(
+                'Router-SYNC', check_error=True) as txn:
             for lrouter in del_lrouters_list:
                 LOG.warning(_LW("Router found in OVN but not in "
                                 "Neutron, router id=%s"), lrouter['name'])
@@ -516,7 +533,8 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
                     dhcp_opt['uuid']))
 
         if txn_commands:
-            with self.ovn_api.transaction(check_error=True) as txn:
+            with self.ovn_api.chunked_transaction(
+                    'Subnet-DHCP-SYNC', check_error=True) as txn:
                 for cmd in txn_commands:
                     txn.add(cmd)
         LOG.debug('OVN-NB Sync DHCP options for Neutron subnets finished')
@@ -560,9 +578,13 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
                             ovn_port_dhcp_opts[ip_v].pop(port['id'])
                             # Ensure Logical_Switch_Port still have references
                             # to DHCP_Options rows.
-                            set_lsp[lsp_dhcp_key[ip_v]] = [dhcp_opts['uuid']]
-                    elif 'uuid' in dhcp_opts:
-                        set_lsp[lsp_dhcp_key[ip_v]] = [dhcp_opts['uuid']]
+                            set_lsp[lsp_dhcp_key[ip_v]] = (
+                                self.ovn_driver.get_lsp_dhcp_options_column(
+                                    dhcp_opts))
+                    elif 'uuid' in dhcp_opts or 'cmd' in dhcp_opts:
+                        set_lsp[lsp_dhcp_key[ip_v]] = (
+                            self.ovn_driver.get_lsp_dhcp_options_column(
+                                dhcp_opts))
                 if set_lsp:
                     txn_commands.append(self.ovn_api.set_lswitch_port(
                         lport_name=port['id'], **set_lsp))
@@ -585,7 +607,8 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
                         dhcp_opt['uuid']))
 
         if txn_commands:
-            with self.ovn_api.transaction(check_error=True) as txn:
+            with self.ovn_api.chunked_transaction(
+                    'Port-DHCP-SYNC', check_error=True) as txn:
                 for cmd in txn_commands:
                     txn.add(cmd)
         LOG.debug('OVN-NB Sync DHCP options for Neutron ports with extra '
@@ -638,26 +661,32 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
         for port_id, port in db_ports.items():
             LOG.warning(_LW("Port found in Neutron but not in OVN "
                             "DB, port_id=%s"), port['id'])
-            if self.mode == SYNC_MODE_REPAIR:
-                try:
-                    LOG.debug('Creating the port %s in OVN NB DB',
-                              port['id'])
-                    self._create_port_in_ovn(ctx, port)
-                    if port_id in ovn_all_dhcp_options['ports_v4']:
-                        _, lsp_opts = utils.get_lsp_dhcp_opts(
-                            port, constants.IP_VERSION_4)
-                        if lsp_opts:
-                            ovn_all_dhcp_options['ports_v4'].pop(port_id)
-                    if port_id in ovn_all_dhcp_options['ports_v6']:
-                        _, lsp_opts = utils.get_lsp_dhcp_opts(
-                            port, constants.IP_VERSION_6)
-                        if lsp_opts:
-                            ovn_all_dhcp_options['ports_v6'].pop(port_id)
-                except RuntimeError:
-                    LOG.warning(_LW("Create port in OVN NB failed for"
-                                    " port %s"), port['id'])
-
-        with self.ovn_api.transaction(check_error=True) as txn:
+        if self.mode == SYNC_MODE_REPAIR and db_ports:
+            created_ports = []
+            try:
+                LOG.debug('Creating %d ports in OVN NB DB', len(db_ports))
+                created_ports = self._create_ports_in_ovn(
+                    ctx, list(db_ports.values()))
+            except RuntimeError:
+                LOG.warning(_LW("Create ports in OVN NB failed for"
+                                " ports %s"), list(db_ports))
+            # The DHCP_Options of the ports created are referenced by their
+            # Logical_Switch_Ports, they must not be deleted as stale.
+            for port in created_ports:
+                port_id = port['id']
+                if port_id in ovn_all_dhcp_options['ports_v4']:
+                    _, lsp_opts = utils.get_lsp_dhcp_opts(
+                        port, constants.IP_VERSION_4)
+                    if lsp_opts:
+                        ovn_all_dhcp_options['ports_v4'].pop(port_id)
+                if port_id in ovn_all_dhcp_options['ports_v6']:
+                    _, lsp_opts = utils.get_lsp_dhcp_opts(
+                        port, constants.IP_VERSION_6)
+                    if lsp_opts:
+                        ovn_all_dhcp_options['ports_v6'].pop(port_id)
+
+        with self.ovn_api.chunked_transaction(
+                'Network-Port-SYNC', check_error=True) as txn:
             for lswitch in del_lswitchs_list:
                 LOG.warning(_LW("Network found in OVN but not in "
                                 "Neutron, network_id=%s"), lswitch['name'])
@@ -673,21 +702,23 @@ class OvnNbSynchronizer(OvnDbSynchronizer):
                 if self.mode == SYNC_MODE_REPAIR:
                     LOG.debug('Deleting the port %s from OVN NB DB',
                               lport_info['port'])
-                    txn.add(self.ovn_api.delete_lswitch_port(
+                    # The port and its DHCP options are deleted together.
+                    port_commands = [self.ovn_api.delete_lswitch_port(
                         lport_name=lport_info['port'],
-                        lswitch_name=lport_info['lswitch']))
+                        lswitch_name=lport_info['lswitch'])]
                     if lport_info['port'] in ovn_all_dhcp_options['ports_v4']:
                         LOG.debug('Deleting port DHCPv4 options for (port %s)',
                                   lport_info['port'])
-                        txn.add(self.ovn_api.delete_dhcp_options(
-                                ovn_all_dhcp_options['ports_v4'].pop(
-                                    lport_info['port'])['uuid']))
+                        port_commands.append(self.ovn_api.delete_dhcp_options(
+                            ovn_all_dhcp_options['ports_v4'].pop(
+                                lport_info['port'])['uuid']))
                     if lport_info['port'] in ovn_all_dhcp_options['ports_v6']:
                         LOG.debug('Deleting port DHCPv6 options for (port %s)',
                                   lport_info['port'])
-                        txn.add(self.ovn_api.delete_dhcp_options(
-                                ovn_all_dhcp_options['ports_v6'].pop(
-                                    lport_info['port'])['uuid']))
+                        port_commands.append(self.ovn_api.delete_dhcp_options(
+                            ovn_all_dhcp_options['ports_v6'].pop(
+                                lport_info['port'])['uuid']))
+                    txn.add_group(port_commands)
 
         self._sync_port_dhcp_options(ctx, ports_need_sync_dhcp_opts,
                                      ovn_all_dhcp_options['ports_v4'],
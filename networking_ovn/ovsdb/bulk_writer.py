@@ -0,0 +1,322 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import os
+import sys
+import time
+import uuid
+
+from oslo_log import log
+from ovs.db import data
+from ovs.db import error as ovs_error
+from ovs.db import types
+from ovs import jsonrpc
+from ovs import poller as ovs_poller
+from ovs import stream
+import six
+
+from networking_ovn._i18n import _, _LI, _LW
+
+LOG = log.getLogger(__name__)
+
+
+class NamedUuid(object):
+    """Reference to a row inserted by an OvsdbBulkWriter.
+
+    Until the insert is committed, the references to the row are written
+    as the named-uuid of the insert operation, which only works within the
+    same transaction. Once committed, uuid is the uuid of the row and the
+    references are written with it.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.placeholder = uuid.uuid4()
+        self.uuid = None
+
+
+class OvsdbBulkWriter(object):
+    """Writes rows to an OVSDB database with raw transact operations.
+
+    Used by bulk jobs writing thousands of rows, for which the commands
+    and the row proxies of the IDL cost more than the writes themselves.
+    The insert, delete and mutate operations are built from plain dicts
+    and validated against the schema of the IDL, and are sent over a
+    connection of their own, bypassing the IDL. The IDL still receives the
+    resulting changes through its monitor.
+
+    The operations are buffered and committed in a transaction once
+    max_ops are pending at a checkpoint(). Connecting and each transaction
+    fail after timeout seconds. The callers call checkpoint()
+    where the pending operations are consistent, as the references with
+    named-uuids don't cross the transactions. The pending operations are
+    committed when leaving the context and dropped on failure, the
+    transactions committed before are kept.
+    """
+
+    def __init__(self, remote, db_name, tables, max_ops, description,
+                 timeout):
+        self.remote = remote
+        self.db_name = db_name
+        self.tables = tables
+        self.max_ops = max_ops
+        self.description = description
+        self.timeout = timeout
+        self.num_txns = 0
+        self.num_ops = 0
+        self._ops = []
+        self._inserted = []
+        self._mutated = []
+        self._pending = {}
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, tb):
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def _get_table(self, table):
+        try:
+            return self.tables[table]
+        except KeyError:
+            raise RuntimeError(_('Table %(table)s is not in the %(db)s '
+                                 'schema') % {'table': table,
+                                              'db': self.db_name})
+
+    def _get_column(self, table, column):
+        try:
+            return self._get_table(table).columns[column]
+        except KeyError:
+            raise RuntimeError(_('Column %(column)s of table %(table)s is '
+                                 'not in the %(db)s schema') %
+                               {'column': column, 'table': table,
+                                'db': self.db_name})
+
+    def _row_to_uuid(self, value):
+        if isinstance(value, NamedUuid):
+            if value.uuid:
+                return value.uuid
+            self._pending[str(value.placeholder)] = value.name
+            return value.placeholder
+        return value
+
+    def _resolve_named_uuids(self, json):
+        if isinstance(json, list):
+            if (len(json) == 2 and json[0] == 'uuid' and
+                    json[1] in self._pending):
+                return ['named-uuid', self._pending[json[1]]]
+            return [self._resolve_named_uuids(item) for item in json]
+        return json
+
+    def _to_json(self, table, column, type_, value):
+        try:
+            datum = data.Datum.from_python(type_, value, self._row_to_uuid)
+        except ovs_error.Error as e:
+            raise RuntimeError(_('Invalid value %(value)s for column '
+                                 '%(column)s of table %(table)s: %(error)s') %
+                               {'value': value, 'column': column,
+                                'table': table, 'error': e})
+        return self._resolve_named_uuids(datum.to_json())
+
+    def _where(self, table, where):
+        self._get_table(table)
+        return [[column, function,
+                 self._to_json(table, column,
+                               self._get_column(table, column).type, value)]
+                for column, function, value in where]
+
+    def insert(self, table, row):
+        """Insert a row
+
+        :param table: The name of the table
+        :param row:   The values of the columns of the row
+        :type row:    dict
+        :returns:     A reference to the row, usable as a value in the
+                      following operations
+        :rtype:       :class:`NamedUuid`
+        """
+        self._get_table(table)
+        named_uuid = NamedUuid('row%d' % len(self._inserted))
+        self._pending[str(named_uuid.placeholder)] = named_uuid.name
+        self._ops.append({
+            'op': 'insert', 'table': table, 'uuid-name': named_uuid.name,
+            'row': dict((column, self._to_json(
+                table, column, self._get_column(table, column).type, value))
+                for column, value in six.iteritems(row))})
+        self._inserted.append((len(self._ops) - 1, named_uuid))
+        return named_uuid
+
+    def delete(self, table, where):
+        """Delete the rows matching conditions
+
+        :param table: The name of the table
+        :param where: The conditions on the rows
+        :type where:  list of (column, function, value) tuples, e.g.
+                      [('name', '==', 'neutron-<network_id>')]
+        """
+        self._ops.append({'op': 'delete', 'table': table,
+                          'where': self._where(table, where)})
+
+    def mutate(self, table, where, mutations):
+        """Mutate columns of the rows matching conditions
+
+        :param table:     The name of the table
+        :param where:     The conditions on the rows, see delete()
+        :param mutations: The mutations of the columns, e.g.
+                          [('acls', 'insert', [named_uuid])]
+        :type mutations:  list of (column, mutator, value) tuples
+        """
+        json_mutations = []
+        for column, mutator, value in mutations:
+            type_ = self._get_column(table, column).type
+            if mutator in ('insert', 'delete'):
+                # The value is a set or a map of any size, a map may be
+                # deleted from by its keys only.
+                value_type = type_.value
+                if (mutator == 'delete' and type_.is_map() and
+                        not isinstance(value, dict)):
+                    value_type = None
+                type_ = types.Type(type_.key, value_type, 0, sys.maxsize)
+            json_mutations.append(
+                [column, mutator, self._to_json(table, column, type_, value)])
+        self._ops.append({'op': 'mutate', 'table': table,
+                          'where': self._where(table, where),
+                          'mutations': json_mutations})
+        self._mutated.append((len(self._ops) - 1, table, where))
+
+    def checkpoint(self):
+        """Commit the pending operations if there are enough of them"""
+        if len(self._ops) >= self.max_ops:
+            self.flush()
+
+    def _block(self, deadline, wait):
+        # Wait for the events registered by wait on a poller, at the latest
+        # until the deadline.
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            self.close()
+            raise RuntimeError(_('Transaction on %(remote)s timed out after '
+                                 '%(timeout)s seconds') %
+                               {'remote': self.remote,
+                                'timeout': self.timeout})
+        poller = ovs_poller.Poller()
+        wait(poller)
+        poller.timer_wait(int(remaining * 1000))
+        poller.block()
+
+    def _connect(self, deadline):
+        # Stream.open_block(), with a deadline.
+        error, strm = stream.Stream.open(self.remote)
+
+        def wait(poller):
+            strm.run_wait(poller)
+            strm.connect_wait(poller)
+        try:
+            while not error:
+                error = strm.connect()
+                if error != errno.EAGAIN:
+                    break
+                strm.run()
+                self._block(deadline, wait)
+        except RuntimeError:
+            strm.close()
+            raise
+        if error:
+            if strm:
+                strm.close()
+            raise RuntimeError(_('Could not connect to %(remote)s: '
+                                 '%(error)s') %
+                               {'remote': self.remote,
+                                'error': os.strerror(error)})
+        self._conn = jsonrpc.Connection(strm)
+
+    def _transact_block(self, request, deadline):
+        # Connection.transact_block(), with a deadline.
+        def wait(poller):
+            self._conn.wait(poller)
+            self._conn.recv_wait(poller)
+
+        error = self._conn.send(request)
+        while not error:
+            error, reply = self._conn.recv()
+            if error == errno.EAGAIN:
+                self._conn.run()
+                self._block(deadline, wait)
+                error = 0
+            elif (not error and
+                    reply.type in (jsonrpc.Message.T_REPLY,
+                                   jsonrpc.Message.T_ERROR) and
+                    reply.id == request.id):
+                return 0, reply
+        return error, None
+
+    def _transact(self, ops):
+        deadline = time.time() + self.timeout
+        if not self._conn:
+            self._connect(deadline)
+        request = jsonrpc.Message.create_request('transact',
+                                                 [self.db_name] + ops)
+        error, reply = self._transact_block(request, deadline)
+        if error:
+            self.close()
+            raise RuntimeError(_('Transaction on %(remote)s failed: '
+                                 '%(error)s') %
+                               {'remote': self.remote,
+                                'error': os.strerror(error)})
+        if reply.error:
+            raise RuntimeError(_('Transaction on %(remote)s failed: '
+                                 '%(error)s') %
+                               {'remote': self.remote, 'error': reply.error})
+        for result in reply.result:
+            if result and 'error' in result:
+                raise RuntimeError(_('Transaction on %(remote)s failed: '
+                                     '%(error)s: %(details)s') %
+                                   {'remote': self.remote,
+                                    'error': result['error'],
+                                    'details': result.get('details')})
+        return reply.result
+
+    def flush(self):
+        """Commit the pending operations"""
+        if not self._ops:
+            return
+        ops, inserted, mutated = self._ops, self._inserted, self._mutated
+        self._ops, self._inserted, self._mutated = [], [], []
+        self._pending = {}
+        results = self._transact(ops)
+        for index, named_uuid in inserted:
+            named_uuid.uuid = uuid.UUID(results[index]['uuid'][1])
+        for index, table, where in mutated:
+            if not results[index].get('count'):
+                # e.g. the row was deleted meanwhile, the rows inserted to
+                # be referenced by it are garbage collected if not root.
+                LOG.warning(_LW('%(desc)s: no %(table)s row matching '
+                                '%(where)s to mutate'),
+                            {'desc': self.description, 'table': table,
+                             'where': where})
+        self.num_txns += 1
+        self.num_ops += len(ops)
+        LOG.info(_LI('%(desc)s: committed transaction %(txn)d of %(num)d '
+                     'operations, %(total)d operations committed so far'),
+                 {'desc': self.description, 'txn': self.num_txns,
+                  'num': len(ops), 'total': self.num_ops})
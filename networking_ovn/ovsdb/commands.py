@@ -10,6 +10,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
+from ovs.db import idl
 import six
 
 from neutron.agent.ovsdb.native import commands
@@ -30,6 +33,28 @@ def _is_ovs_mutate_available(row):
     return callable(getattr(row, 'addvalue', None))
 
 
+def is_ovs_mutate_supported():
+    return _is_ovs_mutate_available(idl.Row)
+
+
+# Number of times the commands adding or deleting ports of each
+# Logical_Switch were run and committed. A run that is not committed was
+# retried because the switch changed meanwhile, or failed. The counters of
+# a switch are dropped when it is deleted.
+_LSWITCH_PORTS_ATTEMPTS = collections.Counter()
+_LSWITCH_PORTS_COMMITS = collections.Counter()
+
+
+def get_lswitch_ports_stats():
+    """Return the port add/delete attempts and commits of each lswitch."""
+    return dict((lswitch, {'attempts': attempts,
+                           'commits': _LSWITCH_PORTS_COMMITS[lswitch],
+                           'conflicts': (attempts -
+                                         _LSWITCH_PORTS_COMMITS[lswitch])})
+                for lswitch, attempts in
+                six.iteritems(dict(_LSWITCH_PORTS_ATTEMPTS)))
+
+
 def _addvalue_to_list(row, column, new_value, mutate=True):
     # If available, use mutate support to add the value.
     if mutate and _is_ovs_mutate_available(row):
@@ -91,6 +116,30 @@ def get_lsp_dhcp_options_uuids(lsp, lsp_name):
     return uuids
 
 
+def _resolve_lsp_dhcp_options(txn, columns):
+    """Return a copy of the port columns with DHCP_Options commands run.
+
+    The dhcpv4_options and dhcpv6_options columns may reference the port's
+    own DHCP_Options row through the AddDHCPOptionsCommand writing it. Such
+    commands are run here, in the Logical_Switch_Port transaction, and
+    replaced by the (possibly temporary) uuid of the row they wrote. The
+    original columns are not modified so that the transaction can be
+    retried.
+    """
+    columns = dict(columns)
+    for col in ('dhcpv4_options', 'dhcpv6_options'):
+        if col not in columns:
+            continue
+        uuids = []
+        for value in columns[col]:
+            if isinstance(value, AddDHCPOptionsCommand):
+                value.run_idl(txn)
+                value = value.result
+            uuids.append(value)
+        columns[col] = uuids
+    return columns
+
+
 class AddLSwitchCommand(commands.BaseCommand):
     def __init__(self, api, name, may_exist, **columns):
         super(AddLSwitchCommand, self).__init__(api)
@@ -128,6 +177,10 @@ class DelLSwitchCommand(commands.BaseCommand):
 
         self.api._tables['Logical_Switch'].rows[lswitch.uuid].delete()
 
+    def post_commit(self, txn):
+        _LSWITCH_PORTS_ATTEMPTS.pop(self.name, None)
+        _LSWITCH_PORTS_COMMITS.pop(self.name, None)
+
 
 class LSwitchSetExternalIdCommand(commands.BaseCommand):
     def __init__(self, api, name, field, value, if_exists):
@@ -162,8 +215,10 @@ class AddLSwitchPortCommand(commands.BaseCommand):
         self.lswitch = lswitch
         self.may_exist = may_exist
         self.columns = columns
+        self._counted = False
 
     def run_idl(self, txn):
+        self._counted = False
         try:
             lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
                                             'name', self.lswitch)
@@ -177,12 +232,19 @@ class AddLSwitchPortCommand(commands.BaseCommand):
             if port:
                 return
 
+        columns = _resolve_lsp_dhcp_options(txn, self.columns)
         port = txn.insert(self.api._tables['Logical_Switch_Port'])
         port.name = self.lport
-        for col, val in self.columns.items():
+        for col, val in columns.items():
             setattr(port, col, val)
         # add the newly created port to existing lswitch
         _addvalue_to_list(lswitch, 'ports', port.uuid)
+        _LSWITCH_PORTS_ATTEMPTS[self.lswitch] += 1
+        self._counted = True
+
+    def post_commit(self, txn):
+        if self._counted:
+            _LSWITCH_PORTS_COMMITS[self.lswitch] += 1
 
 
 class SetLSwitchPortCommand(commands.BaseCommand):
@@ -206,16 +268,22 @@ class SetLSwitchPortCommand(commands.BaseCommand):
         # The table rows should be consistent for the same transaction.
         # After we get DHCP_Options rows uuids from port dhcpv4_options
         # and dhcpv6_options references, the rows shouldn't disappear for
-        # this transaction before we delete it.
+        # this transaction before we delete it. References in columns which
+        # are not being set are left untouched.
+        columns = _resolve_lsp_dhcp_options(txn, self.columns)
         cur_port_dhcp_opts = get_lsp_dhcp_options_uuids(
             port, self.lport)
-        new_port_dhcp_opts = set(
-            self.columns.get('dhcpv4_options', [])).union(
-                self.columns.get('dhcpv6_options', []))
+        new_port_dhcp_opts = set()
+        for col in ('dhcpv4_options', 'dhcpv6_options'):
+            if col in columns:
+                new_port_dhcp_opts.update(columns[col])
+            else:
+                new_port_dhcp_opts.update(
+                    dhcp_opts.uuid for dhcp_opts in getattr(port, col, []))
         for uuid in cur_port_dhcp_opts - new_port_dhcp_opts:
             self.api._tables['DHCP_Options'].rows[uuid].delete()
 
-        for col, val in self.columns.items():
+        for col, val in columns.items():
             setattr(port, col, val)
 
 
@@ -225,8 +293,10 @@ class DelLSwitchPortCommand(commands.BaseCommand):
         self.lport = lport
         self.lswitch = lswitch
         self.if_exists = if_exists
+        self._counted = False
 
     def run_idl(self, txn):
+        self._counted = False
         try:
             lport = idlutils.row_by_value(self.api.idl, 'Logical_Switch_Port',
                                           'name', self.lport)
@@ -240,6 +310,12 @@ class DelLSwitchPortCommand(commands.BaseCommand):
 
         _delvalue_from_list(lswitch, 'ports', lport)
         self.api._tables['Logical_Switch_Port'].rows[lport.uuid].delete()
+        _LSWITCH_PORTS_ATTEMPTS[self.lswitch] += 1
+        self._counted = True
+
+    def post_commit(self, txn):
+        if self._counted:
+            _LSWITCH_PORTS_COMMITS[self.lswitch] += 1
 
 
 class AddLRouterCommand(commands.BaseCommand):
@@ -782,6 +858,7 @@ class AddDHCPOptionsCommand(commands.BaseCommand):
             row = txn.insert(self.api._tables['DHCP_Options'])
         for col, val in self.columns.items():
             setattr(row, col, val)
+        self.result = row.uuid
 
 
 class DelDHCPOptionsCommand(commands.BaseCommand):
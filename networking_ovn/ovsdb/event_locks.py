@@ -0,0 +1,132 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import threading
+import time
+import zlib
+
+from oslo_log import log
+from ovs import jsonrpc
+from ovs import poller
+
+from networking_ovn._i18n import _LI
+
+LOG = log.getLogger(__name__)
+
+
+def get_shard(key, num_shards):
+    """Return the shard of a key, e.g. the uuid of a row.
+
+    The shard only depends on the key, so that all the neutron servers
+    agree on it.
+    """
+    return (zlib.crc32(key.encode('utf-8')) & 0xffffffff) % num_shards
+
+
+class EventLockShards(object):
+    """Spreads the handling of the OVN DB events over the neutron servers.
+
+    Instead of the single event lock of the idl, the events are split in
+    shards by their row, each shard having its own ovsdb lock. Each lock is
+    requested over a session of its own, the ovsdb-server granting it to
+    one of the neutron servers requesting it and handing it over to
+    another one when it disconnects.
+
+    All the neutron servers request all the locks, but a server only
+    requests its preferred shard, derived from its host name, at first, and
+    the other shards ACQUIRE_DELAY seconds later. The shards are thus
+    spread over the servers started together, and the remaining servers
+    take over the shards of a server going down.
+    """
+
+    ACQUIRE_DELAY = 10
+
+    def __init__(self, remote, base_name, num_shards, host=None):
+        self.remote = remote
+        self.names = ['%s_%d' % (base_name, shard)
+                      for shard in range(num_shards)]
+        self.preferred = get_shard(host or socket.gethostname(), num_shards)
+        # The shards whose lock is held. It is replaced on every change, so
+        # that it is read without a lock.
+        self.held = frozenset()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def holds(self, row):
+        return get_shard(str(row.uuid), len(self.names)) in self.held
+
+    def _set_held(self, shard, held):
+        with self._lock:
+            if held == (shard in self.held):
+                return
+            if held:
+                self.held = self.held | frozenset([shard])
+            else:
+                self.held = self.held - frozenset([shard])
+        LOG.info(_LI('%(action)s the OVN DB event lock %(name)s'),
+                 {'action': 'Acquired' if held else 'Lost',
+                  'name': self.names[shard]})
+
+    def _process(self, shard, msg):
+        if msg.type == jsonrpc.Message.T_REPLY:
+            # The reply of the lock request
+            if isinstance(msg.result, dict) and msg.result.get('locked'):
+                self._set_held(shard, True)
+        elif (msg.type == jsonrpc.Message.T_NOTIFY and
+                msg.params == [self.names[shard]]):
+            if msg.method == 'locked':
+                self._set_held(shard, True)
+            elif msg.method == 'stolen':
+                self._set_held(shard, False)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def run(self):
+        start_time = time.time()
+        # Shard vs its session and the sequence number of the session when
+        # the lock was last requested.
+        sessions = {}
+        while True:
+            delay = start_time + self.ACQUIRE_DELAY - time.time()
+            delayed = delay > 0
+            for shard in range(len(self.names)):
+                if shard not in sessions and (
+                        shard == self.preferred or not delayed):
+                    sessions[shard] = [jsonrpc.Session.open(self.remote),
+                                       None]
+
+            events_poller = poller.Poller()
+            for shard, state in sessions.items():
+                session = state[0]
+                session.run()
+                seqno = session.get_seqno()
+                if seqno != state[1]:
+                    # The session has (re)connected or disconnected, the
+                    # lock is lost and requested again.
+                    state[1] = seqno
+                    self._set_held(shard, False)
+                    if session.is_connected():
+                        session.send(jsonrpc.Message.create_request(
+                            'lock', [self.names[shard]]))
+                msg = session.recv()
+                while msg is not None:
+                    self._process(shard, msg)
+                    msg = session.recv()
+                session.wait(events_poller)
+                session.recv_wait(events_poller)
+            if delayed:
+                events_poller.timer_wait(int(delay * 1000))
+            events_poller.block()
@@ -0,0 +1,145 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import threading
+
+from oslo_serialization import jsonutils
+import six
+
+# Upper bounds in seconds of the buckets of the histograms, the last bucket
+# holding the greater values.
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+
+class Histogram(object):
+    """Distribution of durations over fixed buckets."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """Upper bound of the bucket of the given percentile"""
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100.0
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        buckets = dict((str(bound), count)
+                       for bound, count in zip(self.buckets, self.counts))
+        buckets['+Inf'] = self.counts[-1]
+        return {'count': self.count,
+                'mean': self.sum / self.count if self.count else 0.0,
+                'max': self.max,
+                'p50': self.percentile(50),
+                'p99': self.percentile(99),
+                'buckets': buckets}
+
+
+class _EventTypeStats(object):
+
+    def __init__(self):
+        self.matched = 0
+        self.dropped = 0
+        self.depth = 0
+        self.queue_wait = Histogram()
+        self.run_time = Histogram()
+
+
+class EventStats(object):
+    """Latency and throughput of the OVN DB events, by event type.
+
+    For each type of event, i.e. RowEvent class, counts the matches, the
+    events dropped and the events waiting in the queues, and records the
+    time the events waited in the queues and the duration of their run()
+    in histograms. snapshot() returns them without resetting anything, the
+    rates are up to its readers.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _EventTypeStats()
+        return stats
+
+    def matched(self, name):
+        with self._lock:
+            self._get(name).matched += 1
+
+    def queued(self, name):
+        with self._lock:
+            self._get(name).depth += 1
+
+    def dropped(self, name):
+        """A queued() event didn't fit in its queue"""
+        with self._lock:
+            stats = self._get(name)
+            stats.dropped += 1
+            stats.depth -= 1
+
+    def started(self, name, queue_wait=None):
+        """An event left its queue, queue_wait is None if it isn't run"""
+        with self._lock:
+            stats = self._get(name)
+            stats.depth -= 1
+            if queue_wait is not None:
+                stats.queue_wait.observe(queue_wait)
+
+    def finished(self, name, run_time):
+        with self._lock:
+            self._get(name).run_time.observe(run_time)
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {}
+            for name, stats in six.iteritems(self._stats):
+                snapshot[name] = {
+                    'matched': stats.matched,
+                    'dropped': stats.dropped,
+                    'depth': stats.depth,
+                    'queue_wait': stats.queue_wait.to_dict(),
+                    'run_time': stats.run_time.to_dict()}
+            return snapshot
+
+
+def write_stats(path, stats):
+    """Write the stats to a JSON file, replacing it atomically"""
+    # The temporary file of each process is its own.
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        f.write(jsonutils.dumps(stats, indent=2, sort_keys=True))
+    os.rename(tmp_path, path)
@@ -0,0 +1,235 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import os
+import socket
+import stat
+import threading
+
+import eventlet
+from eventlet import greenthread
+from oslo_log import log
+from oslo_serialization import jsonutils
+import six
+from six.moves import queue
+
+from networking_ovn._i18n import _, _LI, _LW
+from networking_ovn.common import config as ovn_config
+
+LOG = log.getLogger(__name__)
+
+_SERVER = None
+_SERVER_LOCK = threading.Lock()
+
+
+def get_server():
+    """Return the event stream server, None if it isn't configured."""
+    global _SERVER
+    path = ovn_config.get_ovn_ovsdb_event_stream_path()
+    if not path:
+        return None
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            server = EventStreamServer(
+                path, mode=ovn_config.get_ovn_ovsdb_event_stream_mode())
+            if server.is_served():
+                # e.g. by another worker of the neutron server
+                LOG.warning(_LW('The OVN DB events are already streamed on '
+                                '%s, not streaming them from this '
+                                'process'), path)
+                return None
+            server.start()
+            _SERVER = server
+    return _SERVER
+
+
+def _row_to_json(row):
+    return dict((column, datum.to_json())
+                for column, datum in six.iteritems(row._data))
+
+
+class _Client(object):
+    """A consumer of the stream and its subscription.
+
+    The subscription is a JSON object whose optional 'tables', 'events'
+    and 'columns' lists restrict the events streamed to the client to the
+    given tables and event types, and their rows to the given columns.
+    """
+
+    def __init__(self, subscription, queue_size):
+        if not isinstance(subscription, dict):
+            raise ValueError('The subscription is not a JSON object')
+        self.tables = subscription.get('tables')
+        self.events = subscription.get('events')
+        self.columns = subscription.get('columns')
+        self.queue = queue.Queue(queue_size)
+        self.num_dropped = 0
+
+    def matches(self, table, event):
+        return ((self.tables is None or table in self.tables) and
+                (self.events is None or event in self.events))
+
+    def _filter(self, row_json):
+        if self.columns is None:
+            return row_json
+        return dict((column, value) for column, value in
+                    six.iteritems(row_json) if column in self.columns)
+
+    def put(self, table, event, row_uuid, row_json, old_json):
+        msg = {'table': table, 'event': event, 'uuid': row_uuid,
+               'row': self._filter(row_json)}
+        if old_json is not None:
+            msg['old'] = self._filter(old_json)
+        try:
+            self.queue.put_nowait(jsonutils.dumps(msg) + '\n')
+        except queue.Full:
+            # A slow client doesn't hold the events of the others back.
+            self.num_dropped += 1
+
+    def close(self):
+        """Stop serving the client, which went away."""
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            # Sending the queued events to the client fails instead.
+            pass
+
+
+class EventStreamServer(object):
+    """Streams the OVN DB row events to local clients.
+
+    Lets the other components of the controller follow the changes of the
+    OVN databases, e.g. the ports going up or down or the chassis, without
+    monitoring the databases themselves. The clients connect to a unix
+    socket, write their subscription (see _Client) on the first line, an
+    empty line subscribing to everything, then read the events as newline
+    delimited JSON objects with the table, the event type (create, update
+    or delete), the uuid and the columns of the row, in the OVSDB JSON
+    notation, and for the updates, the old values of the changed columns.
+
+    The events are queued for each client, and dropped when its queue is
+    full, the idl never waiting for the clients.
+    """
+
+    def __init__(self, path, queue_size=1000, mode=0o600):
+        self.path = path
+        self.queue_size = queue_size
+        # The permissions of the socket, the clients need to write to it
+        self.mode = mode
+        # Replaced on every change, so that publish() doesn't take the lock
+        self.clients = frozenset()
+        self._lock = threading.Lock()
+        self._sock = None
+
+    def is_served(self):
+        """Return whether a server is listening on the socket."""
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except socket.error as e:
+            if e.errno in (errno.ENOENT, errno.ECONNREFUSED):
+                return False
+            raise
+        finally:
+            probe.close()
+        return True
+
+    def start(self):
+        try:
+            mode = os.lstat(self.path).st_mode
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        else:
+            # The socket left behind by a previous run is replaced, any
+            # other file, or the socket of a live server, is not ours to
+            # remove.
+            if not stat.S_ISSOCK(mode):
+                raise RuntimeError(_('Cannot stream the OVN DB events on '
+                                     '%s, it is not a socket') % self.path)
+            if self.is_served():
+                raise RuntimeError(_('Cannot stream the OVN DB events on '
+                                     '%s, another server is streaming '
+                                     'them on it') % self.path)
+            os.unlink(self.path)
+        # The socket is created with its permissions right away, rather
+        # than being open to the other users until a chmod.
+        umask = os.umask(0o777 & ~self.mode)
+        try:
+            self._sock = eventlet.listen(self.path, family=socket.AF_UNIX)
+        finally:
+            os.umask(umask)
+        LOG.info(_LI('Streaming the OVN DB events on %s'), self.path)
+        greenthread.spawn_n(self._accept_loop)
+
+    def _accept_loop(self):
+        while True:
+            conn, _addr = self._sock.accept()
+            greenthread.spawn_n(self._serve, conn)
+
+    def _add_client(self, subscription):
+        client = _Client(subscription, self.queue_size)
+        with self._lock:
+            self.clients = self.clients | frozenset([client])
+        return client
+
+    def _remove_client(self, client):
+        with self._lock:
+            self.clients = self.clients - frozenset([client])
+
+    def _watch(self, conn, client):
+        # The clients only write their subscription, the end of their
+        # stream is their going away, noticed even when no event is sent to
+        # them.
+        try:
+            while conn.recv(4096):
+                pass
+        except (socket.error, IOError):
+            pass
+        client.close()
+
+    def _serve(self, conn):
+        client = None
+        try:
+            line = conn.makefile('rb').readline()
+            try:
+                client = self._add_client(
+                    jsonutils.loads(line) if line.strip() else {})
+            except ValueError as e:
+                LOG.warning(_LW('Invalid OVN DB event stream subscription '
+                                '%(line)s: %(error)s'),
+                            {'line': line, 'error': e})
+                return
+            greenthread.spawn_n(self._watch, conn, client)
+            while True:
+                msg = client.queue.get()
+                if msg is None:
+                    break
+                conn.sendall(msg.encode('utf-8'))
+        except (socket.error, IOError):
+            # The client went away
+            pass
+        finally:
+            if client is not None:
+                self._remove_client(client)
+            conn.close()
+
+    def publish(self, table, event, row, updates=None):
+        clients = [client for client in self.clients
+                   if client.matches(table, event)]
+        if not clients:
+            return
+        row_json = _row_to_json(row)
+        old_json = _row_to_json(updates) if updates is not None else None
+        for client in clients:
+            client.put(table, event, str(row.uuid), row_json, old_json)
@@ -15,7 +15,6 @@ from oslo_log import log
 import six
 import tenacity
 
-from neutron.agent.ovsdb import impl_idl
 from neutron.agent.ovsdb.native import connection
 from neutron.agent.ovsdb.native import idlutils
 from neutron_lib.utils import helpers
@@ -24,9 +23,11 @@ from networking_ovn._i18n import _, _LI
 from networking_ovn.common import config as cfg
 from networking_ovn.common import constants as ovn_const
 from networking_ovn.common import utils
+from networking_ovn.ovsdb import bulk_writer
 from networking_ovn.ovsdb import commands as cmd
 from networking_ovn.ovsdb import ovn_api
 from networking_ovn.ovsdb import ovsdb_monitor
+from networking_ovn.ovsdb import transaction
 
 
 LOG = log.getLogger(__name__)
@@ -73,6 +74,8 @@ def get_connection(db_class, trigger=None):
 class OvsdbNbOvnIdl(ovn_api.API):
 
     ovsdb_connection = None
+    txn_lanes = None
+    txn_coalescer = None
 
     def __init__(self, driver, trigger=None):
         super(OvsdbNbOvnIdl, self).__init__()
@@ -87,6 +90,19 @@ class OvsdbNbOvnIdl(ovn_api.API):
                 OvsdbNbOvnIdl.ovsdb_connection.start()
             self.idl = OvsdbNbOvnIdl.ovsdb_connection.idl
             self.ovsdb_timeout = cfg.get_ovn_ovsdb_timeout()
+            if OvsdbNbOvnIdl.txn_lanes is None:
+                OvsdbNbOvnIdl.txn_lanes = transaction.TransactionLanes({
+                    ovn_const.OVN_TXN_PRIORITY_INTERACTIVE:
+                        cfg.get_ovn_nb_interactive_txn_concurrency(),
+                    ovn_const.OVN_TXN_PRIORITY_BULK:
+                        cfg.get_ovn_nb_bulk_txn_concurrency()},
+                    stats_interval=cfg.get_ovn_nb_txn_stats_interval())
+            if (OvsdbNbOvnIdl.txn_coalescer is None and
+                    cfg.get_ovn_nb_txn_coalesce_window()):
+                OvsdbNbOvnIdl.txn_coalescer = (
+                    transaction.TransactionCoalescer(
+                        cfg.get_ovn_nb_txn_coalesce_window() / 1000.0,
+                        cfg.get_ovn_nb_txn_coalesce_max_commands()))
         except Exception as e:
             connection_exception = OvsdbConnectionUnavailable(
                 db_schema='OVN_Northbound', error=e)
@@ -97,11 +113,31 @@ class OvsdbNbOvnIdl(ovn_api.API):
     def _tables(self):
         return self.idl.tables
 
-    def transaction(self, check_error=False, log_errors=True, **kwargs):
-        return impl_idl.Transaction(self,
-                                    OvsdbNbOvnIdl.ovsdb_connection,
-                                    self.ovsdb_timeout,
-                                    check_error, log_errors)
+    def transaction(self, check_error=False, log_errors=True,
+                    priority=ovn_const.OVN_TXN_PRIORITY_INTERACTIVE,
+                    **kwargs):
+        return transaction.OvnNbTransaction(
+            self, OvsdbNbOvnIdl.ovsdb_connection, self.ovsdb_timeout,
+            check_error, log_errors, lanes=OvsdbNbOvnIdl.txn_lanes,
+            priority=priority, coalescer=OvsdbNbOvnIdl.txn_coalescer)
+
+    def chunked_transaction(self, description, check_error=False,
+                            log_errors=True,
+                            priority=ovn_const.OVN_TXN_PRIORITY_BULK):
+        return transaction.ChunkedTransaction(
+            self, cfg.get_ovn_nb_chunked_txn_max_commands(),
+            cfg.get_ovn_nb_chunked_txn_max_size(), description,
+            check_error=check_error, log_errors=log_errors,
+            priority=priority)
+
+    def bulk_writer(self, description):
+        return bulk_writer.OvsdbBulkWriter(
+            cfg.get_ovn_nb_connection(), 'OVN_Northbound', self._tables,
+            cfg.get_ovn_nb_chunked_txn_max_commands(), description,
+            cfg.get_ovn_ovsdb_timeout())
+
+    def get_lswitch_ports_stats(self):
+        return cmd.get_lswitch_ports_stats()
 
     def create_lswitch(self, lswitch_name, may_exist=True, **columns):
         return cmd.AddLSwitchCommand(self, lswitch_name,
@@ -137,6 +173,40 @@ class OvsdbNbOvnIdl(ovn_api.API):
             raise RuntimeError(_("Currently only supports "
                                  "delete by lport-name"))
 
+    def get_lswitch_port(self, lport_name):
+        try:
+            lsp = idlutils.row_by_value(self.idl, 'Logical_Switch_Port',
+                                        'name', lport_name)
+        except idlutils.RowNotFound:
+            return None
+        return self._lswitch_port_to_dict(lsp)
+
+    def get_lswitch_ports(self, lport_names):
+        lport_names = set(lport_names)
+        result = {}
+        for lsp in self._tables['Logical_Switch_Port'].rows.values():
+            if lsp.name in lport_names:
+                result[lsp.name] = self._lswitch_port_to_dict(lsp)
+                if len(result) == len(lport_names):
+                    break
+        return result
+
+    @staticmethod
+    def _lswitch_port_to_dict(lsp):
+        result = {'name': lsp.name,
+                  'type': lsp.type,
+                  'addresses': list(lsp.addresses),
+                  'port_security': list(lsp.port_security),
+                  'options': dict(lsp.options),
+                  'external_ids': dict(lsp.external_ids)}
+        for col in ('parent_name', 'tag', 'enabled'):
+            value = getattr(lsp, col, [])
+            result[col] = value[0] if value else None
+        for col in ('dhcpv4_options', 'dhcpv6_options'):
+            result[col] = [dhcp_opts.uuid
+                           for dhcp_opts in getattr(lsp, col, [])]
+        return result
+
     def get_all_logical_switches_with_ports(self):
         result = []
         for lswitch in self._tables['Logical_Switch'].rows.values():
@@ -25,10 +25,40 @@ class API(object):
         :type check_error:  bool
         :param log_errors:  Log an error if the transaction fails?
         :type log_errors:   bool
+        :param priority:    Transaction priority, one of
+                            OVN_TXN_PRIORITIES (NB DB only)
+        :type priority:     string
         :returns: A new transaction
         :rtype: :class:`Transaction`
         """
 
+    @abc.abstractmethod
+    def chunked_transaction(self, description, check_error=False,
+                            log_errors=True, priority=None):
+        """Create a transaction committed in chunks of bounded size
+
+        The parameters are the ones of transaction(), the priority defaults
+        to bulk.
+
+        :param description: Description of the work, for progress logging
+        :type description:  string
+        :returns: A new chunked transaction
+        :rtype: :class:`ChunkedTransaction`
+        """
+
+    @abc.abstractmethod
+    def bulk_writer(self, description):
+        """Create a writer of raw OVSDB operations, bypassing the IDL
+
+        For the bulk jobs writing many rows, the operations are committed
+        in transactions of at most nb_chunked_txn_max_commands operations.
+
+        :param description: Description of the work, for progress logging
+        :type description:  string
+        :returns: A new bulk writer
+        :rtype: :class:`OvsdbBulkWriter`
+        """
+
     @abc.abstractmethod
     def create_lswitch(self, name, may_exist=True, **columns):
         """Create a command to add an OVN lswitch
@@ -118,6 +148,32 @@ class API(object):
         :returns:             :class:`Command` with no result
         """
 
+    @abc.abstractmethod
+    def get_lswitch_port(self, lport_name):
+        """Returns the OVN logical switch port as a dictionary
+
+        :param lport_name:    The name of the lport
+        :type lport_name:     string
+        :returns:             Returns the columns of the Logical_Switch_Port
+                              as a dictionary, with optional columns
+                              (parent_name, tag, enabled) reduced to their
+                              value or None and DHCP_Options references
+                              reduced to their uuids. None is returned if
+                              the lport does not exist.
+        """
+
+    @abc.abstractmethod
+    def get_lswitch_ports(self, lport_names):
+        """Returns OVN logical switch ports as dictionaries
+
+        :param lport_names:   The names of the lports
+        :type lport_names:    list of string
+        :returns:             Returns a dictionary of the lport names vs the
+                              columns of their Logical_Switch_Port, as with
+                              get_lswitch_port. The lports which do not exist
+                              are left out.
+        """
+
     @abc.abstractmethod
     def create_lrouter(self, name, may_exist=True, **columns):
         """Create a command to add an OVN lrouter
@@ -14,16 +14,23 @@
 
 import atexit
 from eventlet import greenthread
+import os
+import six
 from six.moves import queue
 import tenacity
 import threading
+import time
 
 from oslo_log import log
 from ovs.db import idl
 from ovs import poller
 
-from networking_ovn._i18n import _LE
+from networking_ovn._i18n import _LE, _LI, _LW
 from networking_ovn.common import config as ovn_config
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.ovsdb import event_locks
+from networking_ovn.ovsdb import event_stats
+from networking_ovn.ovsdb import event_stream
 from networking_ovn.ovsdb import row_event
 from neutron.agent.ovsdb.native import connection
 from neutron.agent.ovsdb.native import idlutils
@@ -35,9 +42,38 @@ from neutron_lib.utils import helpers
 
 LOG = log.getLogger(__name__)
 
+# Seconds the OVN database connection waits for room in a full event queue
+# with the block overflow policy. The wait has to be bounded: the handlers
+# of the queued events may wait for NB DB transactions which are run by
+# the connection thread itself.
+OVSDB_EVENT_BLOCK_TIMEOUT = 5
+
+
+def _get_chassis_physnets(chassis):
+    bridge_mappings = chassis.external_ids.get('ovn-bridge-mappings', '')
+    mapping_dict = helpers.parse_mappings(bridge_mappings.split(','))
+    return list(mapping_dict)
+
+
+def _get_old_value(old, column):
+    """Return the old value of a column, None if it wasn't updated."""
+    if old is None:
+        return None
+    try:
+        return getattr(old, column)
+    except (KeyError, AttributeError):
+        # The old row only has the updated columns
+        return None
+
 
 class ChassisEvent(row_event.RowEvent):
-    """Chassis create update delete event."""
+    """Chassis create update delete event.
+
+    The Chassis rows are updated frequently, e.g. their nb_cfg, only the
+    updates of their hostname or of their bridge mappings are handled. The
+    routers are rescheduled ovn_l3_reschedule_delay seconds after a change,
+    once for all the changes of the chassis in the meantime.
+    """
 
     def __init__(self, driver):
         self.driver = driver
@@ -47,57 +83,117 @@ class ChassisEvent(row_event.RowEvent):
         events = (self.ROW_CREATE, self.ROW_UPDATE, self.ROW_DELETE)
         super(ChassisEvent, self).__init__(events, table, None)
         self.event_name = 'ChassisEvent'
+        self._reschedule_lock = threading.Lock()
+        self._reschedule_pending = False
+
+    def matches(self, event, row, old=None):
+        if not super(ChassisEvent, self).matches(event, row, old):
+            return False
+        if event != self.ROW_UPDATE or old is None:
+            return True
+        if _get_old_value(old, 'hostname') is not None:
+            return True
+        if _get_old_value(old, 'external_ids') is None:
+            return False
+        return (set(_get_chassis_physnets(old)) !=
+                set(_get_chassis_physnets(row)))
+
+    def _reschedule_routers(self):
+        with self._reschedule_lock:
+            # The changes from now on need another rescheduling
+            self._reschedule_pending = False
+        try:
+            self.l3_plugin.schedule_unhosted_routers()
+        except Exception:
+            LOG.exception(_LE('Failed to reschedule the router gateway '
+                              'ports'))
+
+    def _schedule_unhosted_routers(self):
+        delay = ovn_config.get_ovn_l3_reschedule_delay()
+        if not delay:
+            self.l3_plugin.schedule_unhosted_routers()
+            return
+        with self._reschedule_lock:
+            if self._reschedule_pending:
+                return
+            self._reschedule_pending = True
+        greenthread.spawn_after(delay, self._reschedule_routers)
 
     def run(self, event, row, old):
         host = row.hostname
         phy_nets = []
         if event != self.ROW_DELETE:
-            bridge_mappings = row.external_ids.get('ovn-bridge-mappings', '')
-            mapping_dict = helpers.parse_mappings(bridge_mappings.split(','))
-            phy_nets = list(mapping_dict)
+            phy_nets = _get_chassis_physnets(row)
 
+        old_host = _get_old_value(old, 'hostname')
+        if old_host is not None and old_host != host:
+            self.driver.update_segment_host_mapping(old_host, [])
         self.driver.update_segment_host_mapping(host, phy_nets)
         if ovn_config.is_ovn_l3():
-            self.l3_plugin.schedule_unhosted_routers()
+            self._schedule_unhosted_routers()
 
 
-class LogicalSwitchPortCreateUpEvent(row_event.RowEvent):
-    """Row create event - Logical_Switch_Port 'up' = True.
+class ChassisSyncEvent(row_event.RowEvent):
+    """Sync the segment host mappings with all the Chassis.
 
-    On connection, we get a dump of all ports, so if there is a neutron
-    port that is down that has since been activated, we'll catch it here.
-    This event will not be generated for new ports getting created.
+    Run instead of the Chassis events dropped when their queue was full,
+    this event doesn't match any row notification.
     """
+    ONETIME = True
 
-    def __init__(self, driver):
+    def __init__(self, driver, idl):
         self.driver = driver
-        table = 'Logical_Switch_Port'
-        events = (self.ROW_CREATE)
-        super(LogicalSwitchPortCreateUpEvent, self).__init__(
-            events, table, (('up', '=', True),))
-        self.event_name = 'LogicalSwitchPortCreateUpEvent'
+        self.idl = idl
+        self.l3_plugin = manager.NeutronManager.get_service_plugins().get(
+            plugin_constants.L3_ROUTER_NAT)
+        table = 'Chassis'
+        super(ChassisSyncEvent, self).__init__((), table, None)
+        self.event_name = 'ChassisSyncEvent'
 
     def run(self, event, row, old):
-        self.driver.set_port_status_up(row.name)
+        # The rows are updated by the connection thread, iterate on a copy.
+        for chassis in list(self.idl.tables[self.table].rows.values()):
+            if not self.idl.owns_row(chassis):
+                continue
+            self.driver.update_segment_host_mapping(
+                chassis.hostname, _get_chassis_physnets(chassis))
+        if ovn_config.is_ovn_l3():
+            self.l3_plugin.schedule_unhosted_routers()
 
 
-class LogicalSwitchPortCreateDownEvent(row_event.RowEvent):
-    """Row create event - Logical_Switch_Port 'up' = False
+class LogicalSwitchPortStatusSyncEvent(row_event.RowEvent):
+    """Sync the Neutron port statuses with the Logical_Switch_Ports 'up'.
 
-    On connection, we get a dump of all ports, so if there is a neutron
-    port that is up that has since been deactivated, we'll catch it here.
-    This event will not be generated for new ports getting created.
+    On connection, we get a dump of all ports, so if there are neutron
+    ports that have since been activated or deactivated, we'll catch them
+    here. Rather than handling the dump row by row, the 'up' state of all
+    the Logical_Switch_Ports is handed over to the driver at once. This
+    event doesn't match any row notification, it is queued once the idl
+    has been initialized.
     """
-    def __init__(self, driver):
+    ONETIME = True
+
+    def __init__(self, driver, idl):
         self.driver = driver
+        self.idl = idl
         table = 'Logical_Switch_Port'
-        events = (self.ROW_CREATE)
-        super(LogicalSwitchPortCreateDownEvent, self).__init__(
-            events, table, (('up', '=', False),))
-        self.event_name = 'LogicalSwitchPortCreateDownEvent'
+        super(LogicalSwitchPortStatusSyncEvent, self).__init__(
+            (), table, None)
+        self.event_name = 'LogicalSwitchPortStatusSyncEvent'
 
     def run(self, event, row, old):
-        self.driver.set_port_status_down(row.name)
+        lsp_states = {}
+        # The rows are updated by the connection thread, iterate on a copy.
+        for lsp in list(self.idl.tables[self.table].rows.values()):
+            if lsp.up and self.idl.owns_row(lsp):
+                lsp_states[lsp.name] = lsp.up[0]
+        self.driver.sync_port_statuses(lsp_states)
+
+
+def _lsp_status_coalesce_key(row):
+    # A port going up supersedes it going down before, and the other way
+    # round: only its latest status is set.
+    return ('Logical_Switch_Port status', row.uuid)
 
 
 class LogicalSwitchPortUpdateUpEvent(row_event.RowEvent):
@@ -110,12 +206,15 @@ class LogicalSwitchPortUpdateUpEvent(row_event.RowEvent):
     def __init__(self, driver):
         self.driver = driver
         table = 'Logical_Switch_Port'
-        events = (self.ROW_UPDATE)
+        events = (self.ROW_UPDATE,)
         super(LogicalSwitchPortUpdateUpEvent, self).__init__(
             events, table, (('up', '=', True),),
             old_conditions=(('up', '=', False),))
         self.event_name = 'LogicalSwitchPortUpdateUpEvent'
 
+    def coalesce_key(self, event, row):
+        return _lsp_status_coalesce_key(row)
+
     def run(self, event, row, old):
         self.driver.set_port_status_up(row.name)
 
@@ -130,41 +229,124 @@ class LogicalSwitchPortUpdateDownEvent(row_event.RowEvent):
     def __init__(self, driver):
         self.driver = driver
         table = 'Logical_Switch_Port'
-        events = (self.ROW_UPDATE)
+        events = (self.ROW_UPDATE,)
         super(LogicalSwitchPortUpdateDownEvent, self).__init__(
             events, table, (('up', '=', False),),
             old_conditions=(('up', '=', True),))
         self.event_name = 'LogicalSwitchPortUpdateDownEvent'
 
+    def coalesce_key(self, event, row):
+        return _lsp_status_coalesce_key(row)
+
     def run(self, event, row, old):
         self.driver.set_port_status_down(row.name)
 
 
+class _Notification(object):
+    """A matched event queued to be run, unless cancelled."""
+
+    def __init__(self, match, event, row, updates, key=None):
+        self.match = match
+        self.event = event
+        self.row = row
+        self.updates = updates
+        self.key = key
+        self.cancelled = False
+        # For the events of no row, the number of notifications queued to
+        # each of the other queues before it, see
+        # OvnDbNotifyHandler._wait_for_fence.
+        self.fence = None
+        # The type of event the notification is counted in the stats as
+        # queued for, kept when it is coalesced in place.
+        self.stats_name = type(match).__name__
+        self.queued_at = time.time()
+
+
 class OvnDbNotifyHandler(object):
 
     STOP_EVENT = ("STOP", None, None, None)
+    # Wakes the first worker up to run the resync event
+    RESYNC_EVENT = ("RESYNC", None, None, None)
 
-    def __init__(self, driver):
+    def __init__(self, driver, name=None):
         self.driver = driver
+        # The name of the database, in the name of the stats file
+        self.name = name
         self.__watched_events = set()
+        # (table, event type) vs the watched events of the table and event
+        # type. It is replaced on every change of the watched events, so
+        # that the notifications read it without taking the lock.
+        self.__index = {}
         self.__lock = threading.Lock()
-        self.notifications = queue.Queue()
-        self.notify_thread = greenthread.spawn_n(self.notify_loop)
+        # Coalescing key vs the queued notification of this key which
+        # hasn't been started yet.
+        self.__pending = {}
+        self.num_coalesced = 0
+        self.num_dropped = 0
+        # Event rebuilding the state maintained by the events from the idl,
+        # run once the events which didn't fit in the queues are dropped.
+        self.resync_event = None
+        self.__resync_needed = False
+        self.overflow_policy = ovn_config.get_ovn_ovsdb_event_overflow_policy()
+        self.event_stream = event_stream.get_server()
+        # The matched events are processed by a pool of workers, each with
+        # its own queue. The events of a row always go to the same worker,
+        # so that they are processed in order.
+        self.notifications = [
+            queue.Queue(ovn_config.get_ovn_ovsdb_event_queue_size())
+            for _ in range(ovn_config.get_ovn_ovsdb_event_workers())]
+        # The notifications queued to and processed from each queue, for
+        # the events of no row to wait for the ones queued before them.
+        self._queued = {}
+        self._processed = {}
+        self._progress = threading.Condition()
+        self.notify_threads = [greenthread.spawn_n(self.notify_loop, q)
+                               for q in self.notifications]
+        self.stats = event_stats.EventStats()
+        # The matches of each type of event at the previous report_stats,
+        # and its time, for the matches per second.
+        self._reported_matches = {}
+        self._reported_at = time.time()
+        stats_interval = ovn_config.get_ovn_ovsdb_event_stats_interval()
+        if stats_interval:
+            greenthread.spawn_n(self._report_stats_loop, stats_interval)
         atexit.register(self.shutdown)
 
+    def _reindex(self):
+        index = {}
+        for watched in self.__watched_events:
+            event_types = watched.events
+            if isinstance(event_types, six.string_types):
+                event_types = (event_types,)
+            try:
+                event_types = tuple(event_types)
+            except TypeError:
+                LOG.warning(_LW('%(event)s is never matched, its events '
+                                '%(types)r are not a sequence of event '
+                                'types'),
+                            {'event': watched, 'types': event_types})
+                event_types = ()
+            for event_type in event_types:
+                index.setdefault((watched.table, event_type), []).append(
+                    watched)
+        self.__index = dict((key, tuple(events))
+                            for key, events in index.items())
+
     def matching_events(self, event, row, updates):
-        with self.__lock:
-            return tuple(t for t in self.__watched_events
-                         if t.matches(event, row, updates))
+        candidates = self.__index.get((row._table.name, event), ())
+        return tuple(t for t in candidates
+                     if t.matches(event, row, updates))
 
     def watch_event(self, event):
         with self.__lock:
             self.__watched_events.add(event)
+            self._reindex()
 
     def watch_events(self, events):
         with self.__lock:
             for event in events:
                 self.__watched_events.add(event)
+            self._reindex()
 
     def unwatch_event(self, event):
         with self.__lock:
@@ -173,6 +355,7 @@ class OvnDbNotifyHandler(object):
             except KeyError:
                 # For ONETIME events, they should normally clear on their own
                 pass
+            self._reindex()
 
     def unwatch_events(self, events):
         with self.__lock:
@@ -183,33 +366,233 @@ class OvnDbNotifyHandler(object):
                     # For ONETIME events, they should normally clear on
                     # their own
                     pass
+            self._reindex()
+
+    def set_resync_event(self, event):
+        self.resync_event = event
 
     def shutdown(self):
-        self.notifications.put(OvnDbNotifyHandler.STOP_EVENT)
+        for notifications in self.notifications:
+            try:
+                notifications.put_nowait(OvnDbNotifyHandler.STOP_EVENT)
+            except queue.Full:
+                # The process is exiting, the worker doesn't need to be
+                # stopped.
+                pass
 
-    def notify_loop(self):
+    def _start(self, notification):
+        if notification.key is None:
+            return True
+        with self.__lock:
+            if notification.cancelled:
+                return False
+            if self.__pending.get(notification.key) is notification:
+                del self.__pending[notification.key]
+            return True
+
+    def _process(self, notification):
+        if notification.fence is not None:
+            self._wait_for_fence(notification.fence)
+        if not self._start(notification):
+            self.stats.started(notification.stats_name)
+            return
+        self.stats.started(notification.stats_name,
+                           time.time() - notification.queued_at)
+        match = notification.match
+        start = time.time()
+        try:
+            match.run(notification.event, notification.row,
+                      notification.updates)
+        finally:
+            self.stats.finished(type(match).__name__, time.time() - start)
+        if match.ONETIME:
+            self.unwatch_event(match)
+
+    def notify_loop(self, notifications):
         while True:
             try:
-                match, event, row, updates = self.notifications.get()
-                if (not isinstance(match, row_event.RowEvent) and
-                        (match, event, row, updates) == (
-                            OvnDbNotifyHandler.STOP_EVENT)):
-                    self.notifications.task_done()
+                notification = notifications.get()
+                if notification is OvnDbNotifyHandler.STOP_EVENT:
+                    notifications.task_done()
                     break
-                match.run(event, row, updates)
-                if match.ONETIME:
-                    self.unwatch_event(match)
-                self.notifications.task_done()
+                if notification is OvnDbNotifyHandler.RESYNC_EVENT:
+                    notifications.task_done()
+                else:
+                    try:
+                        self._process(notification)
+                    finally:
+                        notifications.task_done()
+                        with self._progress:
+                            self._processed[notifications] = (
+                                self._processed.get(notifications, 0) + 1)
+                            self._progress.notify_all()
+                # The resync event is run by the worker of the events of no
+                # row, see _wait_for_fence.
+                if (self.__resync_needed and
+                        notifications is self.notifications[0] and
+                        notifications.empty()):
+                    self._resync()
             except Exception:
                 # If any unexpected exception happens we don't want the
                 # notify_loop to exit.
                 LOG.exception(_LE('Unexpected exception in notify_loop'))
 
+    def _get_notifications(self, row):
+        if row is None:
+            return self.notifications[0]
+        return self.notifications[hash(row.uuid) % len(self.notifications)]
+
+    def _get_fence(self):
+        with self._progress:
+            fence = dict(self._queued)
+        # The events queued to the first worker before are processed
+        # first anyway.
+        fence.pop(self.notifications[0], None)
+        return fence
+
+    def _wait_for_fence(self, fence):
+        # The events of no row, e.g. the resync event rebuilding the state
+        # from the idl, go to the first worker and are run once the events
+        # queued to the other workers before them are processed, so that
+        # these stale events don't undo them. Only the first worker waits,
+        # so the workers never wait for each other.
+        with self._progress:
+            while any(self._processed.get(notifications, 0) < queued
+                      for notifications, queued in six.iteritems(fence)):
+                self._progress.wait()
+
+    def _resync(self):
+        with self.__lock:
+            if not self.__resync_needed:
+                return
+            self.__resync_needed = False
+        if self.resync_event is None:
+            return
+        self._wait_for_fence(self._get_fence())
+        LOG.info(_LI('Running %s to recover from the dropped events'),
+                 self.resync_event.event_name)
+        self.resync_event.run(None, None, None)
+
+    def _drop(self, notification):
+        with self.__lock:
+            if (notification.key is not None and
+                    self.__pending.get(notification.key) is notification):
+                del self.__pending[notification.key]
+            self.num_dropped += 1
+            self.stats.dropped(notification.stats_name)
+            if self.__resync_needed:
+                return
+            self.__resync_needed = True
+        LOG.warning(_LW('The queue of the OVN DB events is full, events '
+                        'are dropped until it is drained'))
+        try:
+            self.notifications[0].put_nowait(OvnDbNotifyHandler.RESYNC_EVENT)
+        except queue.Full:
+            # The first worker checks for the resync once it drained its
+            # queue.
+            pass
+
+    def queue_event(self, match, event=None, row=None, updates=None):
+        self.stats.matched(type(match).__name__)
+        key = None
+        if row is not None:
+            key = match.coalesce_key(event, row)
+        notification = _Notification(match, event, row, updates, key)
+        notifications = self._get_notifications(row)
+        if row is None:
+            notification.fence = self._get_fence()
+        if key is not None:
+            with self.__lock:
+                superseded = self.__pending.get(key)
+                if superseded is not None:
+                    self.num_coalesced += 1
+                    if (self.overflow_policy ==
+                            ovn_const.OVSDB_EVENT_OVERFLOW_COALESCE and
+                            notifications.full()):
+                        # The superseded notification is replaced in place,
+                        # the queue doesn't grow.
+                        superseded.match = match
+                        superseded.event = event
+                        superseded.row = row
+                        superseded.updates = updates
+                        return
+                    superseded.cancelled = True
+                self.__pending[key] = notification
+        self.stats.queued(notification.stats_name)
+        try:
+            if self.overflow_policy == ovn_const.OVSDB_EVENT_OVERFLOW_BLOCK:
+                notifications.put(notification,
+                                  timeout=OVSDB_EVENT_BLOCK_TIMEOUT)
+            else:
+                notifications.put_nowait(notification)
+        except queue.Full:
+            self._drop(notification)
+            return
+        with self._progress:
+            self._queued[notifications] = (
+                self._queued.get(notifications, 0) + 1)
+
+    def report_stats(self):
+        """Log the stats of the events and write them to a file"""
+        stats = self.stats.snapshot()
+        now = time.time()
+        elapsed = now - self._reported_at
+        for name, type_stats in stats.items():
+            matches = (type_stats['matched'] -
+                       self._reported_matches.get(name, 0))
+            type_stats['matches_per_second'] = (matches / elapsed
+                                                if elapsed > 0 else 0.0)
+        self._reported_matches = dict(
+            (name, type_stats['matched']) for name, type_stats in
+            stats.items())
+        self._reported_at = now
+        for name, type_stats in sorted(stats.items()):
+            LOG.info(_LI('%(name)s: %(rate).2f matches/s, %(depth)d queued, '
+                         '%(dropped)d dropped, queue wait p50 %(wait50).3fs '
+                         'p99 %(wait99).3fs max %(wait_max).3fs, run p50 '
+                         '%(run50).3fs p99 %(run99).3fs max %(run_max).3fs'),
+                     {'name': name,
+                      'rate': type_stats['matches_per_second'],
+                      'depth': type_stats['depth'],
+                      'dropped': type_stats['dropped'],
+                      'wait50': type_stats['queue_wait']['p50'],
+                      'wait99': type_stats['queue_wait']['p99'],
+                      'wait_max': type_stats['queue_wait']['max'],
+                      'run50': type_stats['run_time']['p50'],
+                      'run99': type_stats['run_time']['p99'],
+                      'run_max': type_stats['run_time']['max']})
+        path = ovn_config.get_ovn_ovsdb_event_stats_path()
+        if path:
+            # Each worker of the neutron server has stats of its own for
+            # each database.
+            suffix = '%d' % os.getpid()
+            if self.name:
+                suffix = '%s.%s' % (self.name, suffix)
+            event_stats.write_stats('%s.%s' % (path, suffix), {
+                'events': stats,
+                'queue_depths': [q.qsize() for q in self.notifications],
+                'coalesced': self.num_coalesced,
+                'dropped': self.num_dropped})
+
+    def _report_stats_loop(self, interval):
+        while True:
+            greenthread.sleep(interval)
+            try:
+                self.report_stats()
+            except Exception:
+                LOG.exception(_LE('Failed to report the stats of the OVN DB '
+                                  'events'))
+
+    def publish(self, event, row, updates=None):
+        """Publish a row event on the event stream, if configured"""
+        if self.event_stream is not None:
+            self.event_stream.publish(row._table.name, event, row, updates)
+
     def notify(self, event, row, updates=None):
         matching = self.matching_events(
             event, row, updates)
         for match in matching:
-            self.notifications.put((match, event, row, updates))
+            self.queue_event(match, event, row, updates)
 
 
 class OvnIdl(idl.Idl):
@@ -217,7 +600,8 @@ class OvnIdl(idl.Idl):
     def __init__(self, driver, remote, schema):
         super(OvnIdl, self).__init__(remote, schema)
 
-        self.notify_handler = OvnDbNotifyHandler(driver)
+        self.notify_handler = OvnDbNotifyHandler(
+            driver, name=schema.schema_json.get('name'))
         # ovsdb lock name to acquire.
         # This event lock is used to handle the notify events sent by idl.Idl
         # idl.Idl will call notify function for the "update" rpc method it
@@ -236,11 +620,83 @@ class OvnIdl(idl.Idl):
         #    ovsdb server would assign the lock to one of the other neutron
         #    servers.
         self.event_lock_name = "neutron_ovn_event_lock"
+        # With ovsdb_event_lock_shards, the events are split in shards with
+        # locks of their own instead, see EventLockShards.
+        self.event_lock_shards = None
+        # The shards whose events are processed, [0] with the single lock.
+        self._event_locks_held = frozenset()
+        self._initialized = False
+        self._session_seqno = None
+        self._catch_up_needed = False
+        # The change_seqno to move past before catching up, see
+        # _update_event_locks.
+        self._catch_up_change_seqno = None
+
+    def run(self):
+        changed = super(OvnIdl, self).run()
+        if self._initialized:
+            self._update_event_locks()
+        return changed
+
+    def _get_event_locks_held(self):
+        if self.event_lock_shards is not None:
+            return self.event_lock_shards.held
+        if self.lock_name is None or self.has_lock:
+            return frozenset([0])
+        return frozenset()
+
+    def _update_event_locks(self):
+        seqno = self._session.get_seqno()
+        if seqno != self._session_seqno:
+            # The changes made while disconnected were missed. The catch up
+            # waits for the dump of the database following the reconnection,
+            # the reply to the monitor request making change_seqno move on.
+            self._session_seqno = seqno
+            self._catch_up_needed = True
+            self._catch_up_change_seqno = self.change_seqno
+        held = self._get_event_locks_held()
+        if held != self._event_locks_held:
+            if held - self._event_locks_held:
+                # The changes made while another server held the lock were
+                # handled by it, or missed if it died.
+                self._catch_up_needed = True
+            self._event_locks_held = held
+            self.set_event_processing(bool(held))
+        if (self._catch_up_needed and held and
+                self._session.is_connected() and
+                self.change_seqno != self._catch_up_change_seqno):
+            self._catch_up_needed = False
+            self._catch_up_change_seqno = None
+            LOG.info(_LI('Catching up with the changes of the OVN DB missed '
+                         'without the event lock or the connection'))
+            self.catch_up()
+
+    def set_event_processing(self, enabled):
+        """Enable or disable the notifications only needed by the events
+
+        Disabled while this server doesn't hold any event lock, the
+        notifications of the other servers being dropped anyway.
+        """
+        pass
+
+    def catch_up(self):
+        """Catch up with the changes missed without the event lock"""
+        if self.notify_handler.resync_event is not None:
+            self.notify_handler.queue_event(self.notify_handler.resync_event)
+
+    def owns_row(self, row):
+        """Whether the events of the row are handled by this server"""
+        if self.event_lock_shards is not None:
+            return self.event_lock_shards.holds(row)
+        return not (self.is_lock_contended and not self.has_lock)
 
     def notify(self, event, row, updates=None):
+        # The stream is consumed by the local clients, all the events are
+        # published, whatever the event lock.
+        self.notify_handler.publish(event, row, updates)
         # Do not handle the notification if the event lock is requested,
         # but not granted by the ovsdb-server.
-        if (self.is_lock_contended and not self.has_lock):
+        if not self.owns_row(row):
             LOG.debug("Don't have the event lock to handle the notify"
                       " events. Ignoring the event : %s", event)
             return
@@ -249,7 +705,10 @@ class OvnIdl(idl.Idl):
 
     def post_initialize(self, driver):
         """Should be called after the idl has been initialized"""
-        pass
+        self._session_seqno = self._session.get_seqno()
+        self._event_locks_held = self._get_event_locks_held()
+        self.set_event_processing(bool(self._event_locks_held))
+        self._initialized = True
 
 
 class OvnNbIdl(OvnIdl):
@@ -258,30 +717,35 @@ class OvnNbIdl(OvnIdl):
         super(OvnNbIdl, self).__init__(driver, remote, schema)
         self._lsp_update_up_event = LogicalSwitchPortUpdateUpEvent(driver)
         self._lsp_update_down_event = LogicalSwitchPortUpdateDownEvent(driver)
-        self._lsp_create_up_event = LogicalSwitchPortCreateUpEvent(driver)
-        self._lsp_create_down_event = LogicalSwitchPortCreateDownEvent(driver)
 
-        self.notify_handler.watch_events([self._lsp_create_up_event,
-                                          self._lsp_create_down_event,
-                                          self._lsp_update_up_event,
+        self.notify_handler.watch_events([self._lsp_update_up_event,
                                           self._lsp_update_down_event])
+        self.notify_handler.set_resync_event(
+            LogicalSwitchPortStatusSyncEvent(driver, self))
 
-    def unwatch_logical_switch_port_create_events(self):
-        """Unwatch the logical switch port create events.
+    def post_initialize(self, driver):
+        """Sync the port statuses with the initial dump of the ports.
 
         When the ovs idl client connects to the ovsdb-server, it gets
-        a dump of all logical switch ports as events and we need to process
-        them at start up.
-        After the startup, there is no need to watch these events.
-        So unwatch these events.
+        a dump of all logical switch ports. Instead of processing them as
+        create events, the status of all the ports is synced at once by
+        the notify handler. Without the event lock, the port statuses are
+        synced once it is acquired instead.
         """
-        self.notify_handler.unwatch_events([self._lsp_create_up_event,
-                                            self._lsp_create_down_event])
-        self._lsp_create_up_event = None
-        self._lsp_create_down_event = None
+        super(OvnNbIdl, self).post_initialize(driver)
+        if not self._event_locks_held:
+            LOG.debug("Don't have the event lock to sync the port statuses")
+            return
+        self.notify_handler.queue_event(
+            LogicalSwitchPortStatusSyncEvent(driver, self))
 
-    def post_initialize(self, driver):
-        self.unwatch_logical_switch_port_create_events()
+    def set_event_processing(self, enabled):
+        # The changes of the 'up' column, i.e. of the status of the ports,
+        # are only used by the events and the event stream.
+        table = self.tables.get('Logical_Switch_Port')
+        if table is not None and 'up' in table.columns:
+            table.columns['up'].alert = (
+                enabled or self.notify_handler.event_stream is not None)
 
 
 class OvnSbIdl(OvnIdl):
@@ -294,8 +758,10 @@ class OvnSbIdl(OvnIdl):
         because there will be sync up at startup. After that, we will watch
         the events to make notify work.
         """
+        super(OvnSbIdl, self).post_initialize(driver)
         self._chassis_event = ChassisEvent(driver)
         self.notify_handler.watch_events([self._chassis_event])
+        self.notify_handler.set_resync_event(ChassisSyncEvent(driver, self))
 
 
 class OvnConnection(connection.Connection):
@@ -343,7 +809,13 @@ class OvnConnection(connection.Connection):
 
             idl_cls = self.get_ovn_idl_cls()
             self.idl = idl_cls(driver, self.connection, helper)
-            self.idl.set_lock(self.idl.event_lock_name)
+            num_shards = ovn_config.get_ovn_ovsdb_event_lock_shards()
+            if num_shards > 1:
+                self.idl.event_lock_shards = event_locks.EventLockShards(
+                    self.connection, self.idl.event_lock_name, num_shards)
+                self.idl.event_lock_shards.start()
+            else:
+                self.idl.set_lock(self.idl.event_lock_name)
             idlutils.wait_for_change(self.idl, self.timeout)
             self.idl.post_initialize(driver)
             self.poller = poller.Poller()
@@ -71,6 +71,15 @@ class RowEvent(object):
                   str(self.old_conditions))
         return True
 
+    def coalesce_key(self, event, row):
+        """Key of the pending events superseded by this one for the row
+
+        A matched event is only run if no event with the same key was
+        queued after it in the meantime. None, the default, disables the
+        coalescing.
+        """
+        return None
+
     @abc.abstractmethod
     def run(self, event, row, old):
         """Method to run when the event matches"""
@@ -0,0 +1,427 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import threading
+import time
+import traceback
+
+from eventlet import greenthread
+from oslo_log import log
+import six
+from six.moves import queue as Queue
+
+from neutron.agent.ovsdb import api
+from neutron.agent.ovsdb import impl_idl
+from neutron.agent.ovsdb.native import idlutils
+
+from networking_ovn._i18n import _, _LE, _LI
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.ovsdb import commands as cmd
+
+LOG = log.getLogger(__name__)
+
+
+class TransactionLanes(object):
+    """Admission of the OVN NB DB transactions per priority.
+
+    Each priority (see OVN_TXN_PRIORITIES) has its own lane, in which at
+    most a configured number of transactions are committed concurrently.
+    A transaction only enters its lane when no transaction of a higher
+    priority is waiting, so that bulk work yields the connection to the
+    interactive API requests.
+    """
+
+    def __init__(self, limits, stats_interval=0):
+        """Create the lanes
+
+        :param limits:         dict mapping priorities to lane concurrency
+        :param stats_interval: interval in seconds at which the queue time
+                               statistics are logged, 0 to never log them
+        """
+        self._limits = limits
+        self._cond = threading.Condition()
+        self._running = dict((p, 0) for p in ovn_const.OVN_TXN_PRIORITIES)
+        self._waiting = dict((p, 0) for p in ovn_const.OVN_TXN_PRIORITIES)
+        self._stats = dict(
+            (p, {'count': 0, 'queue_time': 0.0, 'max_queue_time': 0.0})
+            for p in ovn_const.OVN_TXN_PRIORITIES)
+        # The stats at the previous report_stats, for the counts since.
+        self._reported = self.get_stats()
+        if stats_interval:
+            greenthread.spawn_n(self._report_stats_loop, stats_interval)
+
+    def _can_enter(self, priority):
+        if self._running[priority] >= self._limits[priority]:
+            return False
+        for higher in ovn_const.OVN_TXN_PRIORITIES:
+            if higher == priority:
+                return True
+            if self._waiting[higher]:
+                return False
+
+    @contextlib.contextmanager
+    def enter(self, priority, timeout):
+        start = time.time()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while not self._can_enter(priority):
+                    remaining = start + timeout - time.time()
+                    if remaining <= 0:
+                        raise api.TimeoutException(
+                            _("Waited more than %(timeout)d seconds for a "
+                              "slot in the %(priority)s transaction lane") %
+                            {'timeout': timeout, 'priority': priority})
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting[priority] -= 1
+            self._running[priority] += 1
+            queue_time = time.time() - start
+            stats = self._stats[priority]
+            stats['count'] += 1
+            stats['queue_time'] += queue_time
+            stats['max_queue_time'] = max(stats['max_queue_time'],
+                                          queue_time)
+        LOG.debug('OVN NB transaction waited %(time).3f seconds in the '
+                  '%(priority)s lane', {'time': queue_time,
+                                        'priority': priority})
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running[priority] -= 1
+                self._cond.notify_all()
+
+    def get_stats(self):
+        """Return the queue time statistics of each lane.
+
+        For each priority: the number of transactions admitted and their
+        total queue time in seconds, their maximum queue time since the
+        last report_stats, and the number of transactions currently
+        waiting and running.
+        """
+        with self._cond:
+            return dict(
+                (p, dict(self._stats[p], waiting=self._waiting[p],
+                         running=self._running[p]))
+                for p in ovn_const.OVN_TXN_PRIORITIES)
+
+    def report_stats(self):
+        """Log the queue times of each lane since the last report"""
+        with self._cond:
+            stats = self.get_stats()
+            for priority_stats in self._stats.values():
+                priority_stats['max_queue_time'] = 0.0
+        for priority in ovn_const.OVN_TXN_PRIORITIES:
+            lane = stats[priority]
+            count = lane['count'] - self._reported[priority]['count']
+            queue_time = (lane['queue_time'] -
+                          self._reported[priority]['queue_time'])
+            LOG.info(_LI('OVN NB %(priority)s transactions: %(count)d '
+                         'admitted, queue time avg %(avg).3fs max '
+                         '%(max).3fs, %(waiting)d waiting, %(running)d '
+                         'running'),
+                     {'priority': priority, 'count': count,
+                      'avg': queue_time / count if count else 0.0,
+                      'max': lane['max_queue_time'],
+                      'waiting': lane['waiting'],
+                      'running': lane['running']})
+        self._reported = stats
+
+    def _report_stats_loop(self, interval):
+        while True:
+            greenthread.sleep(interval)
+            try:
+                self.report_stats()
+            except Exception:
+                LOG.exception(_LE('Failed to report the stats of the OVN NB '
+                                  'transaction lanes'))
+
+
+class _Batch(object):
+
+    def __init__(self):
+        self.txns = []
+        self.num_commands = 0
+        self.full = threading.Event()
+
+    def add(self, txn):
+        self.txns.append(txn)
+        self.num_commands += len(txn.commands)
+
+
+class TransactionCoalescer(object):
+    """Write-combining of concurrent OVN NB DB transactions.
+
+    The first transaction committed starts a batch and waits for the
+    coalescing window to elapse, or for the batch to reach the maximum
+    number of commands. The commands of all the transactions of the same
+    priority committed in the meantime are then committed in a single
+    OVSDB transaction, and each transaction gets the results of its own
+    commands. If the batch fails, it is split in halves which are
+    committed separately, until the failing transaction is isolated.
+    """
+
+    def __init__(self, window, max_commands):
+        """:param window: coalescing window in seconds"""
+        self._window = window
+        self._max_commands = max_commands
+        self._lock = threading.Lock()
+        self._open_batches = {}
+
+    def _close(self, priority, batch):
+        # Called with the lock held
+        if self._open_batches.get(priority) is batch:
+            del self._open_batches[priority]
+        batch.full.set()
+
+    def commit(self, txn):
+        """Commit txn as part of a batch and return its raw result.
+
+        The result is either the list of the command results or an
+        ExceptionResult, as put in the transaction results queue by the
+        connection thread.
+        """
+        with self._lock:
+            batch = self._open_batches.get(txn.priority)
+            leader = batch is None
+            if leader:
+                batch = self._open_batches[txn.priority] = _Batch()
+            batch.add(txn)
+            if batch.num_commands >= self._max_commands:
+                self._close(txn.priority, batch)
+        if leader:
+            batch.full.wait(self._window)
+            with self._lock:
+                self._close(txn.priority, batch)
+            try:
+                self._commit_batch(batch.txns)
+            except Exception as e:
+                result = idlutils.ExceptionResult(
+                    ex=e, tb=traceback.format_exc())
+                for t in batch.txns:
+                    if not t.coalesced.is_set():
+                        t.set_coalesced_result(result)
+        txn.coalesced.wait()
+        return txn.coalesced_result
+
+    def _commit_batch(self, txns):
+        if len(txns) == 1:
+            txns[0].set_coalesced_result(txns[0].commit_raw())
+            return
+        first = txns[0]
+        combined = OvnNbTransaction(
+            first.api, first.ovsdb_connection,
+            max(t.timeout for t in txns), check_error=True,
+            log_errors=False, lanes=first.lanes, priority=first.priority)
+        for t in txns:
+            combined.commands.extend(t.commands)
+        LOG.debug('Committing %(txns)d coalesced OVN NB transactions '
+                  '(%(cmds)d commands)', {'txns': len(txns),
+                                          'cmds': len(combined.commands)})
+        result = combined.commit_raw()
+        if isinstance(result, idlutils.ExceptionResult):
+            if isinstance(result.ex, api.TimeoutException):
+                for t in txns:
+                    t.set_coalesced_result(result)
+                return
+            LOG.debug('Coalesced OVN NB transaction failed, splitting it: '
+                      '%s', result.ex)
+            half = len(txns) // 2
+            self._commit_batch(txns[:half])
+            self._commit_batch(txns[half:])
+            return
+        offset = 0
+        for t in txns:
+            t.set_coalesced_result(result[offset:offset + len(t.commands)])
+            offset += len(t.commands)
+
+
+class LSwitchLocks(object):
+    """In-process locks of the Logical_Switch port lists.
+
+    Without OVSDB mutate support, adding or deleting a port verifies and
+    rewrites the whole ports column of its Logical_Switch, so concurrent
+    transactions on a switch with many ports being created conflict and
+    are retried. Holding the lock of the switch while committing lets each
+    transaction run against the switch as committed by the previous one.
+
+    The locks of all the switches of a transaction are taken at once, and
+    only the names of the switches currently locked are kept.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._held = set()
+
+    @contextlib.contextmanager
+    def hold(self, names, timeout):
+        names = set(names)
+        if not names:
+            yield
+            return
+        start = time.time()
+        with self._cond:
+            while self._held & names:
+                remaining = start + timeout - time.time()
+                if remaining <= 0:
+                    raise api.TimeoutException(
+                        _("Waited more than %(timeout)d seconds for the "
+                          "lock of the logical switches %(names)s") %
+                        {'timeout': timeout, 'names': sorted(names)})
+                self._cond.wait(remaining)
+            self._held |= names
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._held -= names
+                self._cond.notify_all()
+
+
+_LSWITCH_LOCKS = LSwitchLocks()
+
+
+def _estimate_command_size(command):
+    # Rough size of the command in the JSON-RPC transact request: the size
+    # of its arguments, the api they all refer to excepted.
+    return sum(len(repr(value)) for name, value in six.iteritems(vars(command))
+               if name != 'api')
+
+
+class ChunkedTransaction(object):
+    """Commits the commands added to it in transactions of bounded size.
+
+    Used where the number of commands is unbounded, e.g. when repairing a
+    large drift between Neutron and the OVN NB DB. The commands are
+    committed in chunks of at most max_commands commands and of roughly
+    max_size bytes of arguments. A chunk is committed as soon as the next
+    commands don't fit in it, and the last one when leaving the context.
+    The chunks committed before a failure are kept: the callers must be
+    able to complete the work later, as the synchronization does on its
+    next run.
+    """
+
+    def __init__(self, api, max_commands, max_size, description,
+                 **txn_kwargs):
+        self.api = api
+        self.max_commands = max_commands
+        self.max_size = max_size
+        self.description = description
+        self.txn_kwargs = txn_kwargs
+        self.num_chunks = 0
+        self.num_commands = 0
+        self._chunk = []
+        self._chunk_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, tb):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, command):
+        self.add_group([command])
+        return command
+
+    def add_group(self, commands):
+        """Add commands which have to be committed in the same chunk."""
+        size = sum(_estimate_command_size(command) for command in commands)
+        if self._chunk and (
+                len(self._chunk) + len(commands) > self.max_commands or
+                self._chunk_size + size > self.max_size):
+            self.flush()
+        self._chunk.extend(commands)
+        self._chunk_size += size
+
+    def flush(self):
+        """Commit the pending commands."""
+        if not self._chunk:
+            return
+        with self.api.transaction(**self.txn_kwargs) as txn:
+            for command in self._chunk:
+                txn.add(command)
+        self.num_chunks += 1
+        self.num_commands += len(self._chunk)
+        LOG.info(_LI('%(desc)s: committed chunk %(chunk)d of %(num)d '
+                     'commands (~%(size)d bytes), %(total)d commands '
+                     'committed so far'),
+                 {'desc': self.description, 'chunk': self.num_chunks,
+                  'num': len(self._chunk), 'size': self._chunk_size,
+                  'total': self.num_commands})
+        self._chunk = []
+        self._chunk_size = 0
+
+
+class OvnNbTransaction(impl_idl.Transaction):
+    """Transaction committed through a priority lane and a coalescer."""
+
+    def __init__(self, api, ovsdb_connection, timeout, check_error=False,
+                 log_errors=True, lanes=None,
+                 priority=ovn_const.OVN_TXN_PRIORITY_INTERACTIVE,
+                 coalescer=None):
+        super(OvnNbTransaction, self).__init__(
+            api, ovsdb_connection, timeout, check_error, log_errors)
+        self.lanes = lanes
+        self.priority = priority
+        self.coalescer = coalescer
+        self.coalesced = threading.Event()
+        self.coalesced_result = None
+
+    def set_coalesced_result(self, result):
+        self.coalesced_result = result
+        self.coalesced.set()
+
+    def _queue_and_wait(self):
+        self.ovsdb_connection.queue_txn(self)
+        try:
+            return self.results.get(timeout=self.timeout)
+        except Queue.Empty:
+            ex = api.TimeoutException(
+                _("Commands %(commands)s exceeded timeout %(timeout)d "
+                  "seconds") % {'commands': self.commands,
+                                'timeout': self.timeout})
+            return idlutils.ExceptionResult(ex=ex, tb=None)
+
+    def _get_locked_lswitches(self):
+        if cmd.is_ovs_mutate_supported():
+            return set()
+        return set(c.lswitch for c in self.commands
+                   if isinstance(c, (cmd.AddLSwitchPortCommand,
+                                     cmd.DelLSwitchPortCommand)) and
+                   c.lswitch)
+
+    def commit_raw(self):
+        """Commit the transaction, return the result without checking it."""
+        try:
+            with _LSWITCH_LOCKS.hold(self._get_locked_lswitches(),
+                                     self.timeout):
+                if self.lanes is None:
+                    return self._queue_and_wait()
+                with self.lanes.enter(self.priority, self.timeout):
+                    return self._queue_and_wait()
+        except api.TimeoutException as e:
+            return idlutils.ExceptionResult(ex=e, tb=traceback.format_exc())
+
+    def commit(self):
+        if self.coalescer is None:
+            result = self.commit_raw()
+        else:
+            result = self.coalescer.commit(self)
+        if isinstance(result, idlutils.ExceptionResult):
+            if self.log_errors:
+                LOG.error(result.tb or result.ex)
+            if self.check_error:
+                raise result.ex
+        return result
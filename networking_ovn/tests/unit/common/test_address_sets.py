@@ -0,0 +1,60 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from networking_ovn.common import address_sets
+from networking_ovn.tests import base
+
+
+class TestAddressSets(base.TestCase):
+
+    def test_compute_difference_unchanged(self):
+        self.assertEqual(
+            ([], []),
+            address_sets.compute_difference(
+                ['10.0.0.2', '10.0.0.1', '10.0.0.1'],
+                ['10.0.0.1', '10.0.0.2']))
+
+    def test_compute_difference_ipv4(self):
+        to_add, to_remove = address_sets.compute_difference(
+            ['10.0.0.1', '10.0.0.3', '10.0.0.4'],
+            ['10.0.0.2', '10.0.0.3', '10.0.0.5'])
+        self.assertItemsEqual(['10.0.0.1', '10.0.0.4'], to_add)
+        self.assertItemsEqual(['10.0.0.2', '10.0.0.5'], to_remove)
+
+    def test_compute_difference_ipv6_keeps_original_strings(self):
+        to_add, to_remove = address_sets.compute_difference(
+            ['fd79:e1c:a55::816:eff:eff:ff2'],
+            ['FD79:E1C:A55::816:EFF:EFF:FF2',
+             'fd79:e1c:a55::816:eff:eff:ff3'])
+        self.assertEqual([], to_add)
+        self.assertEqual(['fd79:e1c:a55::816:eff:eff:ff3'], to_remove)
+
+    def test_compute_difference_mixed_families(self):
+        # ::10.0.0.1 and 10.0.0.1 share the same low bits but must not be
+        # considered equal.
+        to_add, to_remove = address_sets.compute_difference(
+            ['10.0.0.1'], ['::10.0.0.1'])
+        self.assertEqual(['10.0.0.1'], to_add)
+        self.assertEqual(['::10.0.0.1'], to_remove)
+
+    def test_compute_difference_non_address_entries(self):
+        to_add, to_remove = address_sets.compute_difference(
+            ['10.0.0.1', '10.0.1.0/24'], ['10.0.0.1', '10.0.2.0/24'])
+        self.assertEqual(['10.0.1.0/24'], to_add)
+        self.assertEqual(['10.0.2.0/24'], to_remove)
+
+    def test_compute_difference_non_canonical_ipv4(self):
+        malformed = ['10.0.1', '10.0.0.1 junk', '0x0a.0.0.1', '012.0.0.1']
+        to_add, to_remove = address_sets.compute_difference(
+            ['10.0.0.1', '10.0.0.10'], malformed)
+        self.assertItemsEqual(['10.0.0.1', '10.0.0.10'], to_add)
+        self.assertItemsEqual(malformed, to_remove)
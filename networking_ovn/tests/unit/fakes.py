@@ -43,12 +43,18 @@ class FakeOvsdbNbOvnIdl(object):
         self._tables['Address_Set'] = self.addrset_table
         self._tables['DHCP_Options'] = self.dhcp_options_table
         self.transaction = _fake
+        self.chunked_transaction = _fake
+        self.bulk_writer = _fake
         self.create_lswitch = mock.Mock()
         self.set_lswitch_ext_id = mock.Mock()
         self.delete_lswitch = mock.Mock()
         self.create_lswitch_port = mock.Mock()
         self.set_lswitch_port = mock.Mock()
         self.delete_lswitch_port = mock.Mock()
+        self.get_lswitch_port = mock.Mock()
+        self.get_lswitch_port.return_value = None
+        self.get_lswitch_ports = mock.Mock()
+        self.get_lswitch_ports.return_value = {}
         self.get_acls_for_lswitches = mock.Mock()
         self.create_lrouter = mock.Mock()
         self.update_lrouter = mock.Mock()
@@ -0,0 +1,187 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_serialization import jsonutils
+
+from networking_ovn.common import config
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.db import db
+from networking_ovn.db import models
+from networking_ovn.journal import journal
+from networking_ovn.tests import base
+
+
+def _make_row(seqnum, object_type, object_uuid, operation, retry_count=0,
+              **data):
+    return models.OVNJournal(seqnum=seqnum, object_type=object_type,
+                             object_uuid=object_uuid, operation=operation,
+                             data=jsonutils.dumps(data),
+                             state=ovn_const.JOURNAL_PROCESSING,
+                             retry_count=retry_count)
+
+
+class TestJournal(base.TestCase):
+
+    def setUp(self):
+        super(TestJournal, self).setUp()
+        self.handlers = {}
+        mock.patch.object(journal, '_HANDLERS', self.handlers).start()
+        mock.patch.object(journal.db_api, 'get_session').start()
+        self.reset_stale = mock.patch.object(
+            db, 'reset_stale_processing_rows').start()
+        self.touch_rows = mock.patch.object(db, 'touch_rows').start()
+        self.claim = mock.patch.object(db, 'claim_pending_rows').start()
+        self.delete_row = mock.patch.object(db, 'delete_row').start()
+        self.update_row_state = mock.patch.object(
+            db, 'update_row_state').start()
+        config.cfg.CONF.set_override('ovn_journal_max_retries', 2,
+                                     group='ovn')
+        self.addCleanup(mock.patch.stopall)
+        self.thread = journal.OvnJournalThread()
+
+    def test_get_ordering_key(self):
+        port_row = _make_row(1, ovn_const.JOURNAL_PORT, 'port-id',
+                             ovn_const.JOURNAL_CREATE,
+                             port={'id': 'port-id', 'network_id': 'net-id'})
+        network_row = _make_row(2, ovn_const.JOURNAL_NETWORK, 'net-id',
+                                ovn_const.JOURNAL_DELETE,
+                                network={'id': 'net-id'})
+        router_row = _make_row(3, ovn_const.JOURNAL_ROUTER, 'router-id',
+                               ovn_const.JOURNAL_DELETE,
+                               router_id='router-id')
+        self.assertEqual('net-id', db.get_ordering_key(port_row))
+        self.assertEqual('net-id', db.get_ordering_key(network_row))
+        self.assertEqual('router-id', db.get_ordering_key(router_row))
+        router_row.ordering_key = 'other-id'
+        self.assertEqual('other-id', db.get_ordering_key(router_row))
+
+    def test_create_pending_row(self):
+        session = mock.Mock()
+        row = db.create_pending_row(
+            session, ovn_const.JOURNAL_PORT, 'port-id',
+            ovn_const.JOURNAL_CREATE,
+            {'port': {'id': 'port-id', 'network_id': 'net-id'}})
+        self.assertEqual('net-id', row.ordering_key)
+        session.add.assert_called_once_with(row)
+        session.flush.assert_called_once_with()
+
+    def test_record(self):
+        context = mock.Mock()
+        with mock.patch.object(db, 'create_pending_row') as create_row:
+            journal.record(context, ovn_const.JOURNAL_ROUTER, 'router-id',
+                           ovn_const.JOURNAL_DELETE, router_id='router-id')
+        create_row.assert_called_once_with(
+            context.session, ovn_const.JOURNAL_ROUTER, 'router-id',
+            ovn_const.JOURNAL_DELETE, {'router_id': 'router-id'})
+
+    def test_replayed_by_journal(self):
+        method = mock.Mock(return_value='result')
+        wrapped = journal.replayed_by_journal(method)
+        with mock.patch.object(journal, 'wake_up') as wake_up:
+            self.assertEqual('result', wrapped('arg'))
+            method.assert_called_once_with('arg')
+            wake_up.assert_not_called()
+
+            method.reset_mock()
+            config.cfg.CONF.set_override('ovn_journal_enabled', True,
+                                         group='ovn')
+            self.assertIsNone(wrapped('arg'))
+            method.assert_not_called()
+            wake_up.assert_called_once_with()
+
+    def test_wait_for_replay(self):
+        with mock.patch.object(db, 'has_pending_rows') as pending:
+            journal.wait_for_replay(['router-id'])
+            # The journal is disabled.
+            pending.assert_not_called()
+
+            config.cfg.CONF.set_override('ovn_journal_enabled', True,
+                                         group='ovn')
+            pending.side_effect = [True, True, False]
+            with mock.patch.object(journal, 'time') as time_mock:
+                time_mock.time.return_value = 0
+                journal.wait_for_replay(['router-id', 'port-id'])
+            pending.assert_called_with(mock.ANY, {'router-id', 'port-id'})
+            self.assertEqual(2, time_mock.sleep.call_count)
+
+    def test_wait_for_replay_timeout(self):
+        config.cfg.CONF.set_override('ovn_journal_enabled', True, group='ovn')
+        with mock.patch.object(db, 'has_pending_rows', return_value=True), \
+                mock.patch.object(journal, 'time') as time_mock:
+            time_mock.time.side_effect = [0, 0, 181]
+            self.assertRaises(RuntimeError, journal.wait_for_replay,
+                              ['router-id'])
+        self.assertEqual(1, time_mock.sleep.call_count)
+
+    def test_sync_pending_rows(self):
+        handler = mock.Mock()
+        journal.register_handler(ovn_const.JOURNAL_ROUTER,
+                                 ovn_const.JOURNAL_DELETE, handler)
+        row = _make_row(1, ovn_const.JOURNAL_ROUTER, 'router-id',
+                        ovn_const.JOURNAL_DELETE, router_id='router-id')
+        self.claim.side_effect = [[row], []]
+        self.thread.sync_pending_rows()
+        handler.assert_called_once_with(router_id='router-id')
+        self.delete_row.assert_called_once_with(mock.ANY, row)
+        self.update_row_state.assert_not_called()
+        self.reset_stale.assert_called_once_with(mock.ANY, 600)
+        self.touch_rows.assert_not_called()
+
+    def test_sync_pending_rows_slow_batch(self):
+        handler = mock.Mock()
+        journal.register_handler(ovn_const.JOURNAL_ROUTER,
+                                 ovn_const.JOURNAL_DELETE, handler)
+        rows = [_make_row(i, ovn_const.JOURNAL_ROUTER, 'router-%d' % i,
+                          ovn_const.JOURNAL_DELETE, router_id='router-%d' % i)
+                for i in range(3)]
+        self.claim.side_effect = [rows, []]
+        # The second row is replayed more than half the processing timeout
+        # after the batch was claimed.
+        with mock.patch.object(journal, 'time') as time_mock:
+            time_mock.time.side_effect = [0, 0, 301, 301, 301]
+            self.thread.sync_pending_rows()
+        self.touch_rows.assert_called_once_with(mock.ANY, rows[1:])
+        self.assertEqual(3, handler.call_count)
+
+    def test_sync_pending_rows_keeps_order_on_failure(self):
+        handler = mock.Mock(side_effect=[RuntimeError, None])
+        journal.register_handler(ovn_const.JOURNAL_PORT,
+                                 ovn_const.JOURNAL_CREATE, handler)
+        rows = [_make_row(i, ovn_const.JOURNAL_PORT, 'port-%d' % i,
+                          ovn_const.JOURNAL_CREATE,
+                          port={'id': 'port-%d' % i, 'network_id': net})
+                for i, net in enumerate(['net-1', 'net-1', 'net-2'])]
+        self.claim.return_value = rows
+        self.thread.sync_pending_rows()
+
+        # The second port is on the network of the failed first port, it
+        # is given back untouched and only the third port is replayed.
+        self.assertEqual(2, handler.call_count)
+        self.update_row_state.assert_has_calls([
+            mock.call(mock.ANY, rows[0], ovn_const.JOURNAL_PENDING, 1),
+            mock.call(mock.ANY, rows[1], ovn_const.JOURNAL_PENDING)])
+        self.delete_row.assert_called_once_with(mock.ANY, rows[2])
+        # Retries are left to the next pass.
+        self.claim.assert_called_once_with(mock.ANY, mock.ANY)
+
+    def test_sync_pending_rows_gives_up(self):
+        row = _make_row(1, ovn_const.JOURNAL_ROUTER, 'router-id',
+                        ovn_const.JOURNAL_DELETE, retry_count=2,
+                        router_id='router-id')
+        self.claim.side_effect = [[row], []]
+        # No handler is registered, the replay fails.
+        self.thread.sync_pending_rows()
+        self.update_row_state.assert_called_once_with(
+            mock.ANY, row, ovn_const.JOURNAL_FAILED, 3)
+        self.delete_row.assert_not_called()
+        self.assertEqual(2, self.claim.call_count)
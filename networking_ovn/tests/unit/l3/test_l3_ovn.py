@@ -22,6 +22,8 @@ from neutron.plugins.common import constants as service_constants
 from neutron.tests.unit.extensions import test_extraroute
 from neutron.tests.unit.extensions import test_l3
 
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.journal import journal
 from networking_ovn.tests.unit import fakes
 from networking_ovn.tests.unit.ml2 import test_mech_driver
 
@@ -88,6 +90,29 @@ class OVNL3RouterPlugin(test_mech_driver.OVNMechanismDriverTestCase):
         self.l3_plugin._ovn.set_lrouter_port_in_lswitch_port.\
             assert_called_once_with('router-port-id', 'lrp-router-port-id')
 
+    @mock.patch('neutron.db.l3_db.L3_NAT_dbonly_mixin.add_router_interface')
+    def test_add_router_interface_router_create_pending(self, func):
+        cfg.CONF.set_override('ovn_journal_enabled', True, group='ovn')
+        router_id = 'router-id'
+        interface_info = {'port_id': 'router-port-id'}
+        ovn = self.l3_plugin._ovn
+        manager = mock.Mock()
+        manager.attach_mock(ovn.add_lrouter_port, 'add_lrouter_port')
+        with mock.patch.object(journal.db, 'has_pending_rows',
+                               side_effect=[True, False]) as pending, \
+                mock.patch.object(journal.db_api, 'get_session'), \
+                mock.patch.object(journal, 'wake_up') as wake_up, \
+                mock.patch.object(journal.time, 'sleep') as sleep:
+            manager.attach_mock(sleep, 'sleep')
+            self.l3_plugin.add_router_interface(self.context, router_id,
+                                                interface_info)
+        # The router creation is replayed before its port is added.
+        pending.assert_called_with(mock.ANY, {'router-id', 'router-port-id'})
+        self.assertEqual(2, pending.call_count)
+        wake_up.assert_called_once_with()
+        self.assertEqual(['sleep', 'add_lrouter_port'],
+                         [call[0] for call in manager.mock_calls])
+
     @mock.patch('neutron.db.l3_db.L3_NAT_dbonly_mixin.add_router_interface')
     @mock.patch('neutron.db.db_base_plugin_v2.NeutronDbPluginV2.get_port')
     def test_add_router_interface_update_lrouter_port(self, getp, func):
@@ -177,6 +202,68 @@ class OVNL3RouterPlugin(test_mech_driver.OVNMechanismDriverTestCase):
             'neutron-router-id',
             external_ids={'neutron:router_name': 'test'})
 
+    @mock.patch('neutron.db.l3_db.L3_NAT_dbonly_mixin.update_router')
+    def test_update_router_name_change_journal_enabled(self, func):
+        cfg.CONF.set_override('ovn_journal_enabled', True, group='ovn')
+        router_id = 'router-id'
+        update_data = {'router': {'name': 'test'}}
+        with mock.patch.object(journal, 'record') as record:
+            self.l3_plugin.update_router(self.context, router_id,
+                                         update_data)
+        self.assertFalse(self.l3_plugin._ovn.update_lrouter.called)
+        record.assert_called_once_with(
+            self.context, ovn_const.JOURNAL_ROUTER, router_id,
+            ovn_const.JOURNAL_UPDATE, router_id=router_id,
+            original_router=self.fake_router, router=update_data)
+
+        # Replaying the journal row does the update.
+        self.l3_plugin.update_lrouter_in_ovn(router_id, self.fake_router,
+                                             update_data)
+        self.l3_plugin._ovn.update_lrouter.assert_called_once_with(
+            'neutron-router-id',
+            external_ids={'neutron:router_name': 'test'})
+
+    @mock.patch('neutron.db.extraroute_db.ExtraRoute_dbonly_mixin.'
+                'update_router')
+    def test_update_router_gateway_journal_enabled(self, update_router):
+        cfg.CONF.set_override('ovn_journal_enabled', True, group='ovn')
+        router_id = 'router-id'
+        gw_info = {'network_id': 'ext-net-id'}
+        update_data = {'router': {'name': 'test',
+                                  'external_gateway_info': gw_info}}
+        with mock.patch.object(journal, 'record') as record:
+            self.l3_plugin.update_router(self.context, router_id,
+                                         update_data)
+        # The gateway is updated on its own, outside of the transaction
+        # recording the router update.
+        update_router.assert_has_calls([
+            mock.call(self.context, router_id,
+                      {'router': {'external_gateway_info': gw_info}}),
+            mock.call(self.context, router_id, {'router': {'name': 'test'}})])
+        record.assert_called_once_with(
+            self.context, ovn_const.JOURNAL_ROUTER, router_id,
+            ovn_const.JOURNAL_UPDATE, router_id=router_id,
+            original_router=self.fake_router,
+            router={'router': {'name': 'test'}})
+
+    def test_record_router_create_and_delete(self):
+        router_db = mock.Mock(id='router-id', admin_state_up=True)
+        router_db.name = 'router'
+        with mock.patch.object(journal, 'record') as record:
+            self.l3_plugin._record_router_create(
+                'router', 'precommit_create', mock.ANY, context=self.context,
+                router_id='router-id', router_db=router_db)
+            self.l3_plugin._record_router_delete(
+                'router', 'precommit_delete', mock.ANY, context=self.context,
+                router_id='router-id')
+        record.assert_has_calls([
+            mock.call(self.context, ovn_const.JOURNAL_ROUTER, 'router-id',
+                      ovn_const.JOURNAL_CREATE,
+                      router={'id': 'router-id', 'name': 'router',
+                              'admin_state_up': True}),
+            mock.call(self.context, ovn_const.JOURNAL_ROUTER, 'router-id',
+                      ovn_const.JOURNAL_DELETE, router_id='router-id')])
+
     @mock.patch('neutron.db.l3_db.L3_NAT_dbonly_mixin.update_router')
     def test_update_router_static_route_no_change(self, func):
         router_id = 'router-id'
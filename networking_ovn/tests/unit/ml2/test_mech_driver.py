@@ -23,6 +23,7 @@ from neutron.callbacks import events
 from neutron.callbacks import registry
 from neutron.callbacks import resources
 from neutron.common import utils as n_utils
+from neutron import context as n_context
 from neutron.db import provisioning_blocks
 from neutron.extensions import portbindings
 from neutron import manager
@@ -36,6 +37,8 @@ from neutron.tests.unit.plugins.ml2 import test_plugin
 from networking_ovn.common import acl as ovn_acl
 from networking_ovn.common import constants as ovn_const
 from networking_ovn.common import utils as ovn_utils
+from networking_ovn.db import models as ovn_models
+from networking_ovn.ml2 import mech_driver
 from networking_ovn.tests.unit import fakes
 
 
@@ -425,6 +428,29 @@ class TestOVNMechanismDriver(test_plugin.Ml2PluginV2TestCase):
                           self.mech_driver.update_network_precommit,
                           fake_network_context)
 
+    def test_create_port_journal_enabled(self):
+        config.cfg.CONF.set_override('ovn_journal_enabled', True,
+                                     group='ovn')
+        with self.network() as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.port(subnet=subnet1) as port1:
+                    self.nb_ovn.create_lswitch.assert_not_called()
+                    self.nb_ovn.create_lswitch_port.assert_not_called()
+                    session = n_context.get_admin_context().session
+                    rows = session.query(ovn_models.OVNJournal).order_by(
+                        ovn_models.OVNJournal.seqnum).all()
+                    self.assertEqual(
+                        [(ovn_const.JOURNAL_NETWORK,
+                          net1['network']['id']),
+                         (ovn_const.JOURNAL_SUBNET,
+                          subnet1['subnet']['id']),
+                         (ovn_const.JOURNAL_PORT, port1['port']['id'])],
+                        [(row.object_type, row.object_uuid)
+                         for row in rows])
+                    self.assertEqual(
+                        set([ovn_const.JOURNAL_CREATE]),
+                        set(row.operation for row in rows))
+
     def test_create_port_without_security_groups(self):
         kwargs = {'security_groups': []}
         with self.network(set_context=True, tenant_id='test') as net1:
@@ -460,6 +486,104 @@ class TestOVNMechanismDriver(test_plugin.Ml2PluginV2TestCase):
                                      group='ovn')
         self._test_create_port_with_security_groups_helper(8)
 
+    def test_create_ports_in_ovn(self):
+        config.cfg.CONF.set_override('nb_bulk_transaction_size', 2,
+                                     group='ovn')
+        with self.network(set_context=True, tenant_id='test') as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.port(subnet=subnet1,
+                               set_context=True, tenant_id='test') as p1, \
+                        self.port(subnet=subnet1,
+                                  set_context=True, tenant_id='test') as p2, \
+                        self.port(subnet=subnet1,
+                                  set_context=True, tenant_id='test') as p3:
+                    ports = [p1['port'], p2['port'], p3['port']]
+                    self.nb_ovn.create_lswitch_port.reset_mock()
+                    self.nb_ovn.add_acl.reset_mock()
+                    self.nb_ovn.update_address_set.reset_mock()
+                    self.nb_ovn.get_subnets_dhcp_options.reset_mock()
+                    with mock.patch.object(self.nb_ovn, 'transaction',
+                                           return_value=mock.MagicMock()) as t:
+                        self.mech_driver.create_ports_in_ovn(ports)
+                        self.assertEqual(2, t.call_count)
+                    self.assertEqual(
+                        3, self.nb_ovn.create_lswitch_port.call_count)
+                    self.assertEqual(18, self.nb_ovn.add_acl.call_count)
+                    # One address set update per transaction, since all
+                    # the ports are in the same security group.
+                    self.assertEqual(
+                        2, self.nb_ovn.update_address_set.call_count)
+                    # The DHCP_Options table is scanned once for the batch.
+                    self.assertEqual(
+                        1, self.nb_ovn.get_subnets_dhcp_options.call_count)
+
+    def test_create_ports_in_ovn_batch_failure(self):
+        config.cfg.CONF.set_override('nb_bulk_transaction_size', 2,
+                                     group='ovn')
+        ports = [{'id': 'port%d' % i} for i in range(3)]
+        failing = set(['port0'])
+
+        def _create_batch(batch, *args):
+            if len(batch) > 1 or batch[0][0]['id'] in failing:
+                raise RuntimeError()
+
+        with mock.patch.object(self.mech_driver, 'get_ovn_port_options'), \
+                mock.patch.object(self.mech_driver,
+                                  '_create_ports_batch_in_ovn',
+                                  side_effect=_create_batch) as create:
+            created = self.mech_driver.create_ports_in_ovn(ports)
+        # The first batch failed and its ports were retried one at a time,
+        # port0 still failing on its own.
+        self.assertEqual([ports[1], ports[2]], created)
+        self.assertEqual(4, create.call_count)
+
+    def test_create_ports_in_ovn_invalid_options(self):
+        ports = [{'id': 'port%d' % i} for i in range(3)]
+
+        def _get_options(port, **kwargs):
+            if port['id'] == 'port1':
+                raise n_exc.InvalidInput(error_message='invalid')
+            return mock.sentinel.options
+
+        with mock.patch.object(self.mech_driver, 'get_ovn_port_options',
+                               side_effect=_get_options), \
+                mock.patch.object(self.mech_driver,
+                                  '_create_ports_batch_in_ovn') as create:
+            created = self.mech_driver.create_ports_in_ovn(ports)
+        # Only port1 is skipped, the others are created in one batch.
+        self.assertEqual([ports[0], ports[2]], created)
+        create.assert_called_once_with(
+            [(ports[0], mock.sentinel.options),
+             (ports[2], mock.sentinel.options)],
+            mock.ANY, mock.ANY, mock.ANY)
+
+    def test_update_ports_qos_options(self):
+        config.cfg.CONF.set_override('nb_bulk_transaction_size', 2,
+                                     group='ovn')
+        qos_options = {'policing_rate': '10', 'policing_burst': '100'}
+        ports = [{'id': 'port%d' % i} for i in range(5)]
+        ports[1][ovn_const.OVN_PORT_BINDING_PROFILE] = {
+            'vtep-physical-switch': 'psw1', 'vtep-logical-switch': 'lsw1'}
+        lsps = {'port2': {'options': {'policing_rate': '10',
+                                      'policing_burst': '100'}},
+                'port3': {'options': {}}}
+        self.nb_ovn.get_lswitch_ports.return_value = lsps
+        with mock.patch.object(self.nb_ovn, 'transaction',
+                               return_value=mock.MagicMock()) as txn:
+            self.mech_driver.update_ports_qos_options(ports, qos_options)
+            # port1 is a vtep port and port2 already has the options, the
+            # three other ports are updated in two transactions.
+            self.assertEqual(2, txn.call_count)
+        self.nb_ovn.set_lswitch_port.assert_has_calls([
+            mock.call(lport_name=lport_name, if_exists=True,
+                      options=qos_options)
+            for lport_name in ('port0', 'port3', 'port4')])
+        self.assertEqual(3, self.nb_ovn.set_lswitch_port.call_count)
+        # The Logical_Switch_Ports are looked up once for all the ports.
+        self.nb_ovn.get_lswitch_ports.assert_called_once_with(
+            [port['id'] for port in ports])
+        self.nb_ovn.get_lswitch_port.assert_not_called()
+
     def test_update_port_changed_security_groups(self):
         with self.network(set_context=True, tenant_id='test') as net1:
             with self.subnet(network=net1) as subnet1:
@@ -522,6 +646,39 @@ class TestOVNMechanismDriver(test_plugin.Ml2PluginV2TestCase):
                     self.assertEqual(
                         1, self.nb_ovn.update_address_set.call_count)
 
+    def test_update_port_no_ovn_relevant_changes(self):
+        with self.network(set_context=True, tenant_id='test') as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.port(subnet=subnet1,
+                               set_context=True, tenant_id='test') as port1:
+                    self.nb_ovn.set_lswitch_port.reset_mock()
+                    self.nb_ovn.update_acls.reset_mock()
+                    self.nb_ovn.update_address_set.reset_mock()
+                    data = {'port': {'description': 'rtheis'}}
+                    self._update('ports', port1['port']['id'], data)
+                    self.nb_ovn.set_lswitch_port.assert_not_called()
+                    self.nb_ovn.update_acls.assert_not_called()
+                    self.nb_ovn.update_address_set.assert_not_called()
+
+    def test_update_port_only_changed_columns(self):
+        with self.network(set_context=True, tenant_id='test') as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.port(subnet=subnet1,
+                               set_context=True, tenant_id='test') as port1:
+                    # Fake the IDL row from the port creation.
+                    lsp = dict(
+                        self.nb_ovn.create_lswitch_port.call_args[1])
+                    lsp.pop('lswitch_name')
+                    lport_name = lsp.pop('lport_name')
+                    self.nb_ovn.get_lswitch_port.return_value = lsp
+                    self.nb_ovn.set_lswitch_port.reset_mock()
+                    data = {'port': {'name': 'rtheis'}}
+                    self._update('ports', port1['port']['id'], data)
+                    self.nb_ovn.set_lswitch_port.assert_called_once_with(
+                        lport_name=lport_name,
+                        external_ids={ovn_const.OVN_PORT_NAME_EXT_ID_KEY:
+                                      'rtheis'})
+
     def test_delete_port_without_security_groups(self):
         kwargs = {'security_groups': []}
         with self.network(set_context=True, tenant_id='test') as net1:
@@ -609,6 +766,139 @@ class TestOVNMechanismDriver(test_plugin.Ml2PluginV2TestCase):
                     provisioning_blocks.L2_AGENT_ENTITY
                 )
 
+    def test_sync_port_statuses(self):
+        ports = [{'id': 'port-1', 'status': const.PORT_STATUS_DOWN},
+                 {'id': 'port-2', 'status': const.PORT_STATUS_ACTIVE},
+                 {'id': 'port-3', 'status': const.PORT_STATUS_ACTIVE},
+                 {'id': 'port-4', 'status': const.PORT_STATUS_DOWN},
+                 {'id': 'port-5', 'status': const.PORT_STATUS_ACTIVE}]
+        lsp_states = {'port-1': True, 'port-2': True, 'port-3': False,
+                      'port-4': False, 'lrp-foo': True}
+        with mock.patch.object(self.mech_driver._plugin, 'get_ports',
+                               return_value=ports) as get_ports, \
+            mock.patch.object(self.mech_driver._plugin,
+                              'update_port_status') as ups, \
+            mock.patch('neutron.db.provisioning_blocks.'
+                       'provisioning_complete') as pc, \
+            mock.patch('neutron.db.provisioning_blocks.'
+                       'add_provisioning_component') as apc:
+            self.mech_driver.sync_port_statuses(lsp_states)
+
+            get_ports.assert_called_once_with(mock.ANY,
+                                              fields=['id', 'status'])
+            pc.assert_called_once_with(mock.ANY, 'port-1', resources.PORT,
+                                       provisioning_blocks.L2_AGENT_ENTITY)
+            apc.assert_called_once_with(mock.ANY, 'port-3', resources.PORT,
+                                        provisioning_blocks.L2_AGENT_ENTITY)
+            ups.assert_called_once_with(mock.ANY, 'port-3',
+                                        const.PORT_STATUS_DOWN)
+
+    def _teardown_network(self, ports, subnets):
+        with mock.patch.object(self.mech_driver._plugin, 'get_ports',
+                               return_value=ports), \
+            mock.patch.object(self.mech_driver._plugin, 'get_subnets',
+                              return_value=subnets), \
+            mock.patch('networking_ovn.ml2.mech_driver.greenthread.'
+                       'spawn_after') as spawn_after:
+            self.mech_driver._teardown_network(
+                resources.NETWORK, events.BEFORE_DELETE, mock.Mock(),
+                context=mock.Mock(), network_id='net-1')
+        return spawn_after
+
+    def test__teardown_network(self):
+        port = {'id': 'port-1', 'network_id': 'net-1',
+                'device_owner': const.DEVICE_OWNER_DHCP,
+                'security_groups': ['sg-1'],
+                'fixed_ips': [{'subnet_id': 'subnet-1',
+                               'ip_address': '10.0.0.2'}]}
+        subnet = {'id': 'subnet-1', 'network_id': 'net-1'}
+        self.nb_ovn.get_all_dhcp_options.return_value = {
+            'subnets': {
+                'subnet-1': {'uuid': 'uuid-1',
+                             'external_ids': {'subnet_id': 'subnet-1'}},
+                'subnet-2': {'uuid': 'uuid-2',
+                             'external_ids': {'subnet_id': 'subnet-2'}}},
+            'ports_v4': {
+                'port-1': {'uuid': 'uuid-3',
+                           'external_ids': {'subnet_id': 'subnet-1',
+                                            'port_id': 'port-1'}}},
+            'ports_v6': {}}
+        self._teardown_network([port], [{'id': 'subnet-1'}])
+
+        # Nothing is deleted until the network deletion is committed.
+        self.mech_driver._delete_port(port)
+        self.mech_driver._delete_subnet(subnet)
+        self.nb_ovn.delete_lswitch_port.assert_not_called()
+        self.nb_ovn.update_address_set.assert_not_called()
+        self.nb_ovn.delete_dhcp_options.assert_not_called()
+        self.nb_ovn.delete_lswitch.assert_not_called()
+
+        self.mech_driver._delete_network({'id': 'net-1'})
+        self.nb_ovn.update_address_set.assert_called_once_with(
+            name=ovn_utils.ovn_addrset_name('sg-1', 'ip4'), addrs_add=None,
+            addrs_remove=['10.0.0.2'])
+        self.assertEqual(2, self.nb_ovn.delete_dhcp_options.call_count)
+        self.nb_ovn.delete_dhcp_options.assert_has_calls(
+            [mock.call('uuid-1'), mock.call('uuid-3')], any_order=True)
+        self.nb_ovn.delete_lswitch.assert_called_once_with(
+            ovn_utils.ovn_name('net-1'), if_exists=True)
+        self.nb_ovn.delete_lswitch_port.assert_not_called()
+        self.assertEqual({}, self.mech_driver._torn_down_networks)
+
+    def test__teardown_network_failed(self):
+        port = {'id': 'port-1', 'network_id': 'net-1',
+                'device_owner': const.DEVICE_OWNER_DHCP, 'fixed_ips': []}
+        self._teardown_network([port], [])
+        self.mech_driver._delete_port(port)
+        self.nb_ovn.delete_lswitch_port.assert_not_called()
+
+        # A port created meanwhile makes the deletion of the network fail,
+        # the deferred deletes are run.
+        with mock.patch.object(self.mech_driver, 'create_port_in_ovn'):
+            self.mech_driver._create_port(
+                {'id': 'port-2', 'network_id': 'net-1'})
+        self.nb_ovn.delete_lswitch_port.assert_called_once_with(
+            'port-1', ovn_utils.ovn_name('net-1'))
+        self.nb_ovn.delete_lswitch.assert_not_called()
+        self.assertEqual({}, self.mech_driver._torn_down_networks)
+
+    def test__teardown_network_expired(self):
+        port = {'id': 'port-1', 'network_id': 'net-1',
+                'device_owner': const.DEVICE_OWNER_DHCP, 'fixed_ips': []}
+        spawn_after = self._teardown_network([port], [])
+        self.mech_driver._delete_port(port)
+        spawn_after.assert_called_once_with(
+            mech_driver.TEARDOWN_TIMEOUT, self.mech_driver._expire_teardown,
+            'net-1', self.mech_driver._torn_down_networks['net-1'])
+
+        # The network deletion didn't complete before the timeout, the
+        # deferred deletes are run.
+        self.mech_driver._expire_teardown(*spawn_after.call_args[0][2:])
+        self.nb_ovn.delete_lswitch_port.assert_called_once_with(
+            'port-1', ovn_utils.ovn_name('net-1'))
+        self.assertEqual({}, self.mech_driver._torn_down_networks)
+
+    def test__teardown_network_expired_completed(self):
+        port = {'id': 'port-1', 'network_id': 'net-1',
+                'device_owner': const.DEVICE_OWNER_DHCP, 'fixed_ips': []}
+        spawn_after = self._teardown_network([port], [])
+        self.mech_driver._delete_port(port)
+        self.mech_driver._delete_network({'id': 'net-1'})
+        # The network is torn down again meanwhile.
+        self._teardown_network([port], [])
+
+        # The timer of the first teardown leaves the second one alone.
+        self.mech_driver._expire_teardown(*spawn_after.call_args[0][2:])
+        self.nb_ovn.delete_lswitch_port.assert_not_called()
+        self.assertIn('net-1', self.mech_driver._torn_down_networks)
+
+    def test__teardown_network_in_use(self):
+        ports = [{'id': 'port-1', 'network_id': 'net-1',
+                  'device_owner': 'compute:nova'}]
+        self._teardown_network(ports, [])
+        self.nb_ovn.delete_lswitch.assert_not_called()
+        self.assertEqual({}, self.mech_driver._torn_down_networks)
+
     def test_bind_port_unsupported_vnic_type(self):
         fake_port = fakes.FakePort.create_one_port(
             attrs={'binding:vnic_type': 'unknown'}).info()
@@ -1055,14 +1345,16 @@ class TestOVNMechansimDriverDHCPOptions(OVNMechanismDriverTestCase):
                 'external_ids': {'subnet_id': 'foo-subnet'},
                 'options': {'server_id': '01:02:03:04:05:06'}}))
 
-        self.mech_driver._nb_ovn.get_port_dhcp_options.return_value = 'foo-val'
-        dhcp_options = self.mech_driver.get_port_dhcp_options(
-            port, ip_version)
-        self.assertEqual('foo-val', dhcp_options)
+        self.mech_driver._nb_ovn.add_dhcp_options.return_value = 'foo-cmd'
+        with mock.patch.object(self.mech_driver._nb_ovn,
+                               'transaction') as mock_txn:
+            dhcp_options = self.mech_driver.get_port_dhcp_options(
+                port, ip_version)
 
         # Since the port has extra DHCP options defined, a new DHCP_Options
         # row should be created and logical switch port DHCPv4/DHCPv6 options
-        # should point to this.
+        # should point to this. The row is written by the returned command
+        # as part of the logical switch port transaction.
         if ip_version == 4:
             expected_dhcp_options = {
                 'cidr': '10.0.0.0/24',
@@ -1080,6 +1372,12 @@ class TestOVNMechansimDriverDHCPOptions(OVNMechanismDriverTestCase):
 
         self.mech_driver._nb_ovn.add_dhcp_options.assert_called_once_with(
             'foo-subnet', port_id='foo-port', **expected_dhcp_options)
+        mock_txn.assert_not_called()
+        expected_dhcp_options['cmd'] = 'foo-cmd'
+        self.assertEqual(expected_dhcp_options, dhcp_options)
+        self.assertEqual(
+            ['foo-cmd'],
+            self.mech_driver.get_lsp_dhcp_options_column(dhcp_options))
 
     def test__get_port_dhcp_options_port_dhcp_opts_set_v4(self):
         self._test__get_port_dhcp_options_port_dhcp_opts_set(ip_version=4)
@@ -11,6 +11,7 @@
 #    under the License.
 
 import mock
+from oslo_config import cfg
 from oslo_utils import uuidutils
 
 from neutron.objects.qos import policy as qos_policy
@@ -44,7 +45,8 @@ class TestOVNQosNotificationDriver(base.BaseTestCase):
 
     def test_delete_policy(self):
         self.driver.delete_policy(context, self.policy)
-        self.qos_driver.delete_policy.assert_not_called()
+        self.qos_driver.delete_policy.assert_called_once_with(context,
+                                                              self.policy)
 
 
 class TestOVNQosDriver(base.BaseTestCase):
@@ -115,6 +117,85 @@ class TestOVNQosDriver(base.BaseTestCase):
     def test__generate_port_options_with_rule(self):
         self._generate_port_options(self.policy_id, [self.rule], self.expected)
 
+    def test__generate_port_options_cached(self):
+        cfg.CONF.set_override('qos_cache_ttl', 30, group='ovn')
+        with mock.patch.object(qos_rule, 'get_rules',
+                               return_value=[self.rule]) as get_rules:
+            options = self.driver._generate_port_options(context,
+                                                         self.policy_id)
+            options['foo'] = 'bar'
+            self.assertEqual(self.expected,
+                             self.driver._generate_port_options(
+                                 context, self.policy_id))
+            get_rules.assert_called_once_with(context, self.policy_id)
+
+            # Updating or deleting the policy invalidates the cache.
+            policy = mock.Mock(id=self.policy_id)
+            policy.get_bound_networks.return_value = []
+            policy.get_bound_ports.return_value = []
+            self.driver.update_policy(context, policy)
+            self.assertEqual(2, get_rules.call_count)
+            self.driver.delete_policy(context, policy)
+            self.driver._generate_port_options(context, self.policy_id)
+            self.assertEqual(3, get_rules.call_count)
+
+    def test__generate_port_options_cache_disabled(self):
+        cfg.CONF.set_override('qos_cache_ttl', 0, group='ovn')
+        with mock.patch.object(qos_rule, 'get_rules',
+                               return_value=[self.rule]) as get_rules:
+            self.driver._generate_port_options(context, self.policy_id)
+            self.driver._generate_port_options(context, self.policy_id)
+            self.assertEqual(2, get_rules.call_count)
+
+    def test_expiring_cache_purge(self):
+        cfg.CONF.set_override('qos_cache_ttl', 30, group='ovn')
+        cache = qos_driver._ExpiringCache()
+        with mock.patch.object(qos_driver.time, 'time', return_value=100):
+            cache.set('policy-1', {})
+            cache.set('policy-2', {})
+        with mock.patch.object(qos_driver.time, 'time', return_value=200):
+            # The expired entries are dropped when accessed, and all of
+            # them when another entry is cached.
+            self.assertIs(qos_driver._ExpiringCache._MISSING,
+                          cache.get('policy-1'))
+            self.assertEqual(['policy-2'], list(cache._entries))
+            cache.set('policy-3', {})
+            self.assertEqual(['policy-3'], list(cache._entries))
+
+    def test_expiring_cache_pop_values(self):
+        cfg.CONF.set_override('qos_cache_ttl', 30, group='ovn')
+        cache = qos_driver._ExpiringCache(index_values=True)
+        cache.set('net-1', 'policy-1')
+        cache.set('net-2', 'policy-1')
+        cache.set('net-3', 'policy-2')
+        # net-2 moves to another policy.
+        cache.set('net-2', 'policy-2')
+        cache.pop_values('policy-2')
+        self.assertEqual(['net-1'], list(cache._entries))
+        self.assertEqual({'policy-1': {'net-1'}}, cache._keys_by_value)
+
+    def test__get_network_policy_id_cached(self):
+        cfg.CONF.set_override('qos_cache_ttl', 30, group='ovn')
+        with mock.patch.object(qos_policy.QosPolicy, 'get_network_policy',
+                               return_value=self.policy) as get_policy:
+            for _ in range(2):
+                self.assertEqual(
+                    self.network_policy_id,
+                    self.driver._get_network_policy_id(context,
+                                                       self.network_id))
+            get_policy.assert_called_once_with(context, self.network_id)
+
+            # Updating the network invalidates the cache.
+            network = self._create_fake_network()
+            self.driver.update_network(network, network)
+            self.driver._get_network_policy_id(context, self.network_id)
+            self.assertEqual(2, get_policy.call_count)
+
+            # And so does deleting its policy.
+            self.driver.delete_policy(context, self.policy)
+            self.driver._get_network_policy_id(context, self.network_id)
+            self.assertEqual(3, get_policy.call_count)
+
     def _get_qos_options(self, port, port_policy, network_policy):
         with mock.patch.object(qos_policy.QosPolicy, 'get_network_policy',
                                return_value=self.policy) as get_network_policy:
@@ -156,19 +237,44 @@ class TestOVNQosDriver(base.BaseTestCase):
         port['qos_policy_id'] = None
         self._get_qos_options(port, False, True)
 
+    @mock.patch('neutron.context.get_admin_context', return_value=context)
+    def test_get_ports_qos_options(self, *mocks):
+        ports = [self._create_fake_port() for _ in range(4)]
+        for i, port in enumerate(ports):
+            port['id'] = 'port%d' % i
+        ports[1]['qos_policy_id'] = None
+        ports[2]['qos_policy_id'] = None
+        ports[3]['device_owner'] = 'network:dhcp'
+        options = {'policing_rate': '10'}
+        with mock.patch.object(qos_policy.QosPolicy, 'get_network_policy',
+                               return_value=self.policy) as get_network_policy:
+            with mock.patch.object(self.driver, '_generate_port_options',
+                                   return_value=options) as generate:
+                ports_options = self.driver.get_ports_qos_options(ports)
+        self.assertEqual({'port0': options, 'port1': options,
+                          'port2': options, 'port3': {}}, ports_options)
+        # The ports don't share the options dict.
+        self.assertIsNot(ports_options['port0'], ports_options['port1'])
+        # The policy of the network and the options of each policy are
+        # looked up once.
+        get_network_policy.assert_called_once_with(context, self.network_id)
+        generate.assert_has_calls(
+            [mock.call(context, self.policy_id),
+             mock.call(context, self.network_policy_id)])
+        self.assertEqual(2, generate.call_count)
+
     def _update_network_ports(self, port, called):
         with mock.patch.object(self.plugin, 'get_ports',
                                return_value=[port]) as get_ports:
             with mock.patch.object(self.mech_driver,
-                                   'update_port') as update_port:
+                                   'update_ports_qos_options'
+                                   ) as update_ports_qos_options:
                 self.driver._update_network_ports(
                     context, self.network_id, {})
                 get_ports.assert_called_once_with(
                     context, filters={'network_id': [self.network_id]})
-                if called:
-                    update_port.assert_called()
-                else:
-                    update_port.assert_not_called()
+                update_ports_qos_options.assert_called_once_with(
+                    [port] if called else [], {})
 
     def test__update_network_ports_port_policy(self):
         self._update_network_ports(self.port, False)
@@ -220,28 +326,33 @@ class TestOVNQosDriver(base.BaseTestCase):
         self._update_network(network, original_network, True)
 
     def test_update_policy(self):
+        network_port = self._create_fake_port()
+        network_port['qos_policy_id'] = None
         with mock.patch.object(self.driver, '_generate_port_options',
                                return_value={}) as generate_port_options, \
             mock.patch.object(self.policy, 'get_bound_networks',
                               return_value=[self.network_id]
                               ) as get_bound_networks, \
-            mock.patch.object(self.driver, '_update_network_ports'
-                              ) as update_network_ports, \
+            mock.patch.object(self.driver, '_get_network_ports',
+                              return_value=[network_port]
+                              ) as get_network_ports, \
             mock.patch.object(self.policy, 'get_bound_ports',
                               return_value=[self.port_id]
                               ) as get_bound_ports, \
-            mock.patch.object(self.plugin, 'get_port',
-                              return_value=self.port) as get_port, \
-            mock.patch.object(self.mech_driver, 'update_port',
-                              ) as update_port:
+            mock.patch.object(self.plugin, 'get_ports',
+                              return_value=[self.port]) as get_ports, \
+            mock.patch.object(self.mech_driver, 'update_ports_qos_options',
+                              ) as update_ports_qos_options:
 
             self.driver.update_policy(context, self.policy)
 
             generate_port_options.assert_called_once_with(
                 context, self.network_policy_id)
             get_bound_networks.assert_called_once()
-            update_network_ports.assert_called_once_with(
-                context, self.network_id, {})
+            get_network_ports.assert_called_once_with(
+                context, self.network_id)
             get_bound_ports.assert_called_once()
-            get_port.assert_called_once_with(context, self.port_id)
-            update_port.assert_called_once_with(self.port, self.port, {})
+            get_ports.assert_called_once_with(
+                context, filters={'id': [self.port_id]})
+            update_ports_qos_options.assert_called_once_with(
+                [network_port, self.port], {})
@@ -0,0 +1,157 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import uuid
+
+import mock
+from ovs.db import schema
+
+from networking_ovn.ovsdb import bulk_writer
+from networking_ovn.tests import base
+
+SCHEMA = {
+    'name': 'OVN_Northbound',
+    'version': '5.4.0',
+    'tables': {
+        'Logical_Switch': {
+            'columns': {
+                'name': {'type': 'string'},
+                'acls': {'type': {'key': {'type': 'uuid',
+                                          'refTable': 'ACL',
+                                          'refType': 'strong'},
+                                  'min': 0, 'max': 'unlimited'}},
+                'external_ids': {'type': {'key': 'string',
+                                          'value': 'string',
+                                          'min': 0, 'max': 'unlimited'}}},
+            'isRoot': True},
+        'ACL': {
+            'columns': {
+                'priority': {'type': {'key': {'type': 'integer',
+                                              'minInteger': 0,
+                                              'maxInteger': 32767}}},
+                'match': {'type': 'string'},
+                'log': {'type': 'boolean'},
+                'external_ids': {'type': {'key': 'string',
+                                          'value': 'string',
+                                          'min': 0, 'max': 'unlimited'}}},
+            'isRoot': False}}}
+
+
+class TestOvsdbBulkWriter(base.TestCase):
+
+    def setUp(self):
+        super(TestOvsdbBulkWriter, self).setUp()
+        tables = schema.DbSchema.from_json(SCHEMA).tables
+        self.writer = bulk_writer.OvsdbBulkWriter(
+            'tcp:127.0.0.1:6641', 'OVN_Northbound', tables, 3, 'test', 10)
+        self._transact = self.writer._transact
+        self.transact = mock.patch.object(self.writer, '_transact').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_insert_and_mutate(self):
+        acl = self.writer.insert('ACL', {'priority': 1002, 'match': 'ip',
+                                         'external_ids': {'a': 'b'}})
+        self.writer.mutate('Logical_Switch', [('name', '==', 'ls-1')],
+                           [('acls', 'insert', [acl])])
+        self.assertEqual([
+            {'op': 'insert', 'table': 'ACL', 'uuid-name': 'row0',
+             'row': {'priority': 1002, 'match': 'ip',
+                     'external_ids': ['map', [['a', 'b']]]}},
+            {'op': 'mutate', 'table': 'Logical_Switch',
+             'where': [['name', '==', 'ls-1']],
+             'mutations': [['acls', 'insert',
+                            ['named-uuid', 'row0']]]}], self.writer._ops)
+
+    def test_delete(self):
+        self.writer.delete('Logical_Switch', [('name', '==', 'ls-1')])
+        self.assertEqual([{'op': 'delete', 'table': 'Logical_Switch',
+                           'where': [['name', '==', 'ls-1']]}],
+                         self.writer._ops)
+
+    def test_invalid(self):
+        self.assertRaises(RuntimeError, self.writer.insert, 'ACL',
+                          {'unknown': 'x'})
+        self.assertRaises(RuntimeError, self.writer.insert, 'Unknown', {})
+        self.assertRaises(RuntimeError, self.writer.insert, 'ACL',
+                          {'priority': 'high'})
+        self.assertRaises(RuntimeError, self.writer.insert, 'ACL',
+                          {'priority': 40000})
+
+    def test_checkpoint(self):
+        row_uuid = uuid.uuid4()
+        self.transact.return_value = [{'uuid': ['uuid', str(row_uuid)]},
+                                      {'count': 1}, {'count': 1}]
+        acl = self.writer.insert('ACL', {'priority': 1002})
+        self.writer.mutate('Logical_Switch', [('name', '==', 'ls-1')],
+                           [('acls', 'insert', [acl])])
+        self.writer.checkpoint()
+        self.transact.assert_not_called()
+        self.writer.delete('Logical_Switch', [('name', '==', 'ls-2')])
+        self.writer.checkpoint()
+        self.assertEqual(1, self.transact.call_count)
+        self.assertEqual(row_uuid, acl.uuid)
+        self.assertEqual(3, self.writer.num_ops)
+
+        # The references to committed rows use their uuid.
+        self.writer.mutate('Logical_Switch', [('name', '==', 'ls-3')],
+                           [('acls', 'insert', [acl])])
+        self.assertEqual([['acls', 'insert', ['uuid', str(row_uuid)]]],
+                         self.writer._ops[0]['mutations'])
+
+    def test_mutate_no_row(self):
+        self.transact.return_value = [{'count': 1}, {'count': 0}]
+        self.writer.mutate('Logical_Switch', [('name', '==', 'ls-1')],
+                           [('external_ids', 'delete', ['a'])])
+        self.writer.mutate('Logical_Switch', [('name', '==', 'ls-2')],
+                           [('external_ids', 'delete', ['a'])])
+        with mock.patch.object(bulk_writer.LOG, 'warning') as warning:
+            self.writer.flush()
+        warning.assert_called_once_with(
+            mock.ANY, {'desc': 'test', 'table': 'Logical_Switch',
+                       'where': [('name', '==', 'ls-2')]})
+
+    @mock.patch.object(bulk_writer.ovs_poller, 'Poller')
+    @mock.patch.object(bulk_writer, 'time')
+    def test_connect_timeout(self, time_mock, poller):
+        time_mock.time.side_effect = [0, 5, 11]
+        strm = mock.Mock()
+        strm.connect.return_value = errno.EAGAIN
+        with mock.patch.object(bulk_writer.stream.Stream, 'open',
+                               return_value=(0, strm)):
+            self.assertRaises(RuntimeError, self._transact, [])
+        poller.return_value.timer_wait.assert_called_once_with(5000)
+        self.assertEqual(1, poller.return_value.block.call_count)
+        strm.close.assert_called_once_with()
+        self.assertIsNone(self.writer._conn)
+
+    @mock.patch.object(bulk_writer.ovs_poller, 'Poller')
+    @mock.patch.object(bulk_writer, 'time')
+    def test_transact_timeout(self, time_mock, poller):
+        time_mock.time.side_effect = [0, 5, 11]
+        conn = mock.Mock()
+        conn.send.return_value = 0
+        conn.recv.return_value = (errno.EAGAIN, None)
+        self.writer._conn = conn
+        self.assertRaises(RuntimeError, self._transact, [])
+        self.assertEqual(2, conn.recv.call_count)
+        conn.close.assert_called_once_with()
+        self.assertIsNone(self.writer._conn)
+
+    def test_exit_failure(self):
+        self.writer.insert('ACL', {'priority': 1002})
+
+        def _test():
+            with self.writer:
+                raise RuntimeError()
+        self.assertRaises(RuntimeError, _test)
+        self.transact.assert_not_called()
@@ -12,6 +12,8 @@
 #    under the License.
 #
 
+import collections
+
 import mock
 
 from neutron.agent.ovsdb.native import idlutils
@@ -224,6 +226,18 @@ class TestDelLSwitchCommand(TestBaseCommand):
             cmd.run_idl(self.transaction)
             fake_lswitch.delete.assert_called_once_with()
 
+    def test_lswitch_del_drops_ports_stats(self):
+        with mock.patch.object(commands, '_LSWITCH_PORTS_ATTEMPTS',
+                               collections.Counter({'ls-1': 2, 'ls-2': 1})), \
+                mock.patch.object(commands, '_LSWITCH_PORTS_COMMITS',
+                                  collections.Counter({'ls-1': 1,
+                                                       'ls-2': 1})):
+            cmd = commands.DelLSwitchCommand(self.ovn_api, 'ls-1',
+                                             if_exists=True)
+            cmd.post_commit(self.transaction)
+            self.assertEqual(['ls-2'],
+                             list(commands.get_lswitch_ports_stats()))
+
 
 class TestLSwitchSetExternalIdCommand(TestBaseCommand):
 
@@ -320,6 +334,37 @@ class TestAddLSwitchPortCommand(TestBaseCommand):
     def test_lswitch_port_add_may_exist(self):
         self._test_lswitch_port_add(may_exist=True)
 
+    def test_lswitch_port_add_with_dhcp_options_command(self):
+        fake_lswitch = fakes.FakeOvsdbRow.create_one_ovsdb_row()
+        fake_lsp = fakes.FakeOvsdbRow.create_one_ovsdb_row()
+        fake_dhcp_options = fakes.FakeOvsdbRow.create_one_ovsdb_row()
+        self.transaction.insert.side_effect = [fake_dhcp_options, fake_lsp]
+        dhcp_cmd = commands.AddDHCPOptionsCommand(
+            self.ovn_api, 'fake-subnet-id', port_id='fake-lsp',
+            may_exists=False, external_ids={})
+        with mock.patch.object(idlutils, 'row_by_value',
+                               side_effect=[fake_lswitch, None]):
+            cmd = commands.AddLSwitchPortCommand(
+                self.ovn_api, 'fake-lsp', fake_lswitch.name, may_exist=True,
+                dhcpv4_options=[dhcp_cmd], dhcpv6_options=['fake-uuid'])
+            cmd.run_idl(self.transaction)
+        self.assertEqual([fake_dhcp_options.uuid], fake_lsp.dhcpv4_options)
+        self.assertEqual(['fake-uuid'], fake_lsp.dhcpv6_options)
+        # The command itself still references the DHCP_Options command so
+        # that it can be rerun if the transaction is retried.
+        self.assertEqual([dhcp_cmd], cmd.columns['dhcpv4_options'])
+
+    def test_lswitch_port_exists_skips_dhcp_options_command(self):
+        dhcp_cmd = mock.Mock(spec=commands.AddDHCPOptionsCommand)
+        with mock.patch.object(idlutils, 'row_by_value',
+                               return_value=mock.ANY):
+            cmd = commands.AddLSwitchPortCommand(
+                self.ovn_api, 'fake-lsp', 'fake-lswitch', may_exist=True,
+                dhcpv4_options=[dhcp_cmd])
+            cmd.run_idl(self.transaction)
+        dhcp_cmd.run_idl.assert_not_called()
+        self.transaction.insert.assert_not_called()
+
     def test_lswitch_port_add_ignore_exists(self):
         self._test_lswitch_port_add(may_exist=False)
 
@@ -376,7 +421,8 @@ class TestSetLSwitchPortCommand(TestBaseCommand):
                                return_value=fake_lsp):
             cmd = commands.SetLSwitchPortCommand(
                 self.ovn_api, fake_lsp.name, if_exists=True,
-                external_ids=new_ext_ids)
+                external_ids=new_ext_ids, dhcpv4_options=[],
+                dhcpv6_options=[])
             cmd.run_idl(self.transaction)
             self.assertEqual(new_ext_ids, fake_lsp.external_ids)
             if has_v4_opts:
@@ -393,6 +439,54 @@ class TestSetLSwitchPortCommand(TestBaseCommand):
     def test_lswitch_port_update_del_all_port_dhcp_options(self):
         self._test_lswitch_port_update_del_dhcp(True, True)
 
+    def test_lswitch_port_update_keeps_unset_port_dhcp_options(self):
+        dhcp_options_tbl = self.ovn_api._tables['DHCP_Options']
+        fake_dhcpv4_opts = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'external_ids': {'port_id': 'fake-lsp'}})
+        dhcp_options_tbl.rows[fake_dhcpv4_opts.uuid] = fake_dhcpv4_opts
+        fake_dhcpv6_opts = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'external_ids': {'port_id': 'fake-lsp'}})
+        dhcp_options_tbl.rows[fake_dhcpv6_opts.uuid] = fake_dhcpv6_opts
+        fake_lsp = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'name': 'fake-lsp',
+                   'dhcpv4_options': [fake_dhcpv4_opts],
+                   'dhcpv6_options': [fake_dhcpv6_opts]})
+        with mock.patch.object(idlutils, 'row_by_value',
+                               return_value=fake_lsp):
+            # Only the DHCPv6 reference is being replaced.
+            cmd = commands.SetLSwitchPortCommand(
+                self.ovn_api, fake_lsp.name, if_exists=True,
+                dhcpv6_options=[])
+            cmd.run_idl(self.transaction)
+            fake_dhcpv4_opts.delete.assert_not_called()
+            fake_dhcpv6_opts.delete.assert_called_once_with()
+
+    def test_lswitch_port_update_with_dhcp_options_command(self):
+        dhcp_options_tbl = self.ovn_api._tables['DHCP_Options']
+        fake_subnet_opts = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'external_ids': {'subnet_id': 'fake-subnet-id'}})
+        dhcp_options_tbl.rows[fake_subnet_opts.uuid] = fake_subnet_opts
+        fake_port_opts = fakes.FakeOvsdbRow.create_one_ovsdb_row()
+        self.transaction.insert.return_value = fake_port_opts
+        fake_lsp = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'name': 'fake-lsp',
+                   'dhcpv4_options': [fake_subnet_opts],
+                   'dhcpv6_options': []})
+        dhcp_cmd = commands.AddDHCPOptionsCommand(
+            self.ovn_api, 'fake-subnet-id', port_id='fake-lsp',
+            external_ids={'subnet_id': 'fake-subnet-id',
+                          'port_id': 'fake-lsp'})
+        with mock.patch.object(idlutils, 'row_by_value',
+                               return_value=fake_lsp):
+            cmd = commands.SetLSwitchPortCommand(
+                self.ovn_api, fake_lsp.name, if_exists=True,
+                dhcpv4_options=[dhcp_cmd])
+            cmd.run_idl(self.transaction)
+        self.transaction.insert.assert_called_once_with(dhcp_options_tbl)
+        self.assertEqual([fake_port_opts.uuid], fake_lsp.dhcpv4_options)
+        # The subnet DHCP_Options row is not owned by the port.
+        fake_subnet_opts.delete.assert_not_called()
+
 
 class TestDelLSwitchPortCommand(TestBaseCommand):
 
@@ -443,6 +537,29 @@ class TestDelLSwitchPortCommand(TestBaseCommand):
             fake_lsp.delete.assert_called_once_with()
             self.assertEqual([], fake_lswitch.ports)
 
+    def test_lswitch_port_del_stats(self):
+        fake_lsp = mock.MagicMock()
+        fake_lswitch = fakes.FakeOvsdbRow.create_one_ovsdb_row(
+            attrs={'ports': [fake_lsp]})
+        self.ovn_api._tables['Logical_Switch_Port'].rows[fake_lsp.uuid] = \
+            fake_lsp
+        with mock.patch.object(idlutils, 'row_by_value',
+                               side_effect=[fake_lsp, fake_lswitch] * 2), \
+                mock.patch.object(commands, '_LSWITCH_PORTS_ATTEMPTS',
+                                  collections.Counter()), \
+                mock.patch.object(commands, '_LSWITCH_PORTS_COMMITS',
+                                  collections.Counter()):
+            cmd = commands.DelLSwitchPortCommand(
+                self.ovn_api, fake_lsp.name, 'fake-lswitch', if_exists=True)
+            # The first run is retried, the second one is committed.
+            cmd.run_idl(self.transaction)
+            cmd.run_idl(self.transaction)
+            cmd.post_commit(self.transaction)
+            self.assertEqual(
+                {'fake-lswitch': {'attempts': 2, 'commits': 1,
+                                  'conflicts': 1}},
+                commands.get_lswitch_ports_stats())
+
 
 class TestAddLRouterCommand(TestBaseCommand):
 
@@ -1110,6 +1227,7 @@ class TestAddDHCPOptionsCommand(TestBaseCommand):
         cmd.run_idl(self.transaction)
         self.transaction.insert.assert_not_called()
         self.assertEqual(fake_ext_ids, fake_dhcp_options.external_ids)
+        self.assertEqual(fake_dhcp_options.uuid, cmd.result)
 
     def _test_dhcp_options_add(self, may_exists=True):
         fake_subnet_id = 'fake-subnet-id-' + str(may_exists)
@@ -1134,6 +1252,7 @@ class TestAddDHCPOptionsCommand(TestBaseCommand):
         self.transaction.insert.assert_called_once_with(
             self.ovn_api._tables['DHCP_Options'])
         self.assertEqual(fake_ext_ids2, fake_dhcp_options2.external_ids)
+        self.assertEqual(fake_dhcp_options2.uuid, cmd.result)
 
     def test_dhcp_options_add_may_exist(self):
         self._test_dhcp_options_add(may_exists=True)
@@ -0,0 +1,63 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import uuid
+
+import mock
+from ovs import jsonrpc
+
+from networking_ovn.ovsdb import event_locks
+from networking_ovn.tests import base
+
+
+class TestEventLockShards(base.TestCase):
+
+    def setUp(self):
+        super(TestEventLockShards, self).setUp()
+        self.shards = event_locks.EventLockShards(
+            'tcp:127.0.0.1:6641', 'neutron_ovn_event_lock', 4, host='host-1')
+
+    def test_get_shard(self):
+        shards = set(event_locks.get_shard(str(uuid.uuid4()), 4)
+                     for _ in range(100))
+        self.assertTrue(shards <= set(range(4)))
+        self.assertEqual(event_locks.get_shard('host-1', 4),
+                         self.shards.preferred)
+
+    def test_names(self):
+        self.assertEqual(['neutron_ovn_event_lock_%d' % i for i in range(4)],
+                         self.shards.names)
+
+    def test_process(self):
+        name = self.shards.names[2]
+        self.shards._process(2, jsonrpc.Message.create_reply(
+            {'locked': False}, 1))
+        self.assertEqual(frozenset(), self.shards.held)
+        self.shards._process(2, jsonrpc.Message.create_notify('locked',
+                                                              [name]))
+        self.assertEqual(frozenset([2]), self.shards.held)
+        self.shards._process(2, jsonrpc.Message.create_notify(
+            'stolen', [self.shards.names[1]]))
+        self.assertEqual(frozenset([2]), self.shards.held)
+        self.shards._process(2, jsonrpc.Message.create_notify('stolen',
+                                                              [name]))
+        self.assertEqual(frozenset(), self.shards.held)
+        self.shards._process(1, jsonrpc.Message.create_reply(
+            {'locked': True}, 2))
+        self.assertEqual(frozenset([1]), self.shards.held)
+
+    def test_holds(self):
+        row = mock.Mock(uuid=uuid.uuid4())
+        shard = event_locks.get_shard(str(row.uuid), 4)
+        self.assertFalse(self.shards.holds(row))
+        self.shards._set_held(shard, True)
+        self.assertTrue(self.shards.holds(row))
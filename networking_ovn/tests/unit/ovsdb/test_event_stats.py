@@ -0,0 +1,83 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+from oslo_serialization import jsonutils
+
+from networking_ovn.ovsdb import event_stats
+from networking_ovn.tests import base
+
+
+class TestHistogram(base.TestCase):
+
+    def test_observe(self):
+        histogram = event_stats.Histogram()
+        for value in (0.0005, 0.002, 0.002, 0.3, 120):
+            histogram.observe(value)
+        self.assertEqual(5, histogram.count)
+        self.assertEqual(120, histogram.max)
+        histogram_dict = histogram.to_dict()
+        self.assertEqual(1, histogram_dict['buckets']['0.001'])
+        self.assertEqual(2, histogram_dict['buckets']['0.005'])
+        self.assertEqual(1, histogram_dict['buckets']['0.5'])
+        self.assertEqual(1, histogram_dict['buckets']['+Inf'])
+        self.assertEqual(0.005, histogram_dict['p50'])
+        self.assertEqual(120, histogram_dict['p99'])
+
+    def test_empty(self):
+        histogram_dict = event_stats.Histogram().to_dict()
+        self.assertEqual(0, histogram_dict['count'])
+        self.assertEqual(0.0, histogram_dict['mean'])
+        self.assertEqual(0.0, histogram_dict['p99'])
+
+
+class TestEventStats(base.TestCase):
+
+    def setUp(self):
+        super(TestEventStats, self).setUp()
+        self.stats = event_stats.EventStats()
+
+    def test_snapshot(self):
+        for _ in range(4):
+            self.stats.matched('UpEvent')
+            self.stats.queued('UpEvent')
+        self.stats.dropped('UpEvent')
+        self.stats.started('UpEvent', 0.02)
+        self.stats.started('UpEvent')
+        self.stats.finished('UpEvent', 0.003)
+        snapshot = self.stats.snapshot()['UpEvent']
+        self.assertEqual(4, snapshot['matched'])
+        self.assertEqual(1, snapshot['dropped'])
+        self.assertEqual(1, snapshot['depth'])
+        self.assertEqual(1, snapshot['queue_wait']['count'])
+        self.assertEqual(0.02, snapshot['queue_wait']['max'])
+        self.assertEqual(1, snapshot['run_time']['count'])
+
+        # A snapshot doesn't reset anything.
+        self.stats.matched('UpEvent')
+        self.assertEqual(5, self.stats.snapshot()['UpEvent']['matched'])
+        self.assertEqual(5, self.stats.snapshot()['UpEvent']['matched'])
+
+    def test_write_stats(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'stats.json')
+        self.stats.matched('UpEvent')
+        event_stats.write_stats(path, {'events': self.stats.snapshot()})
+        with open(path) as f:
+            stats = jsonutils.loads(f.read())
+        self.assertEqual(1, stats['events']['UpEvent']['matched'])
+        self.assertEqual(['stats.json'], os.listdir(tmp_dir))
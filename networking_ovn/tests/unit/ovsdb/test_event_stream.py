@@ -0,0 +1,152 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import uuid
+
+import mock
+from oslo_serialization import jsonutils
+
+from networking_ovn.ovsdb import event_stream
+from networking_ovn.tests import base
+
+
+def _make_row(**columns):
+    row = mock.Mock(uuid=uuid.uuid4())
+    row._data = dict((column, mock.Mock(**{'to_json.return_value': value}))
+                     for column, value in columns.items())
+    return row
+
+
+class TestEventStreamServer(base.TestCase):
+
+    def setUp(self):
+        super(TestEventStreamServer, self).setUp()
+        self.server = event_stream.EventStreamServer('/tmp/test.sock',
+                                                     queue_size=3)
+
+    def _get_events(self, client):
+        events = []
+        while not client.queue.empty():
+            events.append(jsonutils.loads(client.queue.get_nowait()))
+        return events
+
+    def test_publish(self):
+        all_client = self.server._add_client({})
+        lsp_client = self.server._add_client(
+            {'tables': ['Logical_Switch_Port'], 'events': ['update'],
+             'columns': ['up']})
+        row = _make_row(name='port-1', up=True)
+        old = _make_row(up=False)
+        self.server.publish('Logical_Switch_Port', 'update', row, old)
+        self.server.publish('Logical_Switch_Port', 'delete', row)
+        self.server.publish('Chassis', 'create', _make_row(name='ch-1'))
+
+        lsp_events = self._get_events(lsp_client)
+        self.assertEqual([{'table': 'Logical_Switch_Port', 'event': 'update',
+                           'uuid': str(row.uuid), 'row': {'up': True},
+                           'old': {'up': False}}], lsp_events)
+        all_events = self._get_events(all_client)
+        self.assertEqual(3, len(all_events))
+        self.assertEqual({'name': 'port-1', 'up': True}, all_events[0]['row'])
+        self.assertNotIn('old', all_events[1])
+
+    def test_publish_client_queue_full(self):
+        client = self.server._add_client({})
+        for _ in range(4):
+            self.server.publish('Chassis', 'create', _make_row(name='ch-1'))
+        self.assertEqual(3, client.queue.qsize())
+        self.assertEqual(1, client.num_dropped)
+
+    def test_remove_client(self):
+        client = self.server._add_client({})
+        self.server._remove_client(client)
+        self.assertEqual(frozenset(), self.server.clients)
+
+    def _start(self, server):
+        with mock.patch.object(event_stream.greenthread, 'spawn_n'):
+            server.start()
+        self.addCleanup(server._sock.close)
+
+    def test_start(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'events.sock')
+        server = event_stream.EventStreamServer(path, mode=0o660)
+        self._start(server)
+        mode = os.stat(path).st_mode
+        self.assertTrue(stat.S_ISSOCK(mode))
+        self.assertEqual(0o660, stat.S_IMODE(mode))
+
+        # The socket of a previous run is replaced.
+        server._sock.close()
+        self._start(event_stream.EventStreamServer(path))
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(path).st_mode))
+
+    def test_start_live_server(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'events.sock')
+        server = event_stream.EventStreamServer(path)
+        self._start(server)
+
+        # The socket of a live server isn't stolen from it.
+        other = event_stream.EventStreamServer(path)
+        self.assertTrue(other.is_served())
+        self.assertRaises(RuntimeError, other.start)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(probe.close)
+        probe.connect(path)
+
+    def test_get_server_live_server(self):
+        with mock.patch.object(event_stream.ovn_config,
+                               'get_ovn_ovsdb_event_stream_path',
+                               return_value='/tmp/test.sock'), \
+                mock.patch.object(event_stream, '_SERVER', None), \
+                mock.patch.object(event_stream.EventStreamServer,
+                                  'is_served', return_value=True), \
+                mock.patch.object(event_stream.EventStreamServer,
+                                  'start') as start:
+            self.assertIsNone(event_stream.get_server())
+            self.assertFalse(start.called)
+
+    def test_start_not_a_socket(self):
+        with tempfile.NamedTemporaryFile() as f:
+            server = event_stream.EventStreamServer(f.name)
+            self.assertRaises(RuntimeError, server.start)
+            self.assertTrue(os.path.exists(f.name))
+
+    def test_serve_client_gone(self):
+        conn, peer = socket.socketpair()
+        self.addCleanup(conn.close)
+        peer.sendall(b'{"tables": ["Chassis"]}\n')
+        peer.close()
+        # The client going away is noticed without any event to send it.
+        with mock.patch.object(event_stream.greenthread, 'spawn_n',
+                               side_effect=lambda func, *args: func(*args)):
+            self.server._serve(conn)
+        self.assertEqual(frozenset(), self.server.clients)
+
+    def test_client_close_queue_full(self):
+        client = self.server._add_client({})
+        for _ in range(3):
+            self.server.publish('Chassis', 'create', _make_row(name='ch-1'))
+        client.close()
+        self.assertEqual(3, client.queue.qsize())
+
+    def test_invalid_subscription(self):
+        self.assertRaises(ValueError, self.server._add_client, ['Chassis'])
+        self.assertEqual(frozenset(), self.server.clients)
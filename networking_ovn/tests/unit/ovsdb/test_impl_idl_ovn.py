@@ -578,6 +578,43 @@ class TestNBImplIdlOvn(TestDBImplIdlOvn):
         self.assertEqual(len(dhcp_options['subnets']), 3)
         self.assertEqual(len(dhcp_options['ports_v4']), 2)
 
+    def test_get_lswitch_port(self):
+        self.assertIsNone(self.nb_ovn_idl.get_lswitch_port('lsp-id-1'))
+        fake_dhcp_opts = fakes.FakeOvsdbRow.create_one_ovsdb_row()
+        self._load_ovsdb_fake_rows(self.lsp_table, [
+            {'name': 'lsp-id-1', 'type': '',
+             'addresses': ['fa:16:3e:00:00:01 10.0.1.1'],
+             'port_security': ['fa:16:3e:00:00:01 10.0.1.1'],
+             'options': {}, 'parent_name': [], 'tag': [],
+             'enabled': [True],
+             'external_ids': {ovn_const.OVN_PORT_NAME_EXT_ID_KEY:
+                              'lsp-name-1'},
+             'dhcpv4_options': [fake_dhcp_opts], 'dhcpv6_options': []}])
+        self.assertEqual(
+            {'name': 'lsp-id-1', 'type': '',
+             'addresses': ['fa:16:3e:00:00:01 10.0.1.1'],
+             'port_security': ['fa:16:3e:00:00:01 10.0.1.1'],
+             'options': {}, 'parent_name': None, 'tag': None,
+             'enabled': True,
+             'external_ids': {ovn_const.OVN_PORT_NAME_EXT_ID_KEY:
+                              'lsp-name-1'},
+             'dhcpv4_options': [fake_dhcp_opts.uuid], 'dhcpv6_options': []},
+            self.nb_ovn_idl.get_lswitch_port('lsp-id-1'))
+
+    def test_get_lswitch_ports(self):
+        self._load_ovsdb_fake_rows(self.lsp_table, [
+            {'name': 'lsp-id-%d' % i, 'type': '', 'addresses': [],
+             'port_security': [], 'options': {'policing_rate': str(i)},
+             'parent_name': [], 'tag': [], 'enabled': [True],
+             'external_ids': {}, 'dhcpv4_options': [],
+             'dhcpv6_options': []} for i in range(3)])
+        lsps = self.nb_ovn_idl.get_lswitch_ports(
+            ['lsp-id-0', 'lsp-id-2', 'lsp-id-unknown'])
+        self.assertEqual(['lsp-id-0', 'lsp-id-2'], sorted(lsps))
+        self.assertEqual({'policing_rate': '2'}, lsps['lsp-id-2']['options'])
+        self.assertEqual(self.nb_ovn_idl.get_lswitch_port('lsp-id-0'),
+                         lsps['lsp-id-0'])
+
     def test_get_port_dhcp_options(self):
         self._load_nb_db()
         port_options = self.nb_ovn_idl.get_port_dhcp_options(
@@ -14,6 +14,8 @@
 
 import copy
 import mock
+from six.moves import queue
+import threading
 import time
 import uuid
 
@@ -21,7 +23,9 @@ from ovs.db import idl as ovs_idl
 from ovs import poller
 
 from networking_ovn.common import config as ovn_config
+from networking_ovn.common import constants as ovn_const
 from networking_ovn.ovsdb import ovsdb_monitor
+from networking_ovn.ovsdb import row_event
 from networking_ovn.tests import base
 from networking_ovn.tests.unit.ml2 import test_mech_driver
 from neutron.agent.ovsdb.native import idlutils
@@ -102,17 +106,13 @@ class TestOvnNbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
         # handles the notify event
         time.sleep(1)
 
-    def test_lsp_up_create_event(self):
-        row_data = {"up": True, "name": "foo-name"}
-        self._test_lsp_helper('create', row_data)
-        self.driver.set_port_status_up.assert_called_once_with("foo-name")
-        self.assertFalse(self.driver.set_port_status_down.called)
-
-    def test_lsp_down_create_event(self):
-        row_data = {"up": False, "name": "foo-name"}
-        self._test_lsp_helper('create', row_data)
-        self.driver.set_port_status_down.assert_called_once_with("foo-name")
+    def test_lsp_create_event(self):
+        # The initial dump of the ports is handled by post_initialize.
+        for up in (True, False):
+            row_data = {"up": up, "name": "foo-name"}
+            self._test_lsp_helper('create', row_data)
         self.assertFalse(self.driver.set_port_status_up.called)
+        self.assertFalse(self.driver.set_port_status_down.called)
 
     def test_lsp_up_not_set_event(self):
         row_data = {"up": ['set', []], "name": "foo-name"}
@@ -120,22 +120,66 @@ class TestOvnNbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
         self.assertFalse(self.driver.set_port_status_up.called)
         self.assertFalse(self.driver.set_port_status_down.called)
 
-    def test_unwatch_logical_switch_port_create_events(self):
-        self.idl.unwatch_logical_switch_port_create_events()
-        row_data = {"up": True, "name": "foo-name"}
-        self._test_lsp_helper('create', row_data)
+    def test_post_initialize(self):
+        self.driver.sync_port_statuses = mock.Mock()
+        for name, up in (('foo-up', True), ('foo-down', False),
+                         ('foo-unset', ['set', []])):
+            row_uuid = uuid.uuid4()
+            self.lp_table.rows[row_uuid] = ovs_idl.Row.from_json(
+                self.idl, self.lp_table, row_uuid, {"up": up, "name": name})
+        self.idl.post_initialize(self.driver)
+        # sleep for a second so that the notify handler green thread
+        # handles the queued event
+        time.sleep(1)
+        self.driver.sync_port_statuses.assert_called_once_with(
+            {'foo-up': True, 'foo-down': False})
         self.assertFalse(self.driver.set_port_status_up.called)
         self.assertFalse(self.driver.set_port_status_down.called)
 
-        row_data["up"] = False
-        self._test_lsp_helper('create', row_data)
-        self.assertFalse(self.driver.set_port_status_up.called)
-        self.assertFalse(self.driver.set_port_status_down.called)
+    def test_post_initialize_no_ovsdb_lock(self):
+        self.idl.has_lock = False
+        self.idl.is_lock_contended = True
+        self.idl.notify_handler.queue_event = mock.Mock()
+        self.idl.post_initialize(self.driver)
+        self.assertFalse(self.idl.notify_handler.queue_event.called)
 
-    def test_post_initialize(self):
+    def test_event_lock_transitions(self):
+        up_column = self.lp_table.columns['up']
+        self.idl.has_lock = False
+        self.idl.is_lock_contended = True
+        self.idl.post_initialize(self.driver)
+        # The ports going up or down are not notified without the lock.
+        self.assertFalse(up_column.alert)
+
+        self.idl.notify_handler.queue_event = mock.Mock()
+        self.idl.has_lock = True
+        with mock.patch.object(self.idl._session, 'is_connected',
+                               return_value=True):
+            self.idl._update_event_locks()
+        self.assertTrue(up_column.alert)
+        self.idl.notify_handler.queue_event.assert_called_once_with(
+            self.idl.notify_handler.resync_event)
+
+        self.idl.has_lock = False
+        self.idl._update_event_locks()
+        self.assertFalse(up_column.alert)
+        self.assertEqual(1, self.idl.notify_handler.queue_event.call_count)
+
+    def test_catch_up_on_reconnect(self):
         self.idl.post_initialize(self.driver)
-        self.assertIsNone(self.idl._lsp_create_up_event)
-        self.assertIsNone(self.idl._lsp_create_down_event)
+        self.idl.notify_handler.queue_event = mock.Mock()
+        with mock.patch.object(self.idl._session, 'is_connected',
+                               return_value=True), \
+            mock.patch.object(self.idl._session, 'get_seqno',
+                              return_value=self.idl._session_seqno + 2):
+            # The catch up waits for the dump of the database.
+            self.idl._update_event_locks()
+            self.assertFalse(self.idl.notify_handler.queue_event.called)
+            self.idl.change_seqno += 1
+            self.idl._update_event_locks()
+            self.idl._update_event_locks()
+        self.idl.notify_handler.queue_event.assert_called_once_with(
+            self.idl.notify_handler.resync_event)
 
     def test_lsp_up_update_event(self):
         new_row_json = {"up": True, "name": "foo-name"}
@@ -197,6 +241,19 @@ class TestOvnNbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
         self.idl.notify("create", mock.ANY)
         self.assertTrue(self.idl.notify_handler.notify.called)
 
+    def test_notify_event_lock_shards(self):
+        self.idl.event_lock_shards = mock.Mock()
+        self.idl.notify_handler.notify = mock.Mock()
+        row = mock.Mock()
+        self.idl.event_lock_shards.holds.return_value = False
+        self.idl.notify("create", row)
+        self.assertFalse(self.idl.notify_handler.notify.called)
+        self.idl.event_lock_shards.holds.return_value = True
+        self.idl.notify("create", row)
+        self.idl.notify_handler.notify.assert_called_once_with(
+            "create", row, None)
+        self.idl.event_lock_shards.holds.assert_called_with(row)
+
 
 class TestOvnSbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
 
@@ -204,6 +261,8 @@ class TestOvnSbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
 
     def setUp(self):
         super(TestOvnSbIdlNotifyHandler, self).setUp()
+        ovn_config.cfg.CONF.set_override('ovn_l3_reschedule_delay', 0,
+                                         group='ovn')
         sb_helper = ovs_idl.SchemaHelper(schema_json=OVN_SB_SCHEMA)
         sb_helper.register_table('Chassis')
         self.sb_idl = ovsdb_monitor.OvnSbIdl(self.driver, "remote", sb_helper)
@@ -269,6 +328,40 @@ class TestOvnSbIdlNotifyHandler(test_mech_driver.OVNMechanismDriverTestCase):
                 1,
                 self.l3_plugin.schedule_unhosted_routers.call_count)
 
+    def test_chassis_update_event_same_bridge_mappings(self):
+        self.row_json['external_ids'][1].append(['ovn-encap-ip', '10.0.0.1'])
+        old_row_json = {'external_ids': ['map', [[
+            "ovn-bridge-mappings", "fake-phynet1:fake-br2"]]]}
+        self._test_chassis_helper('update', self.row_json, old_row_json)
+        self.assertFalse(self.driver.update_segment_host_mapping.called)
+        if ovn_config.is_ovn_l3():
+            self.assertFalse(
+                self.l3_plugin.schedule_unhosted_routers.called)
+
+    def test_chassis_update_event_hostname(self):
+        old_row_json = {'hostname': 'old-hostname'}
+        self._test_chassis_helper('update', self.row_json, old_row_json)
+        self.driver.update_segment_host_mapping.assert_has_calls([
+            mock.call('old-hostname', []),
+            mock.call('fake-hostname', ['fake-phynet1'])])
+
+    def test_chassis_event_reschedule_delay(self):
+        ovn_config.cfg.CONF.set_override('ovn_l3_reschedule_delay', 5,
+                                         group='ovn')
+        event = ovsdb_monitor.ChassisEvent(self.driver)
+        event.l3_plugin = mock.Mock()
+        row = ovs_idl.Row.from_json(self.sb_idl, self.chassis_table,
+                                    str(uuid.uuid4()), self.row_json)
+        with mock.patch.object(ovsdb_monitor.greenthread,
+                               'spawn_after') as spawn_after:
+            for _ in range(3):
+                event.run('create', row, None)
+            spawn_after.assert_called_once_with(5, event._reschedule_routers)
+            event._reschedule_routers()
+            event.l3_plugin.schedule_unhosted_routers.assert_called_once_with()
+            event.run('delete', row, None)
+            self.assertEqual(2, spawn_after.call_count)
+
 
 class TestOvnDbNotifyHandler(base.TestCase):
 
@@ -298,6 +391,283 @@ class TestOvnDbNotifyHandler(base.TestCase):
         self.handler.unwatch_events([unknown_event])
         self.assertItemsEqual(set(), self.watched_events)
 
+    def test_matching_events(self):
+        lsp_update = mock.Mock(table='Logical_Switch_Port',
+                               events=(row_event.RowEvent.ROW_UPDATE,))
+        lsp_create = mock.Mock(table='Logical_Switch_Port',
+                               events=(row_event.RowEvent.ROW_CREATE,))
+        chassis = mock.Mock(table='Chassis',
+                            events=(row_event.RowEvent.ROW_UPDATE,))
+        self.handler.watch_events([lsp_update, lsp_create, chassis])
+        row = mock.Mock()
+        row._table.name = 'Logical_Switch_Port'
+
+        self.assertEqual((lsp_update,), self.handler.matching_events(
+            row_event.RowEvent.ROW_UPDATE, row, None))
+        lsp_update.matches.assert_called_once_with(
+            row_event.RowEvent.ROW_UPDATE, row, None)
+        lsp_create.matches.assert_not_called()
+        chassis.matches.assert_not_called()
+
+        # The tables without watched events are skipped.
+        row._table.name = 'ACL'
+        self.assertEqual((), self.handler.matching_events(
+            row_event.RowEvent.ROW_UPDATE, row, None))
+
+        self.handler.unwatch_event(lsp_update)
+        row._table.name = 'Logical_Switch_Port'
+        self.assertEqual((), self.handler.matching_events(
+            row_event.RowEvent.ROW_UPDATE, row, None))
+
+    def test_matching_events_single_event_type(self):
+        lsp_update = mock.Mock(table='Logical_Switch_Port',
+                               events=row_event.RowEvent.ROW_UPDATE)
+        self.handler.watch_event(lsp_update)
+        row = mock.Mock()
+        row._table.name = 'Logical_Switch_Port'
+        self.assertEqual((lsp_update,), self.handler.matching_events(
+            row_event.RowEvent.ROW_UPDATE, row, None))
+
+    def test_watch_event_not_iterable(self):
+        event = mock.Mock(table='Logical_Switch_Port', events=None)
+        with mock.patch.object(ovsdb_monitor.LOG, 'warning') as warning:
+            self.handler.watch_event(event)
+        self.assertEqual(1, warning.call_count)
+        self.assertIn(event, self.watched_events)
+
+    def test_matching_events_lsp_up_down(self):
+        up_event = ovsdb_monitor.LogicalSwitchPortUpdateUpEvent(mock.Mock())
+        down_event = ovsdb_monitor.LogicalSwitchPortUpdateDownEvent(
+            mock.Mock())
+        self.handler.watch_events([up_event, down_event])
+        row = mock.Mock()
+        row._table.name = 'Logical_Switch_Port'
+        with mock.patch.object(ovsdb_monitor.LogicalSwitchPortUpdateUpEvent,
+                               'matches', return_value=True), \
+            mock.patch.object(
+                ovsdb_monitor.LogicalSwitchPortUpdateDownEvent, 'matches',
+                return_value=False):
+            self.assertEqual((up_event,), self.handler.matching_events(
+                row_event.RowEvent.ROW_UPDATE, row, None))
+
+    def test_queue_event(self):
+        match = mock.Mock()
+        match.coalesce_key.return_value = None
+        rows = [mock.Mock(uuid=uuid.uuid4()) for _ in range(8)]
+        self.handler.overflow_policy = ovn_const.OVSDB_EVENT_OVERFLOW_BLOCK
+        with mock.patch.object(self.handler, 'notifications',
+                               [mock.Mock(), mock.Mock()]) as notifications:
+            for row in rows + rows:
+                self.handler.queue_event(match, 'update', row)
+            self.handler.queue_event(match)
+
+        # The events of a row are queued to the same worker.
+        queued = [[c[0][0].row for c in q.put.call_args_list]
+                  for q in notifications]
+        for row in rows:
+            self.assertEqual(2, sum(q.count(row) for q in queued))
+            self.assertTrue(any(q.count(row) == 2 for q in queued))
+        self.assertIsNone(queued[0][-1])
+
+    def test_queue_event_coalesced(self):
+        driver = mock.Mock()
+        up_event = ovsdb_monitor.LogicalSwitchPortUpdateUpEvent(driver)
+        down_event = ovsdb_monitor.LogicalSwitchPortUpdateDownEvent(driver)
+        row = mock.Mock(uuid=uuid.uuid4())
+        row.name = 'port-1'
+        other_row = mock.Mock(uuid=uuid.uuid4())
+        other_row.name = 'port-2'
+        self.handler.overflow_policy = ovn_const.OVSDB_EVENT_OVERFLOW_BLOCK
+        with mock.patch.object(self.handler, 'notifications',
+                               [mock.Mock()]) as notifications:
+            self.handler.queue_event(up_event, 'update', row)
+            self.handler.queue_event(down_event, 'update', other_row)
+            self.handler.queue_event(down_event, 'update', row)
+            self.handler.queue_event(up_event, 'update', row)
+        queued = [c[0][0] for c in notifications[0].put.call_args_list]
+        self.assertEqual([True, False, True, False],
+                         [n.cancelled for n in queued])
+        self.assertEqual(2, self.handler.num_coalesced)
+
+        # Only the latest status of each port is set.
+        for notification in queued:
+            if self.handler._start(notification):
+                notification.match.run(notification.event, notification.row,
+                                       notification.updates)
+        driver.set_port_status_down.assert_called_once_with('port-2')
+        driver.set_port_status_up.assert_called_once_with('port-1')
+
+    def test_queue_event_overflow_coalesce(self):
+        driver = mock.Mock()
+        up_event = ovsdb_monitor.LogicalSwitchPortUpdateUpEvent(driver)
+        down_event = ovsdb_monitor.LogicalSwitchPortUpdateDownEvent(driver)
+        row = mock.Mock(uuid=uuid.uuid4())
+        self.handler.overflow_policy = (
+            ovn_const.OVSDB_EVENT_OVERFLOW_COALESCE)
+        self.handler.notifications = [queue.Queue(1)]
+        self.handler.queue_event(up_event, 'update', row)
+        # The queue is full, the superseded event is replaced in place.
+        self.handler.queue_event(down_event, 'update', row)
+        self.assertEqual(1, self.handler.num_coalesced)
+        self.assertEqual(0, self.handler.num_dropped)
+        notification = self.handler.notifications[0].get_nowait()
+        self.assertIs(down_event, notification.match)
+        self.assertFalse(notification.cancelled)
+
+    def test_queue_event_overflow_resync(self):
+        match = mock.Mock()
+        match.coalesce_key.return_value = None
+        self.handler.overflow_policy = ovn_const.OVSDB_EVENT_OVERFLOW_RESYNC
+        self.handler.notifications = [queue.Queue(1)]
+        self.handler.set_resync_event(mock.Mock())
+        for _ in range(3):
+            self.handler.queue_event(match, 'update',
+                                     mock.Mock(uuid=uuid.uuid4()))
+        self.assertEqual(2, self.handler.num_dropped)
+        self.assertEqual(1, self.handler.notifications[0].qsize())
+
+        self.handler._resync()
+        self.handler._resync()
+        self.handler.resync_event.run.assert_called_once_with(None, None,
+                                                              None)
+
+    def test_queue_event_overflow_block(self):
+        match = mock.Mock()
+        match.coalesce_key.return_value = None
+        self.handler.overflow_policy = ovn_const.OVSDB_EVENT_OVERFLOW_BLOCK
+        self.handler.notifications = [queue.Queue(1)]
+        self.handler.set_resync_event(mock.Mock())
+        with mock.patch.object(ovsdb_monitor,
+                               'OVSDB_EVENT_BLOCK_TIMEOUT', 0.01):
+            for _ in range(2):
+                self.handler.queue_event(match, 'update',
+                                         mock.Mock(uuid=uuid.uuid4()))
+        # The connection doesn't wait forever, it falls back to resync.
+        self.assertEqual(1, self.handler.num_dropped)
+        self.assertEqual(1, self.handler.notifications[0].qsize())
+
+    def test_queue_event_overflow_resync_first_worker(self):
+        match = mock.Mock(ONETIME=False)
+        match.coalesce_key.return_value = None
+        first, other = queue.Queue(), queue.Queue(1)
+        self.handler.overflow_policy = ovn_const.OVSDB_EVENT_OVERFLOW_RESYNC
+        self.handler.notifications = [first, other]
+        self.handler.set_resync_event(mock.Mock())
+        with mock.patch.object(self.handler, '_get_notifications',
+                               return_value=other):
+            for _ in range(2):
+                self.handler.queue_event(match, 'update',
+                                         mock.Mock(uuid=uuid.uuid4()))
+        self.assertEqual(1, self.handler.num_dropped)
+        self.assertEqual(1, first.qsize())
+
+        # The other worker drains its queue without running the resync.
+        worker = threading.Thread(target=self.handler.notify_loop,
+                                  args=(other,))
+        worker.start()
+        other.put(ovsdb_monitor.OvnDbNotifyHandler.STOP_EVENT)
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertFalse(self.handler.resync_event.run.called)
+
+        # The first worker is woken up to run it.
+        self.handler.resync_event.run.side_effect = lambda *args: first.put(
+            ovsdb_monitor.OvnDbNotifyHandler.STOP_EVENT)
+        self.handler.notify_loop(first)
+        self.handler.resync_event.run.assert_called_once_with(None, None,
+                                                              None)
+
+    def test_notify_loop_no_row_after_queued_events(self):
+        first, other = queue.Queue(), queue.Queue()
+        self.handler.notifications = [first, other]
+        ran = []
+        row_match = mock.Mock(ONETIME=False)
+        row_match.coalesce_key.return_value = None
+        row_match.run.side_effect = lambda *args: ran.append('row')
+        sync_match = mock.Mock(ONETIME=False)
+        sync_match.run.side_effect = lambda *args: ran.append('sync')
+        with mock.patch.object(self.handler, '_get_notifications',
+                               side_effect=lambda row: other if row
+                               else first):
+            self.handler.queue_event(row_match, 'update',
+                                     mock.Mock(uuid=uuid.uuid4()))
+            self.handler.queue_event(sync_match)
+        for notifications in (first, other):
+            notifications.put(ovsdb_monitor.OvnDbNotifyHandler.STOP_EVENT)
+
+        # The event of no row waits for the event queued before it to the
+        # other worker.
+        worker = threading.Thread(target=self.handler.notify_loop,
+                                  args=(first,))
+        worker.start()
+        worker.join(0.1)
+        self.assertTrue(worker.is_alive())
+        self.assertEqual([], ran)
+
+        self.handler.notify_loop(other)
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(['row', 'sync'], ran)
+
+    def test_notify_loop_stats(self):
+        driver = mock.Mock()
+        up_event = ovsdb_monitor.LogicalSwitchPortUpdateUpEvent(driver)
+        down_event = ovsdb_monitor.LogicalSwitchPortUpdateDownEvent(driver)
+        row = mock.Mock(uuid=uuid.uuid4())
+        notifications = queue.Queue()
+        with mock.patch.object(self.handler, '_get_notifications',
+                               return_value=notifications):
+            self.handler.queue_event(up_event, 'update', row)
+            self.handler.queue_event(down_event, 'update', row)
+        stats = self.handler.stats.snapshot()
+        self.assertEqual(1, stats['LogicalSwitchPortUpdateUpEvent']['depth'])
+        self.assertEqual(
+            1, stats['LogicalSwitchPortUpdateDownEvent']['matched'])
+
+        notifications.put(ovsdb_monitor.OvnDbNotifyHandler.STOP_EVENT)
+        self.handler.notify_loop(notifications)
+        stats = self.handler.stats.snapshot()
+        up_stats = stats['LogicalSwitchPortUpdateUpEvent']
+        down_stats = stats['LogicalSwitchPortUpdateDownEvent']
+        self.assertEqual(0, up_stats['depth'] + down_stats['depth'])
+        # The coalesced event left the queue without running.
+        self.assertEqual(0, up_stats['run_time']['count'])
+        self.assertEqual(1, down_stats['queue_wait']['count'])
+        self.assertEqual(1, down_stats['run_time']['count'])
+
+    def test_report_stats(self):
+        self.handler.name = 'OVN_Northbound'
+        self.handler._reported_at = 100.0
+        for _ in range(4):
+            self.handler.stats.matched('LogicalSwitchPortUpdateUpEvent')
+        with mock.patch.object(ovn_config,
+                               'get_ovn_ovsdb_event_stats_path',
+                               return_value='/tmp/stats.json'), \
+                mock.patch.object(ovsdb_monitor.event_stats,
+                                  'write_stats') as write_stats, \
+                mock.patch.object(ovsdb_monitor.os, 'getpid',
+                                  return_value=1234), \
+                mock.patch.object(ovsdb_monitor.time, 'time',
+                                  side_effect=[102.0, 112.0]):
+            self.handler.report_stats()
+            stats = write_stats.call_args[0][1]
+            self.assertEqual('/tmp/stats.json.OVN_Northbound.1234',
+                             write_stats.call_args[0][0])
+            up_stats = stats['events']['LogicalSwitchPortUpdateUpEvent']
+            self.assertEqual(4, up_stats['matched'])
+            self.assertEqual(2.0, up_stats['matches_per_second'])
+            self.assertEqual([0] * len(self.handler.notifications),
+                             stats['queue_depths'])
+
+            # The rate only counts the matches since the previous report,
+            # the other readers of the stats don't affect it.
+            self.handler.stats.matched('LogicalSwitchPortUpdateUpEvent')
+            self.handler.stats.snapshot()
+            self.handler.report_stats()
+            stats = write_stats.call_args[0][1]
+            up_stats = stats['events']['LogicalSwitchPortUpdateUpEvent']
+            self.assertEqual(0.1, up_stats['matches_per_second'])
+
     def test_shutdown(self):
         self.handler.shutdown()
 
@@ -0,0 +1,279 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.ovsdb import api
+from neutron.agent.ovsdb.native import idlutils
+
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.ovsdb import commands
+from networking_ovn.ovsdb import transaction
+from networking_ovn.tests import base
+
+INTERACTIVE = ovn_const.OVN_TXN_PRIORITY_INTERACTIVE
+BULK = ovn_const.OVN_TXN_PRIORITY_BULK
+
+
+class TestTransactionLanes(base.TestCase):
+
+    def setUp(self):
+        super(TestTransactionLanes, self).setUp()
+        self.lanes = transaction.TransactionLanes({INTERACTIVE: 2, BULK: 1})
+
+    def test_enter(self):
+        with self.lanes.enter(BULK, 1):
+            stats = self.lanes.get_stats()
+            self.assertEqual(1, stats[BULK]['running'])
+            self.assertEqual(1, stats[BULK]['count'])
+            self.assertEqual(0, stats[INTERACTIVE]['count'])
+        stats = self.lanes.get_stats()
+        self.assertEqual(0, stats[BULK]['running'])
+        self.assertEqual(0, stats[BULK]['waiting'])
+
+    def test_report_stats(self):
+        with self.lanes.enter(BULK, 1):
+            pass
+        with mock.patch.object(transaction.LOG, 'info') as info:
+            self.lanes.report_stats()
+            with self.lanes.enter(BULK, 1):
+                self.lanes.report_stats()
+        reports = [call[0][1] for call in info.call_args_list]
+        self.assertEqual([INTERACTIVE, BULK] * 2,
+                         [report['priority'] for report in reports])
+        # The transactions are counted since the previous report.
+        self.assertEqual([0, 1, 0, 1],
+                         [report['count'] for report in reports])
+        self.assertEqual(1, reports[3]['running'])
+        self.assertEqual(0.0, self.lanes.get_stats()[BULK]['max_queue_time'])
+
+    @mock.patch.object(transaction.greenthread, 'spawn_n')
+    def test_report_stats_interval(self, spawn_n):
+        lanes = transaction.TransactionLanes({INTERACTIVE: 2, BULK: 1}, 10)
+        spawn_n.assert_called_once_with(lanes._report_stats_loop, 10)
+
+    def test_enter_lane_full(self):
+        with self.lanes.enter(BULK, 1):
+            self.assertRaises(api.TimeoutException,
+                              self.lanes.enter(BULK, 0).__enter__)
+            # The other lanes are not affected.
+            with self.lanes.enter(INTERACTIVE, 0):
+                pass
+        self.assertEqual(0, self.lanes.get_stats()[BULK]['waiting'])
+
+    def test_enter_yields_to_higher_priority(self):
+        self.lanes._waiting[INTERACTIVE] = 1
+        self.assertRaises(api.TimeoutException,
+                          self.lanes.enter(BULK, 0).__enter__)
+        self.lanes._waiting[BULK] = 1
+        with self.lanes.enter(INTERACTIVE, 0):
+            pass
+
+
+class TestTransactionCoalescer(base.TestCase):
+
+    def setUp(self):
+        super(TestTransactionCoalescer, self).setUp()
+        self.coalescer = transaction.TransactionCoalescer(0, 10)
+        self.commit_raw = mock.patch.object(transaction.OvnNbTransaction,
+                                            'commit_raw').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _make_txn(self, num_commands):
+        txn = transaction.OvnNbTransaction(mock.Mock(), mock.Mock(), 10,
+                                           coalescer=self.coalescer)
+        txn.commands = [mock.Mock() for _ in range(num_commands)]
+        return txn
+
+    def test_commit(self):
+        txn = self._make_txn(2)
+        self.commit_raw.return_value = ['a', 'b']
+        self.assertEqual(['a', 'b'], self.coalescer.commit(txn))
+        self.commit_raw.assert_called_once_with()
+
+    def test_commit_batch(self):
+        txn1 = self._make_txn(1)
+        txn2 = self._make_txn(2)
+        self.commit_raw.return_value = ['a', 'b', 'c']
+        self.coalescer._commit_batch([txn1, txn2])
+        self.assertEqual(['a'], txn1.coalesced_result)
+        self.assertEqual(['b', 'c'], txn2.coalesced_result)
+        self.commit_raw.assert_called_once_with()
+
+    def test_commit_batch_split_on_failure(self):
+        txns = [self._make_txn(1) for _ in range(3)]
+        error = idlutils.ExceptionResult(ex=RuntimeError(), tb=None)
+        # The batch fails, its first half succeeds, the second half fails
+        # again and is split until the failing transaction is isolated.
+        self.commit_raw.side_effect = [error, ['a'], error, ['b'], error]
+        self.coalescer._commit_batch(txns)
+        self.assertEqual(['a'], txns[0].coalesced_result)
+        self.assertEqual(['b'], txns[1].coalesced_result)
+        self.assertIs(error, txns[2].coalesced_result)
+        self.assertEqual(5, self.commit_raw.call_count)
+
+    def test_commit_batch_timeout(self):
+        txns = [self._make_txn(1) for _ in range(2)]
+        error = idlutils.ExceptionResult(ex=api.TimeoutException(), tb=None)
+        self.commit_raw.return_value = error
+        self.coalescer._commit_batch(txns)
+        for txn in txns:
+            self.assertIs(error, txn.coalesced_result)
+        self.commit_raw.assert_called_once_with()
+
+
+class TestLSwitchLocks(base.TestCase):
+
+    def test_hold(self):
+        locks = transaction.LSwitchLocks()
+        with locks.hold(['ls-2', 'ls-1'], 1):
+            self.assertEqual(set(['ls-1', 'ls-2']), locks._held)
+        # The switches which aren't locked are forgotten.
+        self.assertEqual(set(), locks._held)
+
+    def test_hold_timeout(self):
+        locks = transaction.LSwitchLocks()
+        with locks.hold(['ls-1'], 1):
+            def _hold():
+                with locks.hold(['ls-2', 'ls-1'], 0.1):
+                    pass
+            self.assertRaises(api.TimeoutException, _hold)
+            with locks.hold(['ls-2'], 0.1):
+                self.assertEqual(set(['ls-1', 'ls-2']), locks._held)
+
+
+class FakeCommand(object):
+
+    def __init__(self, api, payload):
+        self.api = api
+        self.payload = payload
+
+
+class TestChunkedTransaction(base.TestCase):
+
+    def setUp(self):
+        super(TestChunkedTransaction, self).setUp()
+        self.api = mock.Mock()
+        self.txns = []
+
+        def transaction(**kwargs):
+            txn = mock.MagicMock()
+            txn.__enter__.return_value = txn
+            self.txns.append(txn)
+            return txn
+        self.api.transaction.side_effect = transaction
+
+    def _committed_chunks(self):
+        return [[c[0][0] for c in txn.add.call_args_list]
+                for txn in self.txns]
+
+    def test_max_commands(self):
+        cmds = [FakeCommand(self.api, 'x') for _ in range(5)]
+        with transaction.ChunkedTransaction(self.api, 2, 1000, 'test',
+                                            check_error=True) as txn:
+            for cmd in cmds:
+                txn.add(cmd)
+        self.assertEqual([cmds[0:2], cmds[2:4], cmds[4:]],
+                         self._committed_chunks())
+        self.api.transaction.assert_called_with(check_error=True)
+        self.assertEqual(3, txn.num_chunks)
+        self.assertEqual(5, txn.num_commands)
+
+    def test_max_size(self):
+        cmds = [FakeCommand(self.api, 'x' * 10) for _ in range(3)]
+        with transaction.ChunkedTransaction(self.api, 100, 30,
+                                            'test') as txn:
+            for cmd in cmds:
+                txn.add(cmd)
+        self.assertEqual([cmds[0:2], cmds[2:]], self._committed_chunks())
+
+    def test_add_group(self):
+        cmds = [FakeCommand(self.api, 'x') for _ in range(4)]
+        with transaction.ChunkedTransaction(self.api, 3, 1000,
+                                            'test') as txn:
+            txn.add(cmds[0])
+            txn.add_group(cmds[1:4])
+        self.assertEqual([cmds[0:1], cmds[1:4]], self._committed_chunks())
+
+    def test_failure_keeps_committed_chunks(self):
+        cmds = [FakeCommand(self.api, 'x') for _ in range(3)]
+
+        def _test():
+            with transaction.ChunkedTransaction(self.api, 2, 1000,
+                                                'test') as txn:
+                for cmd in cmds:
+                    txn.add(cmd)
+                raise RuntimeError()
+        self.assertRaises(RuntimeError, _test)
+        # The pending chunk is not committed.
+        self.assertEqual([cmds[0:2]], self._committed_chunks())
+
+
+class TestOvnNbTransaction(base.TestCase):
+
+    def setUp(self):
+        super(TestOvnNbTransaction, self).setUp()
+        self.queue_and_wait = mock.patch.object(
+            transaction.OvnNbTransaction, '_queue_and_wait',
+            return_value='res').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_commit(self):
+        lanes = mock.MagicMock()
+        txn = transaction.OvnNbTransaction(mock.Mock(), mock.Mock(), 10,
+                                           lanes=lanes, priority=BULK)
+        self.assertEqual('res', txn.commit())
+        lanes.enter.assert_called_once_with(BULK, 10)
+        self.queue_and_wait.assert_called_once_with()
+
+    def test_commit_coalesced(self):
+        coalescer = mock.Mock()
+        coalescer.commit.return_value = ['a']
+        txn = transaction.OvnNbTransaction(mock.Mock(), mock.Mock(), 10,
+                                           coalescer=coalescer)
+        self.assertEqual(['a'], txn.commit())
+        coalescer.commit.assert_called_once_with(txn)
+        self.queue_and_wait.assert_not_called()
+
+    def test_commit_check_error(self):
+        self.queue_and_wait.return_value = idlutils.ExceptionResult(
+            ex=RuntimeError(), tb=None)
+        txn = transaction.OvnNbTransaction(mock.Mock(), mock.Mock(), 10,
+                                           check_error=True)
+        self.assertRaises(RuntimeError, txn.commit)
+        txn = transaction.OvnNbTransaction(mock.Mock(), mock.Mock(), 10)
+        self.assertIs(self.queue_and_wait.return_value, txn.commit())
+
+    def test__get_locked_lswitches(self):
+        txn = transaction.OvnNbTransaction(mock.Mock(), mock.Mock(), 10)
+        txn.add(commands.AddLSwitchPortCommand(mock.Mock(), 'lsp-1', 'ls-1',
+                                               may_exist=True))
+        txn.add(commands.DelLSwitchPortCommand(mock.Mock(), 'lsp-2', 'ls-2',
+                                               if_exists=True))
+        txn.add(commands.SetLSwitchPortCommand(mock.Mock(), 'lsp-3',
+                                               if_exists=True))
+        with mock.patch.object(commands, 'is_ovs_mutate_supported',
+                               return_value=False):
+            self.assertEqual({'ls-1', 'ls-2'}, txn._get_locked_lswitches())
+        with mock.patch.object(commands, 'is_ovs_mutate_supported',
+                               return_value=True):
+            self.assertEqual(set(), txn._get_locked_lswitches())
+
+    def test_commit_raw_lswitch_lock_timeout(self):
+        txn = transaction.OvnNbTransaction(mock.Mock(), mock.Mock(), 0.1)
+        with mock.patch.object(txn, '_get_locked_lswitches',
+                               return_value={'ls-1'}), \
+                transaction._LSWITCH_LOCKS.hold(['ls-1'], 1):
+            result = txn.commit_raw()
+        self.assertIsInstance(result, idlutils.ExceptionResult)
+        self.assertIsInstance(result.ex, api.TimeoutException)
+        self.queue_and_wait.assert_not_called()
@@ -313,7 +313,8 @@ class TestOvnNbSyncML2(test_mech_driver.OVNMechanismDriverTestCase):
         ovn_api.transaction = mock.MagicMock()
 
         ovn_driver.create_network_in_ovn = mock.Mock()
-        ovn_driver.create_port_in_ovn = mock.Mock()
+        ovn_driver.create_ports_in_ovn = mock.Mock(
+            side_effect=lambda ports: ports)
         ovn_driver.validate_and_get_data_from_binding_profile = mock.Mock()
         ovn_driver.get_ovn_port_options = mock.Mock()
         ovn_driver.get_ovn_port_options.return_value = mock.ANY
@@ -428,12 +429,12 @@ class TestOvnNbSyncML2(test_mech_driver.OVNMechanismDriverTestCase):
         ovn_driver.create_network_in_ovn.assert_has_calls(
             create_network_calls, any_order=True)
 
-        self.assertEqual(len(create_port_list),
-                         ovn_driver.create_port_in_ovn.call_count)
-        create_port_calls = [mock.call(port, mock.ANY)
-                             for port in create_port_list]
-        ovn_driver.create_port_in_ovn.assert_has_calls(create_port_calls,
-                                                       any_order=True)
+        if create_port_list:
+            ovn_driver.create_ports_in_ovn.assert_called_once_with(mock.ANY)
+            created_ports = ovn_driver.create_ports_in_ovn.call_args[0][0]
+            self.assertItemsEqual(create_port_list, created_ports)
+        else:
+            ovn_driver.create_ports_in_ovn.assert_not_called()
 
         self.assertEqual(len(del_network_list),
                          ovn_api.delete_lswitch.call_count)